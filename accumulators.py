@@ -0,0 +1,122 @@
+import threading
+from datetime import datetime
+from typing import Tuple
+
+import numpy as np
+
+from dataset_cache import dataset_cache, get_series
+from timeseries_store import SAMPLE_SECONDS, TimeSeries, rows_after, series_version, to_epoch
+
+
+class EnergyAccumulator:
+    """Running Wh totals per day and hour of day, booked as samples are appended
+
+    Each sample is worth SAMPLE_SECONDS of its power reading and is booked
+    once the next sample arrives, so the newest reading is never counted.
+    """
+
+    def __init__(self):
+        self.first_day = None
+        self._hourly = np.zeros((0, 24))  # day offset x hour of day -> Wh
+        self.days = 0
+        self.rows = 0
+        self.first_timestamp = None
+        self.last_timestamp = None
+        self._last_power = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build(cls, series: TimeSeries) -> "EnergyAccumulator":
+        accumulator = cls()
+        accumulator.append(series)
+        return accumulator
+
+    @property
+    def nbytes(self) -> int:
+        return self._hourly.nbytes
+
+    def _grow(self, last_day: int):
+        needed = last_day - self.first_day + 1
+        if needed > len(self._hourly):
+            grown = np.zeros((max(needed, len(self._hourly) * 2), 24))
+            grown[:self.days] = self._hourly[:self.days]
+            self._hourly = grown
+        self.days = max(self.days, needed)
+
+    def append(self, series: TimeSeries):
+        """Book the energy of newly arrived samples"""
+        with self._lock:
+            self._append(series)
+
+    def _append(self, series: TimeSeries):
+        if not len(series):
+            return
+        timestamps = series.timestamp
+        powers = series.power.astype(np.float64)
+        if self.last_timestamp is not None:
+            timestamps = np.r_[self.last_timestamp, timestamps]
+            powers = np.r_[self._last_power, powers]
+
+        booked_ts = timestamps[:-1]
+        if len(booked_ts):
+            days = booked_ts // 86400
+            if self.first_day is None:
+                self.first_day = int(days.min())
+            elif days.min() < self.first_day:
+                # Samples older than anything seen: shift the grid
+                shift = self.first_day - int(days.min())
+                self._hourly = np.vstack([np.zeros((shift, 24)), self._hourly])
+                self.days += shift
+                self.first_day -= shift
+            self._grow(int(days.max()))
+            cells = (days - self.first_day) * 24 + (booked_ts // 3600) % 24
+            wh = powers[:-1] * SAMPLE_SECONDS / 3600
+            flat = self._hourly.reshape(-1)
+            flat[:self.days * 24] += np.bincount(cells, weights=wh, minlength=self.days * 24)
+
+        if self.first_timestamp is None:
+            self.first_timestamp = int(series.timestamp[0])
+        self.rows += len(series)
+        self.last_timestamp = int(timestamps[-1])
+        self._last_power = float(powers[-1])
+
+    def sync(self, series: TimeSeries) -> "EnergyAccumulator":
+        """Catch up with a series that may have grown; rebuild if it was rewritten instead"""
+        # The cursor is read and advanced under one lock, so concurrent refreshes book each row once
+        with self._lock:
+            newer = rows_after(series, self.rows, self.first_timestamp, self.last_timestamp)
+            if newer is not None:
+                self._append(newer)
+                return self
+        return EnergyAccumulator.build(series)
+
+    def hourly_wh(self, start: datetime, end: datetime = None) -> np.ndarray:
+        """Wh per hour of day (24 values) for whole days in [start, end)"""
+        if self.first_day is None:
+            return np.zeros(24)
+        lo = max(to_epoch(start) // 86400 - self.first_day, 0)
+        hi = self.days if end is None else max(to_epoch(end) // 86400 - self.first_day, lo)
+        return self._hourly[lo:min(hi, self.days)].sum(axis=0)
+
+    def daily_wh(self, start: datetime, end: datetime = None) -> Tuple[np.ndarray, np.ndarray]:
+        """(epoch day numbers, day x hour Wh matrix) for whole days in [start, end)"""
+        if self.first_day is None:
+            return np.empty(0, dtype=np.int64), np.zeros((0, 24))
+        lo = max(to_epoch(start) // 86400 - self.first_day, 0)
+        hi = self.days if end is None else max(to_epoch(end) // 86400 - self.first_day, lo)
+        hi = min(hi, self.days)
+        return np.arange(lo, max(lo, hi)) + self.first_day, self._hourly[lo:hi]
+
+
+def get_accumulator(name: str) -> EnergyAccumulator:
+    """Shared accumulator for a stored series, updated incrementally when it grows"""
+    key = ("energy", name)
+
+    def refresh():
+        series = get_series(name)
+        previous = dataset_cache.peek(key)
+        if previous is None:
+            return EnergyAccumulator.build(series)
+        return previous.sync(series)
+
+    return dataset_cache.get(key, series_version(name), refresh)
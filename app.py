@@ -1,19 +1,61 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import Cookie, FastAPI, HTTPException, Query
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.requests import Request
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+import asyncio
 import json
 import os
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from pydantic import BaseModel
-import statistics
+import time
+import numpy as np
 from optimization_algorithms import PowerOptimizer
+from timeseries_store import DATA_DIR, SAMPLE_SECONDS, TimeSeries, to_epoch
+from ingest import SegmentLog
+from ingest_service import service_from_env
+from dataset_cache import dataset_cache, dataset_version, get_runs, get_series
+from rollups import chart_points, get_rollups
+from recent import get_recent, recent_windows
+from accumulators import get_accumulator
+from forecasting import get_forecaster, projected_month
+from tariffs import DEFAULT_PLAN, TariffPlan, evaluate_plans, time_of_use_plan
+from push import Broadcaster
+from replay import ReplaySessions
+from workers import WorkerPool, WorkerTimeout, pool_from_env
+from meters import DEFAULT_METER, Meter, registry
+from bulk_io import FORMATS, RESOLUTIONS, export_stream, format_available, series_for
+from peak_scan import day_summaries, merge_chunks, peak_page, plan_chunks, scan_chunk
+from fleet import merge_bills, merge_load, shard_partials, split, top_consumers
+from response_cache import ResponseCache
+from serialization import FastJSONResponse, dumps
+from metrics import MetricsMiddleware, metrics
+from profiling import ProfilingMiddleware, active_profile
 
-app = FastAPI(title="WattWise", description="Smart Electricity Bill Optimizer")
-i = 0 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build the running energy totals and rollups once at startup
+    # (after that they are only extended as new samples arrive)
+    # for the default meter; other meters are built on first use
+    get_accumulator("main_power_data")
+    get_rollups("main_power_data")
+    get_forecaster("main_power_data")
+    get_peak_detector(registry.get(DEFAULT_METER))
+    
+    if ingest_service:
+        ingest_service.pipeline.add_consumer(on_live_record)
+        await ingest_service.start()
+    yield
+    if ingest_service:
+        await ingest_service.stop()
+    workers.shutdown()
+    fleet_workers.shutdown()
+
+app = FastAPI(title="WattWise", description="Smart Electricity Bill Optimizer", lifespan=lifespan,
+              default_response_class=FastJSONResponse)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # You can replace * with specific origins if needed
@@ -21,6 +63,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(ProfilingMiddleware)
 
 # Mount static files
 app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -31,45 +75,135 @@ templates = Jinja2Templates(directory="templates")
 # Initialize optimizer
 optimizer = PowerOptimizer()
 
+# Online peak detectors per meter; live samples are pushed into the default meter's
+peak_detectors: Dict[str, Any] = {}
+
+# Read side of the ingest log written by iot.py
+ingest_log = SegmentLog()
+
+# Shared server-push fan-out
+broadcaster = Broadcaster()
+
+# Appliance data is replayed from recordings on a per-session clock
+replay_sessions = ReplaySessions()
+
+# Blocking loads and analytics run here, not on the event loop
+# (WATTWISE_WORKERS=thread|process, WATTWISE_REQUEST_TIMEOUT=seconds)
+workers = pool_from_env()
+
+# Fleet endpoints fan out over meter shards, and historical peak scans over
+# chunks of a series, in separate processes
+fleet_workers = WorkerPool(kind=os.environ.get("WATTWISE_FLEET_WORKERS", "process"), timeout=workers.timeout)
+
+# Rendered analytics responses, reused until the main dataset changes
+response_cache = ResponseCache()
+
+# Optional in-process serial ingest (WATTWISE_INGEST=serial:COM4, pty:..., tcp:..., replay:...)
+ingest_service = service_from_env()
+
+def on_live_record(record: Dict[str, Any]):
+    """Push one ingested reading into the in-memory consumers"""
+    sample = TimeSeries.from_records([record])
+    get_accumulator("main_power_data").append(sample)
+    get_rollups("main_power_data").append(sample)
+    get_forecaster("main_power_data").append(sample)
+    recent_windows.push("main_power_data", sample)
+    peak = get_peak_detector(registry.get(DEFAULT_METER)).update(int(sample.timestamp[0]), float(sample.power[0]))
+    dataset_cache.bump("main_power_data")
+    broadcaster.notify("live")
+    if peak:
+        broadcaster.notify("peaks")
+
 # Load data functions
-def load_json_data(filename: str) -> List[Dict]:
-    """Load data from JSON file"""
-    try:
-        with open(f"data/{filename}", "r") as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return []
-    except json.JSONDecodeError:
-        return []
-
-def get_filtered_data(data: List[Dict], period: str) -> List[Dict]:
-    """Filter data based on time period"""
-    if not data:
-        return []
-    
+def get_meter(meter_id: str) -> Meter:
+    """Look up a meter from the registry"""
+    meter = registry.get(meter_id)
+    if meter is None:
+        raise HTTPException(status_code=404, detail="Meter not found")
+    return meter
+
+def get_peak_detector(meter: Meter):
+    """The meter's streaming peak detector, caught up with its stored history"""
+    detector = peak_detectors.get(meter.id)
+    if detector is None:
+        detector = peak_detectors[meter.id] = optimizer.create_streaming_detector()
+    detector.catch_up(get_series(meter.main_series))
+    return detector
+
+def get_period_start(period: str) -> Optional[datetime]:
+    """Start of the chart window for a time period"""
     now = datetime.now()
     
     if period == "today":
-        start_time = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        return now.replace(hour=0, minute=0, second=0, microsecond=0)
     elif period == "week":
-        start_time = now - timedelta(days=7)
+        return now - timedelta(days=7)
     elif period == "month":
-        start_time = now - timedelta(days=30)
-    else:
-        return data[-100:]  # Default to last 100 points
-    
-    filtered_data = []
-    for entry in data:
-        entry_time = datetime.fromisoformat(entry["timestamp"])
-        if entry_time >= start_time:
-            filtered_data.append(entry)
-    
-    # Limit data points for performance
-    if len(filtered_data) > 200:
-        step = len(filtered_data) // 200
-        filtered_data = filtered_data[::step]
-    
-    return filtered_data
+        return now - timedelta(days=30)
+    elif period == "year":
+        return now - timedelta(days=365)
+    return None
+
+def get_start_of_month() -> datetime:
+    """Midnight on the first day of the current month"""
+    now = datetime.now()
+    return now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+def parse_month(month: Optional[str]):
+    """(start, end) of a "YYYY-MM" month; the current month to date when not given"""
+    if not month:
+        return get_start_of_month(), None
+    try:
+        start = datetime.strptime(month, "%Y-%m")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="month must be YYYY-MM")
+    return start, (start + timedelta(days=32)).replace(day=1)
+
+def get_monthly_hourly_wh(meter: Meter) -> np.ndarray:
+    """Wh per hour of day booked since the start of the current month"""
+    return get_accumulator(meter.main_series).hourly_wh(get_start_of_month())
+
+def parse_time_param(value: Optional[str], name: str) -> Optional[int]:
+    """Parse an ISO timestamp query parameter to epoch seconds"""
+    if value is None:
+        return None
+    try:
+        return to_epoch(datetime.fromisoformat(value))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid '{name}' timestamp")
+
+async def dispatch(func, *args, key=None, pool=None):
+    """Run a blocking computation in the worker pool; identical concurrent calls share one run"""
+    started = time.perf_counter()
+    profile = active_profile()
+    try:
+        with metrics.timed("compute"):
+            if profile is not None:
+                # A profiled request computes on its own, in a thread the profiler can see
+                return await asyncio.to_thread(profile.run, func, *args)
+            return await (pool or workers).run(func, *args, key=key)
+    except WorkerTimeout as error:
+        raise HTTPException(status_code=504, detail=str(error))
+    finally:
+        if metrics.enabled:
+            metrics.compute_time.observe(time.perf_counter() - started, func.__qualname__)
+
+async def cached_response(request: Request, meter: Meter, key: tuple, build) -> Response:
+    """Serve a cached rendering (with ETag/304 and compression) while the meter's data is unchanged
+
+    build() is awaited on a miss and returns (payload, extra headers).
+    """
+    key = (meter.id,) + key
+    version = dataset_version(meter.main_series)
+    if active_profile() is not None:
+        # Profile the real work, not a cache hit
+        payload, headers = await build()
+        return FastJSONResponse(payload, headers=headers)
+    entry = response_cache.get(key, version)
+    if entry is None:
+        payload, headers = await build()
+        entry = response_cache.put(key, version, payload, headers)
+    return entry.respond(request)
 
 # Pydantic models
 class VariableBillingRequest(BaseModel):
@@ -77,6 +211,10 @@ class VariableBillingRequest(BaseModel):
     standard_rate: float
     off_peak_rate: float
 
+class PlanComparisonRequest(BaseModel):
+    plans: List[TariffPlan]
+    month: Optional[str] = None  # "YYYY-MM"; defaults to the current month to date
+
 # Routes
 @app.get("/", response_class=HTMLResponse)
 async def home(request: Request):
@@ -86,14 +224,25 @@ async def home(request: Request):
 async def dashboard(request: Request):
     return templates.TemplateResponse("dashboard.html", {"request": request})
 
-@app.get("/live-data")
-async def get_live_data():
-    """Get current live power data"""
-    try:
-        with open("data/iot.json", "r") as f:
-            main_data = json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        main_data = {}
+def read_live_data(meter_id: str = DEFAULT_METER) -> Dict[str, Any]:
+    """Latest meter reading"""
+    if meter_id != DEFAULT_METER:
+        # Meters other than the one wired to this server report through their shard
+        latest = get_recent(get_meter(meter_id).main_series, rows=1)
+        main_data = latest.record(0) if len(latest) else {}
+        return {key: main_data.get(key, 0) for key in ("voltage", "current", "power")}
+
+    # In-process reading if ingest runs here, else the last complete record
+    # in the ingest log, else a legacy iot.json
+    main_data = ingest_service.latest if ingest_service else None
+    if main_data is None:
+        main_data = ingest_log.tail_record()
+    if main_data is None:
+        try:
+            with open(os.path.join(DATA_DIR, "iot.json"), "r") as f:
+                main_data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            main_data = {}
 
     return {
         "voltage": main_data.get("voltage", 0),
@@ -101,126 +250,470 @@ async def get_live_data():
         "power": main_data.get("power", 0)
     }
 
+@app.get("/live-data")
+async def get_live_data(meter: str = DEFAULT_METER):
+    """Get current live power data"""
+    return read_live_data(get_meter(meter).id)
+
+
+@app.get("/power-data")
+async def get_power_data_range(
+    from_: Optional[str] = Query(None, alias="from"),
+    to: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1),
+    format: str = Query("records", pattern="^(records|columns)$"),
+    meter: str = DEFAULT_METER,
+):
+    """Get raw power readings with from <= timestamp < to, as records or as column arrays"""
+    body = await dispatch(read_power_range, get_meter(meter).main_series,
+                          parse_time_param(from_, "from"), parse_time_param(to, "to"), limit, format)
+    return Response(body, media_type="application/json")
+
+def read_power_range(series_name: str, start: Optional[int], end: Optional[int], limit: Optional[int],
+                     format: str) -> bytes:
+    range_data = get_series(series_name).between(start, end)
+    if limit is not None:
+        range_data = range_data[:limit]
+    # Serialized in the worker, straight from the column arrays
+    if format == "columns":
+        return dumps(range_data.to_columns())
+    return dumps(range_data.to_records())
+
+@app.get("/export")
+async def export_history(
+    series: str = "main",
+    from_: Optional[str] = Query(None, alias="from"),
+    to: Optional[str] = None,
+    resolution: str = Query("raw", pattern=f"^({'|'.join(RESOLUTIONS)})$"),
+    format: str = Query("ndjson", pattern=f"^({'|'.join(FORMATS)})$"),
+    meter: str = DEFAULT_METER,
+):
+    """Stream a series with from <= timestamp < to as NDJSON, CSV, Parquet or Arrow, chunk by chunk"""
+    meter = get_meter(meter)
+    if series != "main" and series not in meter.appliances:
+        raise HTTPException(status_code=404, detail="Series not found")
+    if not format_available(format):
+        raise HTTPException(status_code=501, detail=f"{format} export needs pyarrow installed on the server")
+    
+    media_type, extension = FORMATS[format]
+    body = export_stream(series_for(meter, series), format, parse_time_param(from_, "from"),
+                         parse_time_param(to, "to"), resolution)
+    # A plain iterator: Starlette pulls each chunk in its thread pool, off the event loop
+    return StreamingResponse(body, media_type=media_type, headers={
+        "Content-Disposition": f'attachment; filename="{meter.id}-{series}-{resolution}.{extension}"',
+    })
 
 @app.get("/power-data/{period}")
-async def get_power_data(period: str):
-    """Get power consumption data for charts"""
-    main_data = load_json_data("main_power_data.json")
-    filtered_data = get_filtered_data(main_data, period)
-    return filtered_data
+async def get_power_data(
+    period: str,
+    request: Request,
+    points: int = Query(200, ge=3, le=5000),
+    lttb: bool = False,
+    meter: str = DEFAULT_METER,
+):
+    """Get power consumption data for charts from the coarsest rollup tier that fits the point budget"""
+    meter = get_meter(meter)
+    start_time = get_period_start(period)
+    # Rolling windows start on a whole minute so repeat polls can share a cached response
+    start = to_epoch(start_time) // 60 * 60 if start_time else None
+    
+    async def build():
+        resolution, chart_data = await dispatch(compute_chart_data, meter.main_series, start, points, lttb)
+        return chart_data, {"X-Resolution": resolution} if resolution else None
+    
+    return await cached_response(request, meter, ("power-data", start, points, lttb), build)
+
+def compute_chart_data(series_name: str, start: Optional[int], points: int, lttb: bool):
+    if start is None:
+        return None, get_recent(series_name, rows=100).to_records()  # Default to last 100 points
+    
+    return chart_points(get_series(series_name), get_rollups(series_name), start, None, points, lttb)
 
 @app.get("/monthly-units")
-async def get_monthly_units():
+async def get_monthly_units(request: Request, meter: str = DEFAULT_METER):
     """Calculate current month's total units"""
-    main_data = load_json_data("main_power_data.json")
-    if not main_data:
-        return {"units": 0}
-    
-    # Get current month's data
-    now = datetime.now()
-    start_of_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    
-    monthly_data = []
-    for entry in main_data:
-        entry_time = datetime.fromisoformat(entry["timestamp"])
-        if entry_time >= start_of_month:
-            monthly_data.append(entry)
+    meter = get_meter(meter)
     
-    if not monthly_data:
-        return {"units": 0}
+    async def build():
+        return await dispatch(compute_monthly_units, meter.id), None
     
-    # Calculate total kWh (power in watts * time in hours)
-    total_wh = 0
-    for i in range(len(monthly_data) - 1):
-        power = monthly_data[i]["power"]
-        # Each data point represents 10 seconds = 10/3600 hours
-        time_hours = 10 / 3600
-        total_wh += power * time_hours
+    return await cached_response(request, meter, ("monthly-units", get_start_of_month()), build)
+
+def compute_monthly_units(meter_id: str) -> Dict[str, float]:
+    # Running per-hour Wh totals, kept up to date as samples are appended
+    total_wh = float(get_monthly_hourly_wh(get_meter(meter_id)).sum())
     
     # Convert to kWh
     total_kwh = total_wh / 1000
     
     return {"units": round(total_kwh, 2)}
 
+class ReplaySessionRequest(BaseModel):
+    speed: float = 1.0
+    start_offset_seconds: float = 0
+
+@app.post("/replay/session")
+async def create_replay_session(session_request: ReplaySessionRequest, response: Response):
+    """Start a private replay clock; later appliance requests follow it via cookie or ?session="""
+    if session_request.speed <= 0:
+        raise HTTPException(status_code=400, detail="speed must be positive")
+    session_id = replay_sessions.create(session_request.speed, session_request.start_offset_seconds)
+    response.set_cookie("replay_session", session_id, httponly=True, samesite="lax")
+    return {"session": session_id, **replay_sessions.get(session_id).describe()}
+
+@app.get("/replay/session")
+async def get_replay_session(session: Optional[str] = None, replay_session: Optional[str] = Cookie(None)):
+    """Clock the caller's appliance readings follow"""
+    session_id = session or replay_session
+    return {"session": session_id if replay_sessions.get(session_id) else None,
+            **replay_sessions.clock(session_id).describe()}
+
+@app.get("/appliance-data")
+async def get_all_appliance_data(session: Optional[str] = None, replay_session: Optional[str] = Cookie(None),
+                                 meter: str = DEFAULT_METER):
+    """Get every appliance's reading for the same instant"""
+    meter = get_meter(meter)
+    clock = replay_sessions.clock(session or replay_session)
+    return {"position_seconds": round(clock.position(), 1), "appliances": clock.snapshot(meter)}
+
 @app.get("/appliance-data/{appliance}")
-async def get_appliance_data(appliance: str):
+async def get_appliance_data(appliance: str, session: Optional[str] = None,
+                             replay_session: Optional[str] = Cookie(None), meter: str = DEFAULT_METER):
     """Get current appliance data"""
-    valid_appliances = ["fridge", "ac", "geyser", "microwave"]
-    if appliance not in valid_appliances:
+    meter = get_meter(meter)
+    if appliance not in meter.appliances:
         raise HTTPException(status_code=404, detail="Appliance not found")
     
-    appliance_data = load_json_data(f"{appliance}_data.json")
-    if not appliance_data:
-        return {"voltage": 0, "current": 0, "power": 0}
-    global i
-    # Return the latest data point
-    latest = appliance_data[i]
-    i=i+1
+    latest = replay_sessions.clock(session or replay_session).reading(meter.appliance_series(appliance))
     return {
         "voltage": latest["voltage"],
         "current": latest["current"],
         "power": latest["power"]
     }
 
+@app.get("/appliance-usage/{appliance}")
+async def get_appliance_usage(
+    appliance: str,
+    period: str = Query("today", pattern="^(today|week|month|year|all)$"),
+    from_: Optional[str] = Query(None, alias="from"),
+    to: Optional[str] = None,
+    cycles: int = Query(10, ge=0, le=1000),
+    meter: str = DEFAULT_METER,
+):
+    """Energy, on-time per hour of day and recent on/off cycles of one appliance"""
+    meter = get_meter(meter)
+    if appliance not in meter.appliances:
+        raise HTTPException(status_code=404, detail="Appliance not found")
+    
+    start = parse_time_param(from_, "from")
+    if start is None and period != "all":
+        start = to_epoch(get_period_start(period))
+    end = parse_time_param(to, "to")
+    return await dispatch(compute_appliance_usage, meter.appliance_series(appliance), start, end, cycles)
+
+def compute_appliance_usage(series_name: str, start: Optional[int], end: Optional[int],
+                            cycles: int) -> Dict[str, Any]:
+    # Answered from the on/off runs; idle stretches are never scanned
+    runs = get_runs(series_name)
+    usage = runs.usage(start, end)
+    return {
+        "units": round(usage["energy_wh"] / 1000, 3),
+        "on_hours": round(usage["on_seconds"] / 3600, 2),
+        "peak_power": round(usage["peak_power"], 2),
+        "cycle_count": usage["cycles"],
+        "hourly": [
+            {"hour": hour, "on_minutes": round(float(on_seconds) / 60, 1), "units": round(float(wh) / 1000, 3)}
+            for hour, (on_seconds, wh) in enumerate(zip(usage["hourly_on_seconds"], usage["hourly_wh"]))
+        ],
+        "recent_cycles": runs.cycles(start, end, cycles)
+    }
+
+
+def compute_slot_recommendations(meter_id: str = DEFAULT_METER) -> List[Dict]:
+    # Ranked over the cached next-24h load forecast rather than a rescan of history
+    forecast = get_forecaster(get_meter(meter_id).main_series).next_hours(24)
+    return optimizer.forecast_slot_recommendation(forecast)
 
 @app.get("/slot-recommendations")
-async def get_slot_recommendations():
+async def get_slot_recommendations(request: Request, meter: str = DEFAULT_METER):
     """Get time slot recommendations using greedy algorithm"""
-    main_data = load_json_data("main_power_data.json")
-    recommendations = optimizer.greedy_slot_recommendation(main_data)
-    return {"recommendations": recommendations}
+    meter = get_meter(meter)
+    
+    async def build():
+        return {"recommendations": await dispatch(compute_slot_recommendations, meter.id)}, None
+    
+    return await cached_response(request, meter, ("slot-recommendations",), build)
+
+@app.get("/forecast")
+async def get_forecast(request: Request, hours: int = Query(24, ge=1, le=168), meter: str = DEFAULT_METER):
+    """Hourly load forecast and the month-end bill it projects on the default tariff"""
+    meter = get_meter(meter)
+    
+    async def build():
+        return await dispatch(compute_forecast, meter.id, hours), None
+    
+    return await cached_response(request, meter, ("forecast", hours, get_start_of_month()), build)
+
+def compute_forecast(meter_id: str, hours: int) -> Dict[str, Any]:
+    meter = get_meter(meter_id)
+    forecast = get_forecaster(meter.main_series).next_hours(hours)
+    month_start = get_start_of_month()
+    projection = evaluate_plans([DEFAULT_PLAN], *projected_month(meter.main_series, month_start))[0]
+    units_to_date = float(get_monthly_hourly_wh(meter).sum()) / 1000
+    return {
+        "hourly": [
+            {"timestamp": ts, "power": round(power, 2), "units": round(power / 1000, 3)}
+            for ts, power in zip(forecast["timestamp"].astype("datetime64[s]").astype(str).tolist(),
+                                 forecast["power"].tolist())
+        ],
+        "units": round(float(forecast["power"].sum()) / 1000, 2),
+        "month_end": {
+            "units_to_date": round(units_to_date, 2),
+            "projected_units": projection["units"],
+            "projected_cost": projection["total_cost"],
+        },
+    }
+
+def read_recent_peaks(limit: int = 5, meter_id: str = DEFAULT_METER) -> List[Dict]:
+    """Most significant events in the streaming detector's ring over the last 1440 readings"""
+    peak_detector = get_peak_detector(get_meter(meter_id))
+    since = peak_detector.last_timestamp - 1440 * SAMPLE_SECONDS if peak_detector.last_timestamp else None
+    return peak_detector.recent(limit, since)
 
 @app.get("/peak-detection")
-async def get_peak_detection():
+async def get_peak_detection(
+    request: Request,
+    window_size: Optional[int] = Query(None, ge=1),
+    multiplier: Optional[float] = Query(None, gt=0),
+    threshold_watts: Optional[float] = Query(None, ge=0),
+    hours: Optional[float] = Query(None, gt=0),
+    limit: int = Query(5, ge=1, le=1000),
+    meter: str = DEFAULT_METER,
+):
     """Get peak detection results using sliding window"""
-    main_data = load_json_data("main_power_data.json")
-    peaks = optimizer.sliding_window_peak_detection(main_data)
-    return {"peaks": peaks}
-
-@app.get("/live-recommendations")
-async def get_live_recommendations():
-    """Get live optimization recommendations"""
-    main_data = load_json_data("main_power_data.json")
+    meter = get_meter(meter)
+    
+    async def build():
+        if window_size is None and multiplier is None and threshold_watts is None and hours is None:
+            # Default view: read the streaming detector's ring of recent events.
+            # The detector lives in this process, so this stays on a thread.
+            return {"peaks": await asyncio.to_thread(read_recent_peaks, limit, meter.id)}, None
+        return {"peaks": await dispatch(scan_peaks, meter.main_series, window_size, multiplier,
+                                        threshold_watts, hours, limit)}, None
     
-    # Get appliance data
+    key = ("peak-detection", window_size, multiplier, threshold_watts, hours, limit)
+    return await cached_response(request, meter, key, build)
+
+def scan_peaks(series_name: str, window_size: Optional[int], multiplier: Optional[float],
+               threshold_watts: Optional[float], hours: Optional[float], limit: int) -> List[Dict]:
+    # Only the tail of the history is read: the last 1440 readings, or the last `hours` of them
+    main_data = get_recent(series_name, rows=1440) if hours is None else get_recent(series_name, seconds=hours * 3600)
+    recent_rows = 1440 if hours is None else None
+    return optimizer.sliding_window_peak_detection(
+        main_data, window_size, multiplier, threshold_watts, recent_rows=recent_rows, limit=limit
+    )
+
+# Peaks closer together than this are one event, as in the live detector
+PEAK_GAP_SECONDS = 300
+
+async def scan_history(series_name: str, start: int, end: int, window_size: int, multiplier: float,
+                       threshold_watts: float) -> Dict[str, np.ndarray]:
+    """All peaks between start and end, scanned in chunks over the fleet process pool
+
+    Each chunk also reads the window before it, and merge_chunks redoes the
+    de-duplication across chunk boundaries, so the result is the same as
+    one pass over the range. Finished scans are kept until the series changes.
+    """
+    key = ("peak-scan", series_name, start, end, window_size, multiplier, threshold_watts)
+    version = dataset_version(series_name)
+    peaks = dataset_cache.lookup(key, version)
+    if peaks is not None:
+        return peaks
+
+    rows = await dispatch(history_rows, series_name, start, end)
+    if rows is None:
+        # Out-of-order history cannot be cut into contiguous chunks; scan it in one go
+        peaks = await dispatch(scan_rows, series_name, start, end, window_size, multiplier, threshold_watts)
+    else:
+        chunks = await asyncio.gather(*(
+            dispatch(scan_chunk, series_name, lo, hi, window_size, multiplier, threshold_watts, PEAK_GAP_SECONDS,
+                     pool=fleet_workers)
+            for lo, hi in plan_chunks(rows.start, rows.stop, fleet_workers.max_workers * 4)
+        ))
+        peaks = merge_chunks(chunks, PEAK_GAP_SECONDS)
+    dataset_cache.put(key, version, peaks)
+    return peaks
+
+def history_rows(series_name: str, start: int, end: int) -> Optional[slice]:
+    """Row range of [start, end) in a stored series, or None if its history is out of order"""
+    rows = get_series(series_name).index.rows_between(start, end)
+    return rows if isinstance(rows, slice) else None
+
+def scan_rows(series_name: str, start: int, end: int, window_size: int, multiplier: float,
+              threshold_watts: float) -> Dict[str, np.ndarray]:
+    main_data = get_series(series_name).between(start, end)
+    return optimizer.find_peaks(main_data, window_size, multiplier, threshold_watts, PEAK_GAP_SECONDS)
+
+@app.get("/peak-detection/history")
+async def get_peak_history(
+    request: Request,
+    from_: str = Query(..., alias="from"),
+    to: str = Query(...),
+    window_size: Optional[int] = Query(None, ge=1),
+    multiplier: Optional[float] = Query(None, gt=0),
+    threshold_watts: Optional[float] = Query(None, ge=0),
+    order: str = Query("time", pattern="^(time|ratio)$"),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    meter: str = DEFAULT_METER,
+):
+    """Peaks over any date range, a page at a time (in time order or most significant first), with per-day summaries"""
+    meter = get_meter(meter)
+    start, end = parse_time_param(from_, "from"), parse_time_param(to, "to")
+    if end <= start:
+        raise HTTPException(status_code=400, detail="'to' must be after 'from'")
+    window_size = optimizer.window_size if window_size is None else window_size
+    multiplier = optimizer.peak_threshold_multiplier if multiplier is None else multiplier
+    threshold_watts = optimizer.threshold_watts if threshold_watts is None else threshold_watts
+
+    async def build():
+        peaks = await scan_history(meter.main_series, start, end, window_size, multiplier, threshold_watts)
+        total = len(peaks["timestamp"])
+        page = peak_page(peaks, offset, limit, order)
+        return {
+            "total": total,
+            "offset": offset,
+            "limit": limit,
+            "next_offset": offset + limit if offset + limit < total else None,
+            "peaks": optimizer.peak_events(page, limit=None, ranked=False),
+            "days": day_summaries(peaks),
+        }, None
+
+    key = ("peak-history", start, end, window_size, multiplier, threshold_watts, order, offset, limit)
+    return await cached_response(request, meter, key, build)
+
+def compute_live_recommendations(meter_id: str = DEFAULT_METER) -> List[Dict]:
+    meter = get_meter(meter_id)
+    # Only the last hour of main readings and the latest appliance readings are
+    # used, so read them from the recent windows rather than the full history
+    main_data = get_recent(meter.main_series, rows=360)
     appliance_data = {}
-    for appliance in ["fridge", "ac", "geyser", "microwave"]:
-        appliance_data[appliance] = load_json_data(f"{appliance}_data.json")
+    for appliance in meter.appliances:
+        appliance_data[appliance] = get_recent(meter.appliance_series(appliance), rows=1)
     
-    recommendations = optimizer.generate_live_recommendations(main_data, appliance_data)
-    return {"recommendations": recommendations}
+    return optimizer.generate_live_recommendations(main_data, appliance_data)
+
+@app.get("/live-recommendations")
+async def get_live_recommendations(meter: str = DEFAULT_METER):
+    """Get live optimization recommendations"""
+    return {"recommendations": await dispatch(compute_live_recommendations, get_meter(meter).id)}
+
+def read_appliance_snapshot() -> Dict[str, Dict]:
+    """One reading per appliance for the push channel, on the shared real-time clock"""
+    return replay_sessions.default.snapshot(registry.get(DEFAULT_METER))
+
+# Server-push topics; each is computed once per change for all connected clients
+broadcaster.topic("live", read_live_data, interval=2)
+broadcaster.topic("appliances", read_appliance_snapshot, interval=10)
+broadcaster.topic("peaks", read_recent_peaks, interval=10)
+broadcaster.topic("recommendations", compute_live_recommendations, interval=30)
+broadcaster.topic("slots", compute_slot_recommendations, interval=60)
+
+@app.get("/stream")
+async def stream_updates(topics: str = "live,peaks,slots"):
+    """Server-sent events: a full snapshot per topic, then only changed fields"""
+    subscription = broadcaster.subscribe(topic.strip() for topic in topics.split(","))
+    if not subscription.topics:
+        broadcaster.unsubscribe(subscription)
+        raise HTTPException(status_code=400, detail=f"Unknown topics; choose from {sorted(broadcaster.topics)}")
+    return StreamingResponse(
+        broadcaster.stream(subscription),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/stream-stats")
+async def get_stream_stats():
+    """Connected push clients and per-topic computation counts"""
+    return broadcaster.stats()
+
+@app.get("/ingest-stats")
+async def get_ingest_stats():
+    """In-process ingest queue and drop counters"""
+    if not ingest_service:
+        return {"running": False}
+    return ingest_service.stats()
+
+@app.get("/worker-stats")
+async def get_worker_stats():
+    """Worker pool usage, single-flight coalescing and timeout counters"""
+    return workers.stats()
+
+@app.get("/cache-stats")
+async def get_cache_stats():
+    """Dataset and response cache hit/miss counters"""
+    return {**dataset_cache.stats(), "responses": response_cache.stats()}
+
+# Existing stats, read only when /metrics is scraped
+def cache_samples(field: str):
+    yield {"cache": "dataset"}, dataset_cache.stats()[field]
+    yield {"cache": "response"}, response_cache.stats()[field]
+
+def worker_samples(field: str):
+    for name, pool in (("analytics", workers), ("fleet", fleet_workers)):
+        yield {"pool": name}, pool.stats()[field]
+
+def ingest_samples(field: str):
+    if ingest_service:
+        yield {}, ingest_service.stats()[field]
+
+metrics.collect("wattwise_cache_hits_total", "Cache lookups served from cache", lambda: cache_samples("hits"), "counter")
+metrics.collect("wattwise_cache_misses_total", "Cache lookups that had to load or render",
+                lambda: cache_samples("misses"), "counter")
+metrics.collect("wattwise_cache_entries", "Entries held per cache", lambda: cache_samples("entries"))
+metrics.collect("wattwise_cache_bytes", "Bytes held per cache", lambda: cache_samples("bytes"))
+metrics.collect("wattwise_worker_started_total", "Computations started per worker pool",
+                lambda: worker_samples("started"), "counter")
+metrics.collect("wattwise_worker_coalesced_total", "Calls that joined an identical computation in flight",
+                lambda: worker_samples("coalesced"), "counter")
+metrics.collect("wattwise_worker_timeouts_total", "Calls that gave up waiting", lambda: worker_samples("timeouts"),
+                "counter")
+metrics.collect("wattwise_worker_in_flight", "Computations running per worker pool",
+                lambda: worker_samples("in_flight"))
+metrics.collect("wattwise_ingest_queue_depth", "Frames waiting in the ingest queue",
+                lambda: ingest_samples("queue_depth"))
+metrics.collect("wattwise_ingest_frames_total", "Frames through the ingest queue",
+                lambda: [({"outcome": outcome}, value) for outcome in ("received", "processed", "dropped", "failed")
+                         for _, value in ingest_samples(outcome)], "counter")
+metrics.collect("wattwise_push_clients", "Connected push (server-sent events) clients",
+                lambda: [({}, broadcaster.stats()["clients"])])
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus text exposition of request latencies, data-path counters and cache/worker/ingest stats"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 @app.post("/variable-billing")
-async def calculate_variable_billing(billing_request: VariableBillingRequest):
+async def calculate_variable_billing(billing_request: VariableBillingRequest, meter: str = DEFAULT_METER):
     """Calculate variable rate electricity bill"""
-    # Get monthly units data
-    monthly_units_response = await get_monthly_units()
-    total_units = monthly_units_response["units"]
-    
-    if total_units == 0:
-        return {
-            "peak_units": 0,
-            "standard_units": 0,
-            "off_peak_units": 0,
-            "peak_cost": 0,
-            "standard_cost": 0,
-            "off_peak_cost": 0,
-            "total_cost": 0
-        }
-    
-    # Load main data to analyze time-based consumption
-    main_data = load_json_data("main_power_data.json")
-    now = datetime.now()
-    start_of_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    return await dispatch(compute_variable_bill, get_meter(meter).id, billing_request.peak_rate,
+                          billing_request.standard_rate, billing_request.off_peak_rate)
+
+def compute_variable_bill(meter_id: str, peak_rate: float, standard_rate: float,
+                          off_peak_rate: float) -> Dict[str, float]:
+    meter = get_meter(meter_id)
+    # (peak 9 AM - 6 PM, standard 6 PM - 10 PM, off-peak 10 PM - 9 AM)
+    plan = time_of_use_plan(peak_rate, standard_rate, off_peak_rate)
+    month_start = get_start_of_month()
+    # Month-end bill: energy booked so far plus the load forecast for the rest of the month
+    projection = evaluate_plans([plan], *projected_month(meter.main_series, month_start))[0]
+    projected = {"projected_units": projection["units"], "projected_cost": projection["total_cost"]}
     
-    # Filter monthly data
-    monthly_data = []
-    for entry in main_data:
-        entry_time = datetime.fromisoformat(entry["timestamp"])
-        if entry_time >= start_of_month:
-            monthly_data.append(entry)
+    # Monthly consumption per hour of day, from the running accumulator
+    hourly_wh = get_monthly_hourly_wh(meter)
+    total_units = round(float(hourly_wh.sum()) / 1000, 2)
     
-    if not monthly_data:
+    if total_units == 0:
         return {
             "peak_units": 0,
             "standard_units": 0,
@@ -228,49 +721,86 @@ async def calculate_variable_billing(billing_request: VariableBillingRequest):
             "peak_cost": 0,
             "standard_cost": 0,
             "off_peak_cost": 0,
-            "total_cost": 0
+            "total_cost": 0,
+            **projected
         }
     
-    # Calculate time-slot based consumption
-    peak_consumption = 0  # 9 AM - 6 PM
-    standard_consumption = 0  # 6 PM - 10 PM
-    off_peak_consumption = 0  # 10 PM - 9 AM
-    
-    for i in range(len(monthly_data) - 1):
-        entry_time = datetime.fromisoformat(monthly_data[i]["timestamp"])
-        hour = entry_time.hour
-        power = monthly_data[i]["power"]
-        
-        # Each data point represents 10 seconds = 10/3600 hours
-        time_hours = 10 / 3600
-        consumption_wh = power * time_hours
-        
-        if 9 <= hour < 18:  # Peak hours
-            peak_consumption += consumption_wh
-        elif 18 <= hour < 22:  # Standard hours
-            standard_consumption += consumption_wh
-        else:  # Off-peak hours
-            off_peak_consumption += consumption_wh
-    
-    # Convert to kWh
-    peak_units = peak_consumption / 1000
-    standard_units = standard_consumption / 1000
-    off_peak_units = off_peak_consumption / 1000
+    # Calculate time-slot based consumption with the tariff engine
+    days, daily_wh = get_accumulator(meter.main_series).daily_wh(month_start)
+    bill = evaluate_plans([plan], days, daily_wh)[0]
+    bands = bill["bands"]
     
-    # Calculate costs
-    peak_cost = peak_units * billing_request.peak_rate
-    standard_cost = standard_units * billing_request.standard_rate
-    off_peak_cost = off_peak_units * billing_request.off_peak_rate
-    total_cost = peak_cost + standard_cost + off_peak_cost
+    return {
+        "peak_units": bands["peak"]["units"],
+        "standard_units": bands["standard"]["units"],
+        "off_peak_units": bands["off_peak"]["units"],
+        "peak_cost": bands["peak"]["cost"],
+        "standard_cost": bands["standard"]["cost"],
+        "off_peak_cost": bands["off_peak"]["cost"],
+        "total_cost": bill["total_cost"],
+        **projected
+    }
+
+@app.post("/billing/compare")
+async def compare_billing_plans(comparison_request: PlanComparisonRequest, meter: str = DEFAULT_METER):
+    """Bill many candidate tariff plans against the same month of consumption"""
+    meter = get_meter(meter)
+    start, end = parse_month(comparison_request.month)
     
+    key = ("billing/compare", meter.id, comparison_request.model_dump_json(), start, end)
+    return await dispatch(compare_plans, meter.main_series, comparison_request.plans, start, end, key=key)
+
+def compare_plans(series_name: str, plans: List[TariffPlan], start: datetime,
+                  end: Optional[datetime]) -> Dict[str, Any]:
+    days, daily_wh = get_accumulator(series_name).daily_wh(start, end)
+    bills = evaluate_plans(plans, days, daily_wh)
+    bills.sort(key=lambda bill: bill["total_cost"])
+    return {
+        "month": start.strftime("%Y-%m"),
+        "cheapest": bills[0]["plan"] if bills else None,
+        "bills": bills
+    }
+
+# Fleet-wide views; each request fans out over groups of meter shards in the
+# fleet process pool and merges their partial aggregates
+async def fleet_partials(month: Optional[str], plans: List[TariffPlan] = None) -> List[Dict]:
+    start, end = parse_month(month)
+    meter_ids = sorted(registry.meters())
+    plans_key = tuple(plan.model_dump_json() for plan in plans or [])
+    results = await asyncio.gather(*(
+        dispatch(shard_partials, group, start, end, plans, key=("fleet", group, start, end, plans_key),
+                 pool=fleet_workers)
+        for group in split(meter_ids, fleet_workers.max_workers * 4)
+    ))
+    return [partial for group in results for partial in group]
+
+@app.get("/fleet/meters")
+async def get_fleet_meters():
+    """Registered meters and their appliances"""
+    return {"meters": [meter.model_dump() for meter in registry.meters().values()]}
+
+@app.get("/fleet/load")
+async def get_fleet_load(month: Optional[str] = None):
+    """Total current load and units across every meter"""
+    partials = await fleet_partials(month)
+    return {"month": parse_month(month)[0].strftime("%Y-%m"), **merge_load(partials)}
+
+@app.get("/fleet/top-consumers")
+async def get_fleet_top_consumers(month: Optional[str] = None, limit: int = Query(10, ge=1, le=1000)):
+    """Meters using the most energy in a month"""
+    partials = await fleet_partials(month)
+    return {"month": parse_month(month)[0].strftime("%Y-%m"), "consumers": top_consumers(partials, limit)}
+
+@app.post("/fleet/billing")
+async def compare_fleet_billing(comparison_request: PlanComparisonRequest):
+    """Bill every meter on each candidate plan and total the fleet"""
+    partials = await fleet_partials(comparison_request.month, comparison_request.plans)
+    bills = merge_bills(partials, comparison_request.plans)
     return {
-        "peak_units": round(peak_units, 2),
-        "standard_units": round(standard_units, 2),
-        "off_peak_units": round(off_peak_units, 2),
-        "peak_cost": round(peak_cost, 2),
-        "standard_cost": round(standard_cost, 2),
-        "off_peak_cost": round(off_peak_cost, 2),
-        "total_cost": round(total_cost, 2)
+        "month": parse_month(comparison_request.month)[0].strftime("%Y-%m"),
+        "meters": len(partials),
+        "cheapest": bills[0]["plan"] if bills else None,
+        "bills": bills
     }
 
 if __name__ == "__main__":
@@ -0,0 +1,245 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+# Dataset sizes in days; every size is generated from the same seed
+SIZES = {"1d": 1, "3m": 92, "1y": 365, "10y": 3650}
+
+BENCH_DIR = os.path.join(os.environ.get("WATTWISE_DATA_DIR", "data"), "bench")
+
+# (method, path, JSON body) for every route that answers a plain request
+ROUTES = [
+    ("GET", "/live-data", None),
+    ("GET", "/power-data?limit=1000", None),
+    ("GET", "/power-data?format=columns&limit=100000", None),
+    ("GET", "/power-data/today", None),
+    ("GET", "/power-data/week", None),
+    ("GET", "/power-data/month", None),
+    ("GET", "/power-data/year", None),
+    ("GET", "/power-data/year?lttb=true", None),
+    ("GET", "/monthly-units", None),
+    ("GET", "/appliance-data", None),
+    ("GET", "/appliance-data/fridge", None),
+    ("GET", "/appliance-usage/geyser?period=all", None),
+    ("GET", "/appliance-usage/fridge?period=month", None),
+    ("GET", "/slot-recommendations", None),
+    ("GET", "/forecast", None),
+    ("GET", "/peak-detection", None),
+    ("GET", "/peak-detection?hours=24", None),
+    ("GET", "/peak-detection/history?from=2000-01-01&to=2100-01-01", None),
+    ("GET", "/live-recommendations", None),
+    ("POST", "/variable-billing", {"peak_rate": 8, "standard_rate": 6, "off_peak_rate": 4}),
+    ("POST", "/billing/compare", {"plans": [
+        {"name": "flat", "base_rate": 6},
+        {"name": "tou", "base_rate": 4, "bands": [
+            {"name": "peak", "start_hour": 9, "end_hour": 18, "rate": 8},
+            {"name": "standard", "start_hour": 18, "end_hour": 22, "rate": 6},
+        ]},
+        {"name": "slabs", "slabs": [{"up_to_kwh": 100, "rate": 3}, {"up_to_kwh": None, "rate": 7}]},
+    ]}),
+]
+
+
+def measure(func: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    """Wall time of a first (cold) call and the median of `repeat` more (warm) calls, in ms"""
+    started = time.perf_counter()
+    func()
+    cold = (time.perf_counter() - started) * 1000
+
+    warm = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        warm.append((time.perf_counter() - started) * 1000)
+    return {"cold_ms": round(cold, 3), "warm_ms": round(statistics.median(warm), 3) if warm else None}
+
+
+def traced_peak(func: Callable[[], Any]) -> float:
+    """Peak Python/NumPy allocation during one call, in KiB"""
+    tracemalloc.start()
+    try:
+        func()
+        return round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+    finally:
+        tracemalloc.stop()
+
+
+def prepare_dataset(size: str, seed: int, root: str = BENCH_DIR) -> str:
+    """Generate (or reuse) the fixed-seed dataset for one size; returns its data directory
+
+    Datasets end at the close of the current day so the "today", "week"
+    and "month" views have data; they are reused for the rest of the day.
+    """
+    import data_generator
+
+    data_dir = os.path.join(root, size)
+    end = datetime.combine(datetime.now().date(), datetime.min.time()) + timedelta(days=1, seconds=-10)
+    start = end - timedelta(days=SIZES[size]) + timedelta(seconds=10)
+    marker = {"seed": seed, "start": start.isoformat(), "end": end.isoformat()}
+    marker_path = os.path.join(data_dir, "bench.json")
+    try:
+        with open(marker_path, "r") as f:
+            if json.load(f) == marker:
+                return data_dir
+    except (FileNotFoundError, json.JSONDecodeError):
+        pass
+
+    data_generator.main(["--start", marker["start"], "--end", marker["end"], "--seed", str(seed),
+                         "--data-dir", data_dir])
+    with open(marker_path, "w") as f:
+        json.dump(marker, f)
+    return data_dir
+
+
+def run_size(repeat: int) -> Dict[str, Any]:
+    """Benchmark routes and optimizer methods against WATTWISE_DATA_DIR (run in a fresh process)"""
+    started = time.perf_counter()
+    from fastapi.testclient import TestClient
+
+    import app as wattwise
+    from dataset_cache import get_runs, get_series
+    from forecasting import Forecaster, get_forecaster
+    from recent import get_recent
+    from response_cache import ResponseCache
+
+    results = {"routes": {}, "optimizer": {}}
+    with TestClient(wattwise.app) as client:
+        results["startup_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        main_data = get_series("main_power_data")
+        results["rows"] = len(main_data)
+
+        for method, path, body in ROUTES:
+            def call(method=method, path=path, body=body):
+                response = client.request(method, path, json=body)
+                response.raise_for_status()
+                return response
+
+            result = measure(call, repeat)
+            # Peak memory of a computation, not of a response cache hit
+            wattwise.response_cache = ResponseCache()
+            result["peak_kib"] = traced_peak(call)
+            results["routes"][f"{method} {path}"] = result
+
+        optimizer = wattwise.optimizer
+        appliances = {name: get_series(f"{name}_data") for name in ("fridge", "ac", "geyser", "microwave")}
+        day = main_data[-8640:]
+        methods = {
+            "greedy_slot_recommendation": lambda: optimizer.greedy_slot_recommendation(main_data),
+            "Forecaster.build": lambda: Forecaster.build(main_data),
+            "forecast_slot_recommendation": lambda: optimizer.forecast_slot_recommendation(
+                get_forecaster("main_power_data").next_hours(24)),
+            "find_peaks": lambda: optimizer.find_peaks(main_data),
+            "sliding_window_peak_detection": lambda: optimizer.sliding_window_peak_detection(main_data),
+            "sliding_window_peak_detection(all rows)":
+                lambda: optimizer.sliding_window_peak_detection(main_data, recent_rows=None),
+            "generate_live_recommendations": lambda: optimizer.generate_live_recommendations(main_data, appliances),
+            "StreamingPeakDetector.feed(1 day)": lambda: optimizer.create_streaming_detector().feed(day),
+            "RunLengthSeries.usage(geyser)": lambda: get_runs("geyser_data").usage(),
+            "get_recent(360 rows)": lambda: get_recent("main_power_data", rows=360),
+            "get_recent(24 hours)": lambda: get_recent("main_power_data", seconds=86400),
+        }
+        for name, func in methods.items():
+            result = measure(func, repeat)
+            result["peak_kib"] = traced_peak(func)
+            results["optimizer"][name] = result
+    return results
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Print warm-latency and memory ratios against a baseline; returns the regressions"""
+    regressions = []
+    for size, current in results["sizes"].items():
+        previous = baseline.get("sizes", {}).get(size)
+        if not previous:
+            continue
+        print(f"\n{size} ({current['rows']} rows) vs baseline")
+        for group in ("routes", "optimizer"):
+            for name, now in current[group].items():
+                before = previous.get(group, {}).get(name)
+                if not before:
+                    continue
+                cells = []
+                for metric in ("warm_ms", "peak_kib"):
+                    if not before.get(metric) or now.get(metric) is None:
+                        continue
+                    ratio = now[metric] / before[metric]
+                    flag = ""
+                    if ratio > tolerance:
+                        flag = " REGRESSION"
+                        regressions.append(f"{size} {name} {metric} x{ratio:.2f}")
+                    elif ratio < 1 / tolerance:
+                        flag = " improved"
+                    cells.append(f"{metric} {before[metric]:g} -> {now[metric]:g} (x{ratio:.2f}){flag}")
+                print(f"  {name}: " + "; ".join(cells))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark WattWise routes and optimizer methods")
+    parser.add_argument("--sizes", default=",".join(SIZES), help=f"Comma-separated subset of {list(SIZES)}")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=5, help="Warm runs per measurement (median is reported)")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", default="benchmark_baseline.json", help="Results to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="Also store these results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=1.25, help="Ratio beyond which a change is flagged")
+    parser.add_argument("--run-size", help=argparse.SUPPRESS)  # Internal: benchmark one prepared dataset
+    args = parser.parse_args(argv)
+
+    if args.run_size:
+        print(json.dumps(run_size(args.repeat)))
+        return 0
+
+    results = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "seed": args.seed,
+        "repeat": args.repeat,
+        "sizes": {},
+    }
+    for size in args.sizes.split(","):
+        if size not in SIZES:
+            parser.error(f"unknown size '{size}'")
+        data_dir = prepare_dataset(size, args.seed)
+        print(f"Benchmarking {size}...")
+        # A fresh interpreter per size keeps caches and memory from leaking between sizes
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--run-size", size, "--repeat", str(args.repeat)],
+            env=dict(os.environ, WATTWISE_DATA_DIR=data_dir, WATTWISE_INGEST=""),
+            cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True,
+        ).stdout
+        results["sizes"][size] = json.loads(output.strip().splitlines()[-1])
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    regressions = []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, "r") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s):")
+            for regression in regressions:
+                print(f"  {regression}")
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
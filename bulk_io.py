@@ -0,0 +1,415 @@
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+from datetime import datetime
+from typing import Any, Dict, Iterator, Optional
+
+import numpy as np
+import pandas as pd
+
+from dataset_cache import get_runs, get_series
+from meters import DEFAULT_METER, Meter
+from metrics import metrics
+from rollups import TIERS, get_rollups
+from timeseries_store import (COLUMNS, SAMPLE_SECONDS, VALUE_COLUMNS, ColumnStore, TimeSeries, store, sync_source,
+                              to_epoch)
+from tracing import get_logger, span
+
+try:
+    import pyarrow as pa  # Optional; needed for Parquet and Arrow IPC only
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+log = get_logger("bulk_io")
+
+# Rows read, converted and written at a time; memory use is bounded by this, not by the range
+CHUNK_ROWS = int(os.environ.get("WATTWISE_EXPORT_CHUNK_ROWS", "65536"))
+
+# Format -> (media type, file extension)
+FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrow"),
+}
+ARROW_FORMATS = ("parquet", "arrow")
+
+# "raw" is every stored sample; the others are the rollup tiers
+RESOLUTIONS = ("raw",) + tuple(TIERS)
+
+Chunk = Dict[str, np.ndarray]
+
+
+def format_available(fmt: str) -> bool:
+    return fmt in FORMATS and (fmt not in ARROW_FORMATS or pa is not None)
+
+
+def _raw_chunks(name: str, start: Optional[int], end: Optional[int], chunk_rows: int) -> Iterator[Chunk]:
+    sync_source(name)
+    if store.has_runs(name):
+        # Expand run-length series one time window at a time rather than all at once
+        runs = get_runs(name)
+        if not len(runs):
+            return
+        window = chunk_rows * runs.step
+        position = runs.first_timestamp if start is None else max(start, runs.first_timestamp)
+        stop = runs.last_timestamp + 1 if end is None else min(end, runs.last_timestamp + 1)
+        while position < stop:
+            chunk = runs.to_series(position, min(position + window, stop))
+            position += window
+            if len(chunk):
+                yield chunk.columns()
+        return
+
+    # Memory-mapped: slicing a chunk only pages in that chunk
+    series = get_series(name)
+    rows = series.index.rows_between(start, end)
+    if isinstance(rows, slice):
+        for first in range(rows.start, rows.stop, chunk_rows):
+            yield series[first:min(first + chunk_rows, rows.stop)].columns()
+    else:
+        for first in range(0, len(rows), chunk_rows):
+            yield series[rows[first:first + chunk_rows]].columns()
+
+
+def _rollup_chunks(name: str, start: Optional[int], end: Optional[int], resolution: str,
+                   chunk_rows: int) -> Iterator[Chunk]:
+    agg = get_rollups(name).tiers[resolution].between(start, end)
+    for first in range(0, len(agg["bucket"]), chunk_rows):
+        part = {field: values[first:first + chunk_rows] for field, values in agg.items()}
+        count = np.maximum(part["count"], 1)
+        yield {
+            "timestamp": part["bucket"],
+            "samples": part["count"],
+            "voltage": part["voltage_sum"] / count,
+            "current": part["current_sum"] / count,
+            "power": part["power_sum"] / count,
+            "power_min": part["power_min"],
+            "power_max": part["power_max"],
+            "energy_wh": part["power_sum"] * SAMPLE_SECONDS / 3600,
+        }
+
+
+def iter_chunks(name: str, start: Optional[int] = None, end: Optional[int] = None, resolution: str = "raw",
+                chunk_rows: int = CHUNK_ROWS) -> Iterator[Chunk]:
+    """Columns of a stored series with start <= timestamp < end, chunk_rows rows at a time
+
+    Raw chunks have the store's columns; rollup chunks have bucket means,
+    min/max power, energy and sample counts, one row per bucket.
+    """
+    if resolution == "raw":
+        return _raw_chunks(name, start, end, chunk_rows)
+    return _rollup_chunks(name, start, end, resolution, chunk_rows)
+
+
+def _text_columns(chunk: Chunk) -> Dict[str, list]:
+    """ISO timestamps and values rounded as the JSON API rounds them"""
+    columns = {"timestamp": np.asarray(chunk["timestamp"], dtype=np.int64).astype("datetime64[s]").astype(str)}
+    for column, values in chunk.items():
+        if column != "timestamp":
+            columns[column] = values if values.dtype.kind in "iu" else np.round(values.astype(np.float64), 2)
+    return {column: values.tolist() for column, values in columns.items()}
+
+
+def _ndjson(chunks: Iterator[Chunk]) -> Iterator[bytes]:
+    for chunk in chunks:
+        with metrics.timed("serialize"):
+            columns = _text_columns(chunk)
+            # Timestamps and numbers never need escaping, so each line is a plain template
+            keys = [f'"{column}":' for column in columns]
+            template = "{{" + keys[0] + '"{}",' + ",".join(f"{key}{{}}" for key in keys[1:]) + "}}\n"
+            body = "".join(template.format(*row) for row in zip(*columns.values()))
+        yield body.encode("utf-8")
+
+
+def _csv(chunks: Iterator[Chunk]) -> Iterator[bytes]:
+    header = True
+    for chunk in chunks:
+        with metrics.timed("serialize"):
+            columns = _text_columns(chunk)
+            lines = [",".join(columns)] if header else []
+            lines.extend(",".join(map(str, row)) for row in zip(*columns.values()))
+            header = False
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+class _Sink:
+    """Write-only file handing out what has been written so far, for streaming pyarrow writers"""
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def writable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return False
+
+    def take(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def _record_batch(chunk: Chunk) -> "pa.RecordBatch":
+    arrays = {"timestamp": pa.array(np.asarray(chunk["timestamp"], dtype=np.int64).astype("datetime64[s]"))}
+    arrays.update((column, pa.array(np.ascontiguousarray(values)))
+                  for column, values in chunk.items() if column != "timestamp")
+    return pa.RecordBatch.from_pydict(arrays)
+
+
+def _arrow(chunks: Iterator[Chunk], fmt: str) -> Iterator[bytes]:
+    """Parquet (one row group per chunk) or an Arrow IPC stream, yielded as each chunk is written"""
+    sink = _Sink()
+    output = pa.PythonFile(sink, mode="w")
+    writer = None
+    for chunk in chunks:
+        with metrics.timed("serialize"):
+            batch = _record_batch(chunk)
+            if writer is None:
+                writer = (pq.ParquetWriter(output, batch.schema, compression="zstd") if fmt == "parquet"
+                          else pa.ipc.new_stream(output, batch.schema))
+            writer.write_batch(batch)
+        yield sink.take()
+    if writer is None:
+        return  # Nothing in range; an empty body rather than a schema-less file
+    writer.close()
+    yield sink.take()
+
+
+def export_stream(name: str, fmt: str, start: Optional[int] = None, end: Optional[int] = None,
+                  resolution: str = "raw", chunk_rows: int = CHUNK_ROWS) -> Iterator[bytes]:
+    """Encoded export of a stored series, produced chunk by chunk"""
+    if not format_available(fmt):
+        raise ValueError(f"Export format '{fmt}' is not available")
+    chunks = iter_chunks(name, start, end, resolution, chunk_rows)
+    if fmt == "ndjson":
+        return _ndjson(chunks)
+    if fmt == "csv":
+        return _csv(chunks)
+    return _arrow(chunks, fmt)
+
+
+def _timestamps(values: Any) -> np.ndarray:
+    """Epoch seconds from datetimes, ISO strings or epoch numbers"""
+    values = pd.Series(values)
+    if pd.api.types.is_numeric_dtype(values):
+        return values.to_numpy(dtype=np.int64)
+    # Parquet and Arrow columns arrive as datetimes already; only text needs parsing
+    parsed = values if pd.api.types.is_datetime64_any_dtype(values) else pd.to_datetime(values, format="ISO8601")
+    if parsed.dt.tz is not None:
+        parsed = parsed.dt.tz_localize(None)  # Keep the wall-clock time, as the store does
+    return parsed.to_numpy(dtype="datetime64[s]").astype(np.int64)
+
+
+def _to_series(frame: pd.DataFrame) -> TimeSeries:
+    if "timestamp" not in frame or "power" not in frame:
+        raise ValueError("Imported data needs at least 'timestamp' and 'power' columns")
+    # Meters that only report power import with zero voltage and current
+    return TimeSeries(
+        _timestamps(frame["timestamp"]),
+        *(frame[column].to_numpy(dtype=COLUMNS[column]) if column in frame
+          else np.zeros(len(frame), dtype=COLUMNS[column]) for column in VALUE_COLUMNS),
+    )
+
+
+def read_chunks(path: str, chunk_rows: int = CHUNK_ROWS) -> Iterator[TimeSeries]:
+    """Rows of a .parquet, .arrow, .csv or .ndjson file, chunk_rows at a time"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension in (".parquet", ".arrow", ".arrows"):
+        if pa is None:
+            raise ValueError(f"Reading {extension} files needs pyarrow installed")
+        if extension == ".parquet":
+            parquet = pq.ParquetFile(path)
+            wanted = [column for column in COLUMNS if column in parquet.schema_arrow.names]
+            batches = parquet.iter_batches(batch_size=chunk_rows, columns=wanted)
+        else:
+            batches = pa.ipc.open_stream(pa.memory_map(path))
+        for batch in batches:
+            yield _to_series(batch.to_pandas())
+    elif extension == ".csv":
+        for frame in pd.read_csv(path, chunksize=chunk_rows, usecols=lambda column: column in COLUMNS):
+            yield _to_series(frame)
+    elif extension in (".ndjson", ".jsonl"):
+        for frame in pd.read_json(path, lines=True, chunksize=chunk_rows, dtype=False):
+            yield _to_series(frame)
+    else:
+        raise ValueError(f"Cannot import '{extension}' files; use .parquet, .arrow, .csv or .ndjson")
+
+
+def _dedupe(series: TimeSeries) -> TimeSeries:
+    """Sort by timestamp, keeping the last row of each timestamp"""
+    order = np.argsort(series.timestamp, kind="stable")
+    timestamps = series.timestamp[order]
+    keep = np.r_[timestamps[1:] != timestamps[:-1], True] if len(timestamps) else np.empty(0, dtype=bool)
+    return series[order[keep]]
+
+
+def _sorted_staged(staging: ColumnStore, name: str, chunk_rows: int) -> TimeSeries:
+    """Staged rows rewritten in time order, chunk by chunk, keeping the last row of each timestamp"""
+    staged = staging.open(name)
+    order = np.argsort(staged.timestamp, kind="stable")
+    timestamps = staged.timestamp[order]
+    keep = order[np.r_[timestamps[1:] != timestamps[:-1], True]] if len(timestamps) else order
+    for first in range(0, len(keep), chunk_rows):
+        staging.append(f"{name}.sorted", staged[keep[first:first + chunk_rows]])
+    return staging.open(f"{name}.sorted")
+
+
+def _merge(existing: TimeSeries, staged: TimeSeries, chunk_rows: int, out: ColumnStore, name: str) -> TimeSeries:
+    """Merge two time-ordered series into `out` one time window at a time
+
+    Each window ends before the chunk_rows-th next row of either series, so
+    it holds at most 2 x chunk_rows rows; staged rows replace existing rows
+    with the same timestamp.
+    """
+    if existing.index.order is not None:
+        existing = existing[existing.index.order]
+    ours, theirs = staged.timestamp, existing.timestamp
+    i = j = 0
+    while i < len(ours) or j < len(theirs):
+        ends = [int(ours[i + chunk_rows])] if i + chunk_rows < len(ours) else []
+        ends += [int(theirs[j + chunk_rows])] if j + chunk_rows < len(theirs) else []
+        firsts = ([int(ours[i])] if i < len(ours) else []) + ([int(theirs[j])] if j < len(theirs) else [])
+        # Rows sharing a timestamp always land in the same window
+        end = max(min(ends), min(firsts) + 1) if ends else None
+        i_end = len(ours) if end is None else int(np.searchsorted(ours, end))
+        j_end = len(theirs) if end is None else int(np.searchsorted(theirs, end))
+        window = TimeSeries(*(np.concatenate([getattr(existing, column)[j:j_end], getattr(staged, column)[i:i_end]])
+                              for column in COLUMNS))
+        out.append(name, _dedupe(window))
+        i, j = i_end, j_end
+    return out.open(name)
+
+
+def import_history(path: str, name: str, replace: bool = False, chunk_rows: int = CHUNK_ROWS,
+                   target: ColumnStore = store) -> Dict[str, Any]:
+    """Backfill a stored series from a file, chunk by chunk
+
+    Rows are first streamed into a staging store. Rows that all come after
+    the stored ones are then appended; anything older or overlapping is
+    merged in one time window at a time, imported rows replacing stored
+    rows with the same timestamp.
+    The series stops following its data/ source file afterwards, so a
+    regenerated source does not overwrite the import. Nothing else should
+    be writing the series meanwhile (pause ingest for main_power_data).
+    """
+    sync_source(name)
+    os.makedirs(target.root, exist_ok=True)
+    staging = ColumnStore(tempfile.mkdtemp(prefix=".import-", dir=target.root))
+    try:
+        with span(log, "import history", series=name, source=path) as fields:
+            imported, ordered, last = 0, True, None
+            for chunk in read_chunks(path, chunk_rows):
+                if not len(chunk):
+                    continue
+                ordered = ordered and bool((np.diff(chunk.timestamp) > 0).all()) and (
+                    last is None or chunk.timestamp[0] > last)
+                last = int(chunk.timestamp[-1]) if last is None else max(last, int(chunk.timestamp.max()))
+                staging.append(name, chunk)
+                imported += len(chunk)
+
+            staged = staging.open(name) if ordered else _sorted_staged(staging, name, chunk_rows)
+            existing = TimeSeries.empty() if replace else target.open(name)
+            meta = {key: value for key, value in target.read_meta(name).items()
+                    if key not in ("source", "source_mtime", "rows", "encoding")}
+            meta["imported_from"] = os.path.abspath(path)
+
+            if not len(existing):
+                mode = "replace" if replace else "load"
+                target.write_compact(name, staged, meta)
+            elif len(staged) and staged.timestamp[0] > existing.timestamp.max() \
+                    and not target.has_runs(name):
+                mode = "append"
+                for first in range(0, len(staged), chunk_rows):
+                    target.append(name, staged[first:first + chunk_rows])
+                target.write_meta(name, dict(meta, rows=len(existing) + len(staged)))
+            else:
+                mode = "merge"
+                merged = _merge(existing, staged, chunk_rows, staging, f"{name}.merged")
+                # Run-encoded series are small; dense ones are copied from the staged columns
+                if target.has_runs(name):
+                    target.write_compact(name, merged, meta)
+                else:
+                    target.write(name, merged, meta)
+            fields.update(rows=imported, mode=mode)
+    finally:
+        shutil.rmtree(staging.root, ignore_errors=True)
+
+    log.info("imported %s", path, extra=fields)
+    return {"series": name, "rows_imported": imported, "mode": mode, "rows": target.read_meta(name).get("rows")}
+
+
+def series_for(meter: Meter, series: str) -> str:
+    """Store name for "main" or one of the meter's appliances"""
+    return meter.main_series if series == "main" else meter.appliance_series(series)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk export and import of WattWise history")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser("export", help="Write a series to .parquet, .arrow, .csv or .ndjson")
+    export.add_argument("output", help="Output file; the format follows its extension ('-' for NDJSON on stdout)")
+    export.add_argument("--from", dest="start", help="First timestamp (ISO)")
+    export.add_argument("--to", dest="end", help="End timestamp, exclusive (ISO)")
+    export.add_argument("--resolution", choices=RESOLUTIONS, default="raw")
+
+    backfill = commands.add_parser("import", help="Backfill a series from .parquet, .arrow, .csv or .ndjson")
+    backfill.add_argument("input")
+    backfill.add_argument("--replace", action="store_true", help="Replace the stored series instead of merging")
+
+    for command in (export, backfill):
+        command.add_argument("--meter", default=DEFAULT_METER)
+        command.add_argument("--series", default="main", help="'main' or an appliance name")
+        command.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    name = series_for(Meter(id=args.meter), args.series)
+
+    if args.command == "import":
+        result = import_history(args.input, name, args.replace, args.chunk_rows)
+        print(f"{result['series']}: {result['rows_imported']} rows imported ({result['mode']}), "
+              f"{result['rows']} rows stored")
+        return
+
+    fmt = "ndjson" if args.output == "-" else os.path.splitext(args.output)[1].lstrip(".").lower()
+    fmt = {"jsonl": "ndjson", "arrows": "arrow"}.get(fmt, fmt)
+    if not format_available(fmt):
+        raise SystemExit(f"Cannot export to '{args.output}'" + (" without pyarrow" if fmt in ARROW_FORMATS else ""))
+    start = to_epoch(datetime.fromisoformat(args.start)) if args.start else None
+    end = to_epoch(datetime.fromisoformat(args.end)) if args.end else None
+
+    output = sys.stdout.buffer if args.output == "-" else open(args.output, "wb")
+    try:
+        for part in export_stream(name, fmt, start, end, args.resolution, args.chunk_rows):
+            output.write(part)
+    finally:
+        if output is not sys.stdout.buffer:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,120 +1,160 @@
-import json
-import random
-from datetime import datetime, timedelta
-import math
+import argparse
 import os
-
-def generate_realistic_power_data():
-    """Generate realistic power consumption data from 1 May to 31 July 2025"""
-    data = []
-    start_date = datetime(2025, 5, 1, 0, 0, 0)
-    end_date = datetime(2025, 7, 31, 23, 59, 59)
-    current = start_date
-
-    while current <= end_date:
-        hour = current.hour
-
-        base_power = 800 + 400 * math.sin((hour - 6) * math.pi / 12)
-
-        if current.weekday() < 5:  # Weekdays
-            base_power *= 1.1
-
-        power = base_power + random.uniform(-100, 150)
-        power = max(200, power)
-
-        voltage = random.uniform(220, 240)
-        current_amp = power / voltage
-
-        data.append({
-            "timestamp": current.isoformat(),
-            "voltage": round(voltage, 1),
-            "current": round(current_amp, 2),
-            "power": round(power, 0)
-        })
-
-        current += timedelta(seconds=10)
-
-    return data
-
-def generate_appliance_data(appliance_name, base_power, usage_pattern):
-    data = []
-    start_date = datetime(2025, 5, 1, 0, 0, 0)
-    end_date = datetime(2025, 7, 31, 23, 59, 59)
-    current = start_date
-
-    while current <= end_date:
-        hour = current.hour
-        is_on = False
-
-        if appliance_name == "fridge":
-            cycle_factor = math.sin((hour - 14) * math.pi / 12) * 0.3 + 0.7
-            is_on = random.random() < cycle_factor * 0.6
-
-        elif appliance_name == "ac":
-            if 11 <= hour <= 23:
-                is_on = random.random() < 0.8
-            else:
-                is_on = random.random() < 0.1
-
-        elif appliance_name == "geyser":
-            if (6 <= hour <= 9) or (18 <= hour <= 22):
-                is_on = random.random() < 0.7
-            else:
-                is_on = random.random() < 0.05
-
-        elif appliance_name == "microwave":
-            if hour in [7, 8, 12, 13, 19, 20, 21]:
-                is_on = random.random() < 0.3
-            else:
-                is_on = random.random() < 0.02
-
-        if is_on:
-            power = base_power + random.uniform(-base_power * 0.1, base_power * 0.1)
-            voltage = random.uniform(220, 240)
-            current_amp = power / voltage
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+from meters import Meter, DEFAULT_METER
+from timeseries_store import (DATA_DIR, ROW_BYTES, RUNS_MAX_RATIO, ColumnStore, RunLengthSeries, TimeSeries,
+                              to_epoch, write_source)
+
+# Appliance -> rated power in watts
+APPLIANCES = {
+    "fridge": 150,
+    "ac": 1500,
+    "geyser": 2000,
+    "microwave": 800,
+}
+
+SERIES = ["main_power_data"] + [f"{appliance}_data" for appliance in APPLIANCES]
+
+HOURS = np.arange(24)
+
+
+def on_probability(appliance: str) -> np.ndarray:
+    """Chance that an appliance is running, for each hour of the day"""
+    if appliance == "fridge":
+        return (np.sin((HOURS - 14) * np.pi / 12) * 0.3 + 0.7) * 0.6
+    if appliance == "ac":
+        return np.where((HOURS >= 11) & (HOURS <= 23), 0.8, 0.1)
+    if appliance == "geyser":
+        return np.where(((HOURS >= 6) & (HOURS <= 9)) | ((HOURS >= 18) & (HOURS <= 22)), 0.7, 0.05)
+    if appliance == "microwave":
+        return np.where(np.isin(HOURS, [7, 8, 12, 13, 19, 20, 21]), 0.3, 0.02)
+    raise ValueError(f"Unknown appliance '{appliance}'")
+
+
+def generate_realistic_power_data(timestamps: np.ndarray, rng: np.random.Generator) -> TimeSeries:
+    """Whole-house readings: a daily sine curve, busier on weekdays, with noise"""
+    hour = (timestamps // 3600) % 24
+    weekday = (timestamps // 86400 + 3) % 7  # 1970-01-01 was a Thursday
+
+    power = 800 + 400 * np.sin((hour - 6) * np.pi / 12)
+    power = np.where(weekday < 5, power * 1.1, power)
+    power = np.maximum(200, power + rng.uniform(-100, 150, len(timestamps)))
+    voltage = rng.uniform(220, 240, len(timestamps))
+    return TimeSeries(timestamps, np.round(voltage, 1), np.round(power / voltage, 2), np.round(power, 0))
+
+
+def generate_appliance_data(appliance: str, timestamps: np.ndarray, rng: np.random.Generator) -> TimeSeries:
+    """One appliance switching on and off by time of day; all zeros while off"""
+    base_power = APPLIANCES[appliance]
+    hour = (timestamps // 3600) % 24
+    is_on = rng.random(len(timestamps)) < on_probability(appliance)[hour]
+
+    power = np.where(is_on, base_power + rng.uniform(-base_power * 0.1, base_power * 0.1, len(timestamps)), 0)
+    voltage = np.where(is_on, rng.uniform(220, 240, len(timestamps)), 0)
+    current = np.divide(power, voltage, out=np.zeros(len(timestamps)), where=is_on)
+    return TimeSeries(timestamps, np.round(voltage, 1), np.round(current, 2), np.round(power, 0))
+
+
+def series_name(meter: int, series: str) -> str:
+    """Meter 0 is the default meter; further meters go to their own shards"""
+    meter_id = DEFAULT_METER if meter == 0 else f"meter{meter:04d}"
+    return Meter(id=meter_id).series_name(series)
+
+
+def generate_series(meter: int, series: str, start: int, end: int, interval: int,
+                    chunk_rows: int, seed: int, data_dir: str, output: str):
+    """Generate one meter's series chunk by chunk; returns (name, rows)
+
+    Each chunk has its own RNG derived from (seed, meter, series, chunk), so
+    the output does not depend on the number of worker processes. Appliance
+    series that are off most of the time go to the store as on/off runs.
+    """
+    name = series_name(meter, series)
+    store = ColumnStore(os.path.join(data_dir, "store"))
+    total = (end - start) // interval + 1
+    chunks = []
+    runs = None  # Encoded chunks, once the series turns out to be sparse
+    meta = {"source": "data_generator", "seed": seed, "interval": interval}
+    if output == "store":
+        store.write(name, TimeSeries.empty(), meta)
+
+    for number, first in enumerate(range(0, total, chunk_rows)):
+        rng = np.random.default_rng([seed, meter, SERIES.index(series), number])
+        timestamps = start + interval * np.arange(first, min(first + chunk_rows, total), dtype=np.int64)
+        if series == "main_power_data":
+            chunk = generate_realistic_power_data(timestamps, rng)
+        else:
+            chunk = generate_appliance_data(series[:-len("_data")], timestamps, rng)
+
+        if output == "store" and series != "main_power_data" and number == 0:
+            # Judge from the first chunk whether runs pay off for this appliance
+            encoded = RunLengthSeries.encode(chunk, interval)
+            if encoded.nbytes <= RUNS_MAX_RATIO * len(chunk) * ROW_BYTES:
+                runs = [encoded]
+                continue
+        if runs is not None:
+            runs.append(RunLengthSeries.encode(chunk, interval))
+        elif output == "store":
+            store.append(name, chunk)  # Stream to disk; only one chunk is ever in memory
         else:
-            power = 0
-            voltage = 0
-            current_amp = 0
-
-        data.append({
-            "timestamp": current.isoformat(),
-            "voltage": round(voltage, 1),
-            "current": round(current_amp, 2),
-            "power": round(power, 0)
-        })
-
-        current += timedelta(seconds=10)
-
-    return data
-
-def main():
-    print("Generating main power consumption data...")
-    main_data = generate_realistic_power_data()
-    with open('data/main_power_data.json', 'w') as f:
-        json.dump(main_data, f, indent=2)
-
-    appliances = [
-        ("fridge", 150, "continuous"),
-        ("ac", 1500, "peak_hours"),
-        ("geyser", 2000, "morning_evening"),
-        ("microwave", 800, "meal_times")
-    ]
-
-    for appliance_name, base_power, pattern in appliances:
-        print(f"Generating {appliance_name} data...")
-        appliance_data = generate_appliance_data(appliance_name, base_power, pattern)
-        with open(f'data/{appliance_name}_data.json', 'w') as f:
-            json.dump(appliance_data, f, indent=2)
+            chunks.append(chunk)
+
+    if runs is not None:
+        store.write_runs(name, RunLengthSeries.concat(runs), meta)
+    elif output == "store":
+        store.write_meta(name, dict(meta, rows=total))
+    else:
+        series_data = TimeSeries(*(np.concatenate([getattr(chunk, column) for chunk in chunks])
+                                   for column in ("timestamp", "voltage", "current", "power")))
+        path = os.path.join(data_dir, f"{name}.{output}")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_source(path, series_data)
+    return name, total
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic WattWise meter data")
+    parser.add_argument("--start", default="2025-05-01T00:00:00", help="First timestamp (ISO)")
+    parser.add_argument("--end", default="2025-07-31T23:59:59", help="Last timestamp, inclusive (ISO)")
+    parser.add_argument("--interval", type=int, default=10, help="Seconds between samples")
+    parser.add_argument("--meters", type=int, default=1, help="Number of meters to generate")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed; the same seed gives the same data")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Generator processes")
+    parser.add_argument("--chunk-rows", type=int, default=100_000, help="Rows generated and written at a time")
+    parser.add_argument("--output", choices=["store", "npz", "json"], default="store",
+                        help="Write straight to the column store (streamed), or to data/<name>.npz/.json files")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    start = to_epoch(datetime.fromisoformat(args.start))
+    end = to_epoch(datetime.fromisoformat(args.end))
+    if end < start:
+        raise SystemExit("--end must not be before --start")
+    os.makedirs(args.data_dir, exist_ok=True)
+
+    jobs = [(meter, series, start, end, args.interval, args.chunk_rows, args.seed, args.data_dir, args.output)
+            for meter in range(args.meters) for series in SERIES]
+    print(f"Generating {len(jobs)} series for {args.meters} meter(s) with {args.workers} worker(s)...")
+
+    # Each job streams its own series, so jobs can run in parallel processes
+    pool = ProcessPoolExecutor(args.workers) if args.workers > 1 else None
+    try:
+        results = pool.map(generate_series, *zip(*jobs)) if pool else map(generate_series, *zip(*jobs))
+        for name, rows in results:
+            print(f"- {name}: {rows} rows")
+    finally:
+        if pool:
+            pool.shutdown()
 
     print("Data generation completed!")
-    print("Generated files:")
-    print("- data/main_power_data.json")
-    print("- data/fridge_data.json")
-    print("- data/ac_data.json")
-    print("- data/geyser_data.json")
-    print("- data/microwave_data.json")
+
 
 if __name__ == "__main__":
-    os.makedirs('data', exist_ok=True)
     main()
@@ -0,0 +1,136 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable
+
+from timeseries_store import RunLengthSeries, TimeSeries, load_runs, load_series, series_version
+from tracing import get_logger
+
+DEFAULT_MAX_BYTES = int(os.environ.get("WATTWISE_CACHE_MB", "512")) * 1024 * 1024
+
+log = get_logger("cache")
+
+_MISSING = object()
+
+
+def _sizeof(value: Any) -> int:
+    """Approximate resident size of a cached value"""
+    if hasattr(value, "nbytes"):
+        return int(value.nbytes)
+    if isinstance(value, dict):
+        return sum(_sizeof(item) for item in value.values())
+    return 0
+
+
+class DatasetCache:
+    """Process-wide LRU cache of loaded datasets, invalidated when their version changes"""
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (version, value, size)
+        self._counters: Dict[Hashable, int] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def bump(self, key: Hashable):
+        """Mark a dataset as changed, e.g. after ingest appended to it in memory"""
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+
+    def counter(self, key: Hashable) -> int:
+        return self._counters.get(key, 0)
+
+    def get(self, key: Hashable, version: Hashable, loader: Callable[[], Any]) -> Any:
+        """Return the cached value for key if it is still at version, else load and cache it"""
+        version = (version, self.counter(key))
+        value = self._lookup(key, version)
+        if value is _MISSING:
+            value = loader()
+            self._put(key, version, value)
+        return value
+
+    def lookup(self, key: Hashable, version: Hashable) -> Any:
+        """The cached value for key if it is still at version, else None"""
+        value = self._lookup(key, (version, self.counter(key)))
+        return None if value is _MISSING else value
+
+    def put(self, key: Hashable, version: Hashable, value: Any):
+        """Cache a value computed elsewhere, e.g. fanned out over worker processes"""
+        self._put(key, (version, self.counter(key)), value)
+
+    def _lookup(self, key: Hashable, version: tuple) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return _MISSING
+
+    def _put(self, key: Hashable, version: tuple, value: Any):
+        size = _sizeof(value)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            if size <= self.max_bytes:
+                self._entries[key] = (version, value, size)
+                self._bytes += size
+                self._evict()
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and self._entries:
+            key, (_, _, size) = self._entries.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+            log.debug("evicted", extra={"key": repr(key), "bytes": size})
+
+    def peek(self, key: Hashable) -> Any:
+        """Last cached value for key regardless of version, for incremental refreshes"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry[1] if entry is not None else None
+
+    def invalidate(self, key: Hashable = None):
+        """Drop one dataset, or everything when key is None"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+                self._bytes = 0
+            elif key in self._entries:
+                self._bytes -= self._entries.pop(key)[2]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+dataset_cache = DatasetCache()
+
+
+def dataset_version(name: str) -> tuple:
+    """Changes whenever a series is rewritten, appended to or bumped by live ingest"""
+    return series_version(name), dataset_cache.counter(name)
+
+
+def get_series(name: str) -> TimeSeries:
+    """Shared, cached view of a stored series"""
+    return dataset_cache.get(name, series_version(name), lambda: load_series(name))
+
+
+def get_runs(name: str) -> RunLengthSeries:
+    """Shared, cached run-length view of a stored series, for appliance queries"""
+    return dataset_cache.get(("runs", name), series_version(name), lambda: load_runs(name))
@@ -0,0 +1,95 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from accumulators import get_accumulator
+from dataset_cache import get_series
+from meters import Meter, registry
+from tariffs import TariffPlan, evaluate_plans
+from timeseries_store import to_epoch
+
+
+def meter_partial(meter: Meter, start: datetime, end: Optional[datetime],
+                  plans: Optional[List[TariffPlan]] = None) -> Dict[str, Any]:
+    """Mergeable aggregates of one meter's consumption in [start, end)"""
+    series = get_series(meter.main_series)
+    days, daily_wh = get_accumulator(meter.main_series).daily_wh(start, end)
+    window = series.between(to_epoch(start), to_epoch(end) if end else None)
+    partial = {
+        "meter": meter.id,
+        "units": float(daily_wh.sum()) / 1000,
+        "hourly_wh": np.asarray(daily_wh).sum(axis=0) if len(daily_wh) else np.zeros(24),
+        "peak_power": float(window.power.max()) if len(window) else 0.0,
+        "current_power": float(series.power[-1]) if len(series) else 0.0,
+        "last_reading": series.record(len(series) - 1)["timestamp"] if len(series) else None,
+    }
+    if plans:
+        # Slabs and fixed charges apply per household, so each meter is billed on its own
+        partial["bills"] = evaluate_plans(plans, days, daily_wh)
+    return partial
+
+
+def shard_partials(meter_ids: Sequence[str], start: datetime, end: Optional[datetime],
+                   plans: Optional[List[TariffPlan]] = None) -> List[Dict[str, Any]]:
+    """Partials for a group of meters; runs in a worker process, which opens the shards itself"""
+    meters = registry.meters()
+    return [meter_partial(meters[meter_id], start, end, plans) for meter_id in meter_ids if meter_id in meters]
+
+
+def split(meter_ids: List[str], groups: int) -> List[tuple]:
+    """Meter ids dealt into at most `groups` similar-sized groups"""
+    groups = max(1, min(groups, len(meter_ids)))
+    return [tuple(meter_ids[i::groups]) for i in range(groups) if meter_ids[i::groups]]
+
+
+def merge_load(partials: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Fleet-wide load from per-meter partials"""
+    hourly_wh = np.sum([partial["hourly_wh"] for partial in partials], axis=0) if partials else np.zeros(24)
+    return {
+        "meters": len(partials),
+        "current_power": round(sum(partial["current_power"] for partial in partials), 2),
+        "units": round(sum(partial["units"] for partial in partials), 2),
+        "hourly_units": np.round(hourly_wh / 1000, 3).tolist(),
+        "peak_hour": int(hourly_wh.argmax()) if hourly_wh.any() else None,
+    }
+
+
+def top_consumers(partials: List[Dict[str, Any]], limit: int) -> List[Dict[str, Any]]:
+    """Meters ranked by units, with their share of the fleet total"""
+    total = sum(partial["units"] for partial in partials) or 1.0
+    ranked = sorted(partials, key=lambda partial: partial["units"], reverse=True)[:limit]
+    return [
+        {
+            "meter": partial["meter"],
+            "units": round(partial["units"], 2),
+            "share": round(partial["units"] / total, 4),
+            "peak_power": round(partial["peak_power"], 2),
+            "last_reading": partial["last_reading"],
+        }
+        for partial in ranked
+    ]
+
+
+def merge_bills(partials: List[Dict[str, Any]], plans: List[TariffPlan]) -> List[Dict[str, Any]]:
+    """Fleet totals per plan, summed over the meters' individual bills"""
+    merged = []
+    for index, plan in enumerate(plans):
+        total = {"plan": plan.name, "units": 0.0, "bands": {}, "energy_cost": 0.0,
+                 "slab_cost": 0.0, "fixed_charge": 0.0, "total_cost": 0.0}
+        for partial in partials:
+            bill = partial["bills"][index]
+            for key in ("units", "energy_cost", "slab_cost", "fixed_charge", "total_cost"):
+                total[key] += bill[key]
+            for name, band in bill["bands"].items():
+                entry = total["bands"].setdefault(name, {"units": 0.0, "cost": 0.0})
+                entry["units"] += band["units"]
+                entry["cost"] += band["cost"]
+
+        for key in ("units", "energy_cost", "slab_cost", "fixed_charge", "total_cost"):
+            total[key] = round(total[key], 2)
+        total["bands"] = {name: {key: round(value, 2) for key, value in entry.items()}
+                          for name, entry in total["bands"].items()}
+        merged.append(total)
+    merged.sort(key=lambda bill: bill["total_cost"])
+    return merged
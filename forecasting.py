@@ -0,0 +1,206 @@
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Tuple
+
+import numpy as np
+
+from accumulators import get_accumulator
+from dataset_cache import dataset_cache, get_series
+from timeseries_store import TimeSeries, rows_after, series_version, to_epoch
+
+HOURS_PER_WEEK = 168
+
+# The hour-of-week profile forgets old weeks with this half-life, so it
+# follows seasonal drift; the short-term level (how far the last hours ran
+# above or below the profile) is smoothed, and fades out of the forecast,
+# with a half-life in hours
+SEASON_HALF_LIFE_WEEKS = 4
+LEVEL_HALF_LIFE_HOURS = 6
+
+SEASON_DECAY = 0.5 ** (1 / (SEASON_HALF_LIFE_WEEKS * HOURS_PER_WEEK))  # Per hour
+LEVEL_DECAY = 0.5 ** (1 / LEVEL_HALF_LIFE_HOURS)
+
+
+def week_slot(hours: np.ndarray) -> np.ndarray:
+    """Hour of week (Monday 00:00 = 0) of epoch hour numbers"""
+    return ((hours // 24 + 3) % 7) * 24 + hours % 24  # 1970-01-01 was a Thursday
+
+
+class Forecaster:
+    """Hourly load forecast from a seasonal hour-of-week profile plus exponential smoothing
+
+    Readings are averaged per clock hour. Each completed hour is folded into
+    exponentially weighted sums per hour-of-week slot (the profile) and into
+    a smoothed residual against that profile (the level). Folding is
+    vectorized over any number of hours, so fitting the whole history and
+    taking one new hour are the same operation. The forecast for an hour
+    ahead is its slot's profile plus the level, damped the further out it is.
+    """
+
+    def __init__(self):
+        self._weighted_sum = np.zeros(HOURS_PER_WEEK)  # Per slot, decayed to self.hour
+        self._weight = np.zeros(HOURS_PER_WEEK)
+        self.level = 0.0
+        self.hour = None  # Last completed epoch hour
+        self._open_hour = None  # Hour still receiving readings, and its running sum and count
+        self._open_sum = 0.0
+        self._open_count = 0
+        self.rows = 0
+        self.first_timestamp = None
+        self.last_timestamp = None
+        self._forecasts = {}  # hours -> next_hours() result, until another hour completes
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build(cls, series: TimeSeries) -> "Forecaster":
+        forecaster = cls()
+        forecaster.append(series)
+        return forecaster
+
+    @property
+    def nbytes(self) -> int:
+        return self._weighted_sum.nbytes + self._weight.nbytes
+
+    def append(self, series: TimeSeries):
+        """Average newly arrived readings into their hours and fold in every hour they complete"""
+        with self._lock:
+            self._append(series)
+
+    def _append(self, series: TimeSeries):
+        if not len(series):
+            return
+        hours = series.timestamp // 3600
+        powers = series.power.astype(np.float64)
+        if self._open_hour is not None:
+            hours = np.r_[self._open_hour, hours]
+            powers = np.r_[self._open_sum, powers]
+            counts = np.r_[self._open_count, np.ones(len(series), dtype=np.int64)]
+        else:
+            counts = np.ones(len(series), dtype=np.int64)
+
+        unique, inverse = np.unique(hours, return_inverse=True)
+        sums = np.bincount(inverse, weights=powers)
+        totals = np.bincount(inverse, weights=counts)
+        # The newest hour stays open; anything older is complete
+        self._fold(unique[:-1], sums[:-1] / totals[:-1])
+        self._open_hour = int(unique[-1])
+        self._open_sum = float(sums[-1])
+        self._open_count = int(totals[-1])
+
+        if self.first_timestamp is None:
+            self.first_timestamp = int(series.timestamp[0])
+        self.rows += len(series)
+        self.last_timestamp = int(series.timestamp[-1])
+
+    def _fold(self, hours: np.ndarray, means: np.ndarray):
+        if self.hour is not None:
+            # Late readings for an hour already folded cannot be taken back; skip them
+            newer = hours > self.hour
+            hours, means = hours[newer], means[newer]
+        if not len(hours):
+            return
+
+        latest = int(hours[-1])
+        slots = week_slot(hours)
+        carried = SEASON_DECAY ** (latest - self.hour) if self.hour is not None else 0.0
+        weights = SEASON_DECAY ** (latest - hours)
+        self._weighted_sum = self._weighted_sum * carried + np.bincount(slots, weights=means * weights,
+                                                                        minlength=HOURS_PER_WEEK)
+        self._weight = self._weight * carried + np.bincount(slots, weights=weights, minlength=HOURS_PER_WEEK)
+
+        residuals = means - self.profile()[slots]
+        level_weights = (1 - LEVEL_DECAY) * LEVEL_DECAY ** (latest - hours)
+        level_carried = LEVEL_DECAY ** (latest - self.hour) if self.hour is not None else 0.0
+        self.level = self.level * level_carried + float(residuals @ level_weights)
+        self.hour = latest
+        self._forecasts.clear()
+
+    def profile(self) -> np.ndarray:
+        """Expected mean power for each of the 168 hours of the week
+
+        Slots not seen yet borrow the same hour of day from other weekdays,
+        then the overall mean.
+        """
+        seen = self._weight > 0
+        if not seen.any():
+            return np.zeros(HOURS_PER_WEEK)
+        profile = np.divide(self._weighted_sum, self._weight, out=np.zeros(HOURS_PER_WEEK), where=seen)
+        by_day = self._weight.reshape(7, 24).sum(axis=0)
+        hour_of_day = np.divide(self._weighted_sum.reshape(7, 24).sum(axis=0), by_day,
+                                out=np.full(24, self._weighted_sum.sum() / self._weight.sum()), where=by_day > 0)
+        return np.where(seen, profile, np.tile(hour_of_day, 7))
+
+    def predict(self, first_hour: int, hours: int) -> np.ndarray:
+        """Forecast mean power (W) for `hours` epoch hours from first_hour on"""
+        ahead = first_hour + np.arange(hours, dtype=np.int64)
+        if self.hour is None:
+            # Less than an hour of readings: carry the open hour's mean forward
+            mean = self._open_sum / self._open_count if self._open_count else 0.0
+            return np.full(hours, mean)
+        damping = LEVEL_DECAY ** np.maximum(ahead - self.hour, 0)
+        return np.maximum(self.profile()[week_slot(ahead)] + self.level * damping, 0.0)
+
+    def next_hours(self, hours: int = 24) -> Dict[str, np.ndarray]:
+        """Forecast from the current (open) hour on; reused until another hour completes"""
+        with self._lock:
+            forecast = self._forecasts.get(hours)
+            if forecast is None:
+                if self._open_hour is None:
+                    return {"timestamp": np.empty(0, dtype=np.int64), "power": np.empty(0)}
+                power = self.predict(self._open_hour, hours)
+                forecast = self._forecasts[hours] = {
+                    "timestamp": (self._open_hour + np.arange(hours, dtype=np.int64)) * 3600,
+                    "power": power,
+                }
+            return forecast
+
+    def sync(self, series: TimeSeries) -> "Forecaster":
+        """Catch up with a series that may have grown; refit if it was rewritten instead"""
+        # Read and advance the cursor under one lock so concurrent refreshes fold each hour once
+        with self._lock:
+            newer = rows_after(series, self.rows, self.first_timestamp, self.last_timestamp)
+            if newer is not None:
+                self._append(newer)
+                return self
+        return Forecaster.build(series)
+
+
+def get_forecaster(name: str) -> Forecaster:
+    """Shared forecaster for a stored series, updated incrementally when it grows"""
+    key = ("forecast", name)
+
+    def refresh():
+        series = get_series(name)
+        previous = dataset_cache.peek(key)
+        if previous is None:
+            return Forecaster.build(series)
+        return previous.sync(series)
+
+    return dataset_cache.get(key, series_version(name), refresh)
+
+
+def projected_month(name: str, month_start: datetime) -> Tuple[np.ndarray, np.ndarray]:
+    """(epoch days, day x hour Wh) for the whole month: energy booked so far, forecast for the rest"""
+    month_end = (month_start + timedelta(days=32)).replace(day=1)
+    first_day = to_epoch(month_start) // 86400
+    days = np.arange(first_day, to_epoch(month_end) // 86400)
+    grid = np.zeros((len(days), 24))
+
+    booked_days, booked_wh = get_accumulator(name).daily_wh(month_start, month_end)
+    grid[booked_days - first_day] = booked_wh
+
+    forecaster = get_forecaster(name)
+    if forecaster.last_timestamp is None:
+        return days, grid
+    # Forecast from the newest reading (the accumulator has not booked it yet) to the end of the month
+    start = max(forecaster.last_timestamp, to_epoch(month_start))
+    end = to_epoch(month_end)
+    if start >= end:
+        return days, grid
+    first_hour = start // 3600
+    power = forecaster.predict(first_hour, (end - 1) // 3600 - first_hour + 1)
+    seconds = np.full(len(power), 3600.0)
+    seconds[0] = (first_hour + 1) * 3600 - start
+    cells = first_hour + np.arange(len(power)) - first_day * 24
+    grid.reshape(-1)[cells] += power * seconds / 3600
+    return days, grid
@@ -0,0 +1,318 @@
+import json
+import os
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from timeseries_store import DATA_DIR, SAMPLE_SECONDS, TimeSeries, from_epoch, load_series, store, to_epoch
+from tracing import get_logger, span
+
+log = get_logger("ingest")
+
+INGEST_DIR = os.path.join(DATA_DIR, "ingest")
+
+# Readings reach the column store within a flush interval, so the log only
+# needs its newest segments (by default about two days at hourly rotation);
+# 0 keeps every segment
+KEEP_SEGMENTS = int(os.environ.get("WATTWISE_INGEST_KEEP_SEGMENTS", "48"))
+
+# Grid slots the meter skipped repeat the previous reading for up to this
+# long; a longer silence is left as a gap in the history
+MAX_HOLD_SECONDS = 60
+
+
+class FrameParser:
+    """Reassembles the pretty-printed JSON frames the meter writes over serial, one line at a time"""
+
+    def __init__(self):
+        self.buffer: List[str] = []
+        self.recording = False
+        self.frames = 0
+        self.errors = 0
+        self.skipped = 0
+
+    def feed(self, line: str) -> Optional[Dict[str, Any]]:
+        """Consume one line; returns a frame once its closing brace arrives"""
+        line = line.strip()
+        if '{' in line:
+            self.recording = True
+            self.buffer = [line]
+            if '}' not in line:
+                return None
+        elif self.recording:
+            self.buffer.append(line)
+            if '}' not in line:
+                return None
+        else:
+            self.skipped += 1
+            return None
+
+        self.recording = False
+        text = '\n'.join(self.buffer)
+        self.buffer = []
+        try:
+            frame = json.loads(text)
+        except json.JSONDecodeError:
+            self.errors += 1
+            return None
+        if not isinstance(frame, dict):
+            self.errors += 1
+            return None
+        self.frames += 1
+        return frame
+
+
+def read_frames(readline: Callable[[], bytes], parser: FrameParser = None, follow: bool = True) -> Iterator[Dict[str, Any]]:
+    """Yield frames from any readline() source: a serial port, a pty or a replay file
+
+    With follow=True an empty read (a serial timeout) is retried; with
+    follow=False it is treated as end of input.
+    """
+    parser = parser or FrameParser()
+    while True:
+        raw = readline()
+        if not raw:
+            if follow:
+                continue
+            return
+        if isinstance(raw, bytes):
+            raw = raw.decode('utf-8', errors='ignore')
+        frame = parser.feed(raw)
+        if frame is not None:
+            yield frame
+
+
+def open_serial(port: str, baud: int = 115200, timeout: float = 2):
+    """Open a serial port (or a pty path) with pyserial"""
+    import serial  # Only needed when reading real hardware
+
+    return serial.Serial(port, baud, timeout=timeout)
+
+
+class SegmentLog:
+    """Append-only NDJSON log split into segments, rotated by size or age and fsynced in batches
+
+    Only the newest keep_segments segments are kept; older ones were flushed
+    to the column store long before.
+    """
+
+    def __init__(self, directory: str = INGEST_DIR, max_bytes: int = 4 * 1024 * 1024,
+                 max_age_seconds: float = 3600, fsync_every: int = 20, fsync_seconds: float = 5.0,
+                 keep_segments: int = KEEP_SEGMENTS):
+        self.directory = directory
+        self.keep_segments = keep_segments
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.fsync_every = fsync_every
+        self.fsync_seconds = fsync_seconds
+        self._file = None
+        self._opened_at = 0.0
+        self._unsynced = 0
+        self._last_sync = 0.0
+
+    def segments(self) -> List[str]:
+        """Segment paths, oldest first"""
+        try:
+            names = sorted(name for name in os.listdir(self.directory)
+                           if name.startswith("segment-") and name.endswith(".ndjson"))
+        except FileNotFoundError:
+            return []
+        return [os.path.join(self.directory, name) for name in names]
+
+    def _open_next(self):
+        os.makedirs(self.directory, exist_ok=True)
+        segments = self.segments()
+        sequence = int(os.path.basename(segments[-1])[8:-7]) + 1 if segments else 0
+        # Start a fresh segment rather than appending after a possibly torn last line
+        path = os.path.join(self.directory, f"segment-{sequence:08d}.ndjson")
+        self._file = open(path, "a", encoding="utf-8")
+        self._opened_at = time.monotonic()
+        self.prune()
+
+    def prune(self):
+        """Delete all but the newest keep_segments segments (the open one included)"""
+        if self.keep_segments <= 0:
+            return
+        for path in self.segments()[:-max(self.keep_segments, 1)]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def append(self, record: Dict[str, Any]):
+        if self._file is None:
+            self._open_next()
+        elif (self._file.tell() >= self.max_bytes
+              or time.monotonic() - self._opened_at >= self.max_age_seconds):
+            self.close()
+            self._open_next()
+
+        self._file.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self._file.flush()
+        self._unsynced += 1
+        if (self._unsynced >= self.fsync_every
+                or time.monotonic() - self._last_sync >= self.fsync_seconds):
+            self.sync()
+
+    def sync(self):
+        if self._file is not None and self._unsynced:
+            os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def close(self):
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
+
+    def tail_record(self) -> Optional[Dict[str, Any]]:
+        """Last complete record, read from the end of the newest non-empty segment"""
+        for path in reversed(self.segments()):
+            with open(path, "rb") as f:
+                f.seek(0, os.SEEK_END)
+                size = f.tell()
+                if not size:
+                    continue
+                f.seek(max(size - 4096, 0))
+                lines = f.read().split(b"\n")
+            # The final element is either empty or a half-written line
+            for line in reversed(lines[:-1]):
+                try:
+                    return json.loads(line)
+                except ValueError:
+                    continue
+        return None
+
+    def iter_records(self) -> Iterator[Dict[str, Any]]:
+        """Every complete record in the log, oldest first"""
+        for path in self.segments():
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if not line.endswith("\n"):
+                        break
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
+
+
+class GridResampler:
+    """Averages live readings onto the SAMPLE_SECONDS grid that the history and its consumers assume
+
+    The meter reports about every 5.5 s, while everything downstream books
+    each row as SAMPLE_SECONDS of its reading. Each grid slot becomes one
+    row holding the mean of the readings that arrived in it, emitted once a
+    reading for a later slot arrives. Empty slots repeat the row before
+    them for up to max_hold_seconds; longer silences stay gaps.
+    """
+
+    def __init__(self, step: int = SAMPLE_SECONDS, max_hold_seconds: int = MAX_HOLD_SECONDS,
+                 last_slot: Optional[int] = None):
+        self.step = step
+        self.max_hold_seconds = max_hold_seconds
+        self.last_slot = last_slot  # Start of the last slot emitted (epoch seconds)
+        self._slot = None  # Slot still receiving readings, and their running sums
+        self._sums = [0.0, 0.0, 0.0]
+        self._count = 0
+
+    def add(self, timestamp: int, record: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Take one reading; returns the grid rows it completes"""
+        slot = timestamp // self.step * self.step
+        if self.last_slot is not None and slot <= self.last_slot:
+            return []  # Its slot is already written
+        rows = self._close(slot) if self._slot is not None and slot != self._slot else []
+        if self._slot is None:
+            self._slot = slot
+        for i, column in enumerate(("voltage", "current", "power")):
+            self._sums[i] += record[column]
+        self._count += 1
+        return rows
+
+    def flush(self) -> List[Dict[str, Any]]:
+        """Emit the open slot, e.g. at shutdown"""
+        return self._close() if self._slot is not None else []
+
+    def _close(self, next_slot: int = None) -> List[Dict[str, Any]]:
+        voltage, current, power = (total / self._count for total in self._sums)
+        slots = [self._slot]
+        if next_slot is not None and next_slot - self._slot <= self.max_hold_seconds:
+            slots += range(self._slot + self.step, next_slot, self.step)
+        rows = [{"timestamp": from_epoch(slot).isoformat(), "voltage": voltage, "current": current, "power": power}
+                for slot in slots]
+        self.last_slot = slots[-1]
+        self._slot = None
+        self._sums = [0.0, 0.0, 0.0]
+        self._count = 0
+        return rows
+
+
+class IngestPipeline:
+    """Stamps incoming meter frames, logs them, keeps the latest in memory and feeds the columnar history"""
+
+    def __init__(self, log: SegmentLog = None, store_name: str = "main_power_data",
+                 flush_rows: int = 30, flush_seconds: float = 30.0):
+        self.log = log or SegmentLog()
+        self.store_name = store_name
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self.latest: Optional[Dict[str, Any]] = None
+        self.consumers: List[Callable[[Dict[str, Any]], None]] = []
+        self._pending: List[Dict[str, Any]] = []
+        self._last_flush = time.monotonic()
+        self._last_timestamp = None
+        # Make sure legacy JSON history is converted before live rows are appended after it
+        history = load_series(store_name)
+        self.resampler = GridResampler(last_slot=int(history.timestamp[-1]) if len(history) else None)
+
+    def add_consumer(self, consumer: Callable[[Dict[str, Any]], None]):
+        """Register a callable that receives every ingested record"""
+        self.consumers.append(consumer)
+
+    def ingest(self, frame: Dict[str, Any], received_at: datetime = None) -> Dict[str, Any]:
+        """Record one reading; the device clock is not trusted, so it is stamped on arrival
+
+        The log keeps every reading as it arrived; consumers and the store
+        get the SAMPLE_SECONDS grid rows it resamples to.
+        """
+        received_at = received_at or datetime.now()
+        if self._last_timestamp is not None and received_at < self._last_timestamp:
+            received_at = self._last_timestamp  # Keep the history time-ordered
+        self._last_timestamp = received_at
+
+        record = {
+            "timestamp": received_at.isoformat(timespec="milliseconds"),
+            "voltage": float(frame.get("voltage", 0) or 0),
+            "current": float(frame.get("current", 0) or 0),
+            "power": float(frame.get("power", 0) or 0),
+        }
+        self.log.append(record)
+        self.latest = record
+
+        for row in self.resampler.add(to_epoch(received_at), record):
+            self._emit(row)
+        if (len(self._pending) >= self.flush_rows
+                or time.monotonic() - self._last_flush >= self.flush_seconds):
+            self.flush()
+        return record
+
+    def _emit(self, row: Dict[str, Any]):
+        # Consumers see the row before it reaches the store, so anything
+        # that catches up from the store afterwards finds it already counted
+        for consumer in self.consumers:
+            consumer(row)
+        self._pending.append(row)
+
+    def flush(self):
+        """Append buffered readings to the columnar history"""
+        if self._pending:
+            with span(log, "ingest flush", series=self.store_name, rows=len(self._pending)):
+                store.append(self.store_name, TimeSeries.from_records(self._pending))
+            self._pending = []
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        for row in self.resampler.flush():
+            self._emit(row)
+        self.flush()
+        self.log.close()
@@ -0,0 +1,210 @@
+import asyncio
+import os
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Optional
+
+from ingest import FrameParser, IngestPipeline, open_serial
+from tracing import get_logger
+
+log = get_logger("ingest")
+
+
+class SerialSource:
+    """Lines from a serial port; the blocking reads run in a worker thread"""
+
+    def __init__(self, port: str, baud: int = 115200):
+        self.port = port
+        self.baud = baud
+
+    async def lines(self) -> AsyncIterator[bytes]:
+        handle = await asyncio.to_thread(open_serial, self.port, self.baud)
+        try:
+            while True:
+                raw = await asyncio.to_thread(handle.readline)  # Returns b'' on the 2 s timeout
+                if raw:
+                    yield raw
+        finally:
+            handle.close()
+
+
+class PtySource:
+    """Lines from a pty or other character device, read without blocking the event loop"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    async def lines(self) -> AsyncIterator[bytes]:
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader()
+        pipe = await asyncio.to_thread(open, self.path, "rb", buffering=0)
+        transport, _ = await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), pipe)
+        try:
+            while True:
+                raw = await reader.readline()
+                if not raw:
+                    return
+                yield raw
+        finally:
+            transport.close()
+
+
+class TcpSource:
+    """Lines from a TCP serial bridge (e.g. ser2net), reconnecting with backoff"""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+
+    async def lines(self) -> AsyncIterator[bytes]:
+        delay = 1.0
+        while True:
+            try:
+                reader, writer = await asyncio.open_connection(self.host, self.port)
+            except OSError:
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30.0)
+                continue
+            delay = 1.0
+            try:
+                while True:
+                    raw = await reader.readline()
+                    if not raw:
+                        break
+                    yield raw
+            finally:
+                writer.close()
+
+
+class ReplaySource:
+    """Lines from a captured file, optionally paced to one frame per `interval` seconds
+
+    The file is opened and read in blocks of about READ_BYTES in a worker thread.
+    """
+
+    READ_BYTES = 64 * 1024
+
+    def __init__(self, path: str, interval: float = 0.0):
+        self.path = path
+        self.interval = interval
+
+    async def lines(self) -> AsyncIterator[bytes]:
+        f = await asyncio.to_thread(open, self.path, "rb")
+        try:
+            while True:
+                block = await asyncio.to_thread(f.readlines, self.READ_BYTES)
+                if not block:
+                    return
+                for raw in block:
+                    yield raw
+                    if b'}' in raw:
+                        await asyncio.sleep(self.interval)
+        finally:
+            f.close()
+
+
+def parse_source(spec: str):
+    """Build a source from a spec such as serial:COM4@115200, pty:/dev/pts/3, tcp:host:port or replay:file@5"""
+    kind, _, target = spec.partition(":")
+    if kind == "serial":
+        port, _, baud = target.partition("@")
+        return SerialSource(port, int(baud or 115200))
+    if kind == "pty":
+        return PtySource(target)
+    if kind == "tcp":
+        host, _, port = target.rpartition(":")
+        return TcpSource(host, int(port))
+    if kind == "replay":
+        path, _, interval = target.partition("@")
+        return ReplaySource(path, float(interval or 0))
+    raise ValueError(f"Unknown ingest source '{spec}'")
+
+
+class IngestService:
+    """Runs a frame source inside the server: reader task -> bounded queue -> pipeline task
+
+    When the queue is full the reader waits up to put_timeout (backpressure);
+    if the consumer still has not caught up, the oldest queued frame is
+    dropped so the live value never lags behind the meter.
+    """
+
+    def __init__(self, source, pipeline: IngestPipeline, queue_size: int = 1000, put_timeout: float = 1.0):
+        self.source = source
+        self.pipeline = pipeline
+        self.queue_size = queue_size
+        self.put_timeout = put_timeout
+        self.parser = FrameParser()
+        self.queue: Optional[asyncio.Queue] = None
+        self.received = 0
+        self.processed = 0
+        self.dropped = 0
+        self.failed = 0
+        self._tasks = []
+
+    async def start(self):
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [
+            asyncio.create_task(self._read(), name="ingest-reader"),
+            asyncio.create_task(self._consume(), name="ingest-consumer"),
+        ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await asyncio.to_thread(self.pipeline.close)
+
+    async def _read(self):
+        async for raw in self.source.lines():
+            frame = self.parser.feed(raw.decode("utf-8", errors="ignore"))
+            if frame is None:
+                continue
+            self.received += 1
+            item = (frame, datetime.now())  # Stamp on arrival, not when dequeued
+            try:
+                await asyncio.wait_for(self.queue.put(item), self.put_timeout)
+            except asyncio.TimeoutError:
+                self.queue.get_nowait()
+                self.queue.task_done()
+                self.dropped += 1
+                self.queue.put_nowait(item)
+                log.warning("ingest queue full, dropped the oldest frame",
+                            extra={"dropped": self.dropped, "queue_size": self.queue_size})
+
+    async def _consume(self):
+        while True:
+            frame, received_at = await self.queue.get()
+            try:
+                # Log writes and fsyncs happen off the event loop
+                await asyncio.to_thread(self.pipeline.ingest, frame, received_at)
+                self.processed += 1
+            except (OSError, ValueError, TypeError):
+                self.failed += 1
+                log.exception("could not ingest frame")
+            finally:
+                self.queue.task_done()
+
+    @property
+    def latest(self) -> Optional[Dict[str, Any]]:
+        return self.pipeline.latest
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "received": self.received,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "parse_errors": self.parser.errors,
+            "queue_depth": self.queue.qsize() if self.queue else 0,
+            "queue_size": self.queue_size,
+            "running": any(not task.done() for task in self._tasks),
+        }
+
+
+def service_from_env() -> Optional[IngestService]:
+    """In-process ingest is enabled by setting WATTWISE_INGEST to a source spec"""
+    spec = os.environ.get("WATTWISE_INGEST")
+    if not spec:
+        return None
+    queue_size = int(os.environ.get("WATTWISE_INGEST_QUEUE", "1000"))
+    return IngestService(parse_source(spec), IngestPipeline(), queue_size=queue_size)
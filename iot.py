@@ -1,44 +1,38 @@
-import serial
-import json
-import os
-
-PORT = 'COM4'  # Change this to your actual COM port
-BAUD = 115200
-OUTPUT_PATH = r"C:\Users\avlok\AppData\Local\Programs\WattWise\data\iot.json"
-
-ser = serial.Serial(PORT, BAUD, timeout=2)
-print(f"Listening on {PORT}...")
-
-buffer = []
-recording = False
-
-while True:
-    try:
-        line = ser.readline().decode('utf-8', errors='ignore').strip()
-
-        if '{' in line:
-            recording = True
-            buffer = [line]
-        elif '}' in line and recording:
-            buffer.append(line)
-            full_json_str = '\n'.join(buffer)
-            try:
-                data = json.loads(full_json_str)
-                os.makedirs(os.path.dirname(OUTPUT_PATH), exist_ok=True)
-                with open(OUTPUT_PATH, 'w') as f:
-                    json.dump(data, f, indent=2)
-                print("iot.json updated:", data)
-            except json.JSONDecodeError as e:
-                print("Failed to parse JSON:", e)
-            recording = False
-            buffer = []
-        elif recording:
-            buffer.append(line)
-        else:
-            print("Non-JSON line skipped:", line)
-
-    except KeyboardInterrupt:
-        print("Stopped by user.")
-        break
-    except Exception as e:
-        print("Error:", e)
+import argparse
+
+from ingest import FrameParser, IngestPipeline, open_serial, read_frames
+
+PORT = 'COM4'  # Change this to your actual COM port
+BAUD = 115200
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Read meter frames from serial and append them to WattWise history")
+    parser.add_argument("--port", default=PORT, help="Serial port or pty path")
+    parser.add_argument("--baud", type=int, default=BAUD)
+    parser.add_argument("--replay", help="Read frames from a captured file instead of a serial port")
+    args = parser.parse_args()
+
+    if args.replay:
+        source = open(args.replay, "rb")
+        print(f"Replaying {args.replay}...")
+    else:
+        source = open_serial(args.port, args.baud)
+        print(f"Listening on {args.port}...")
+
+    frame_parser = FrameParser()
+    pipeline = IngestPipeline()
+    try:
+        for frame in read_frames(source.readline, frame_parser, follow=not args.replay):
+            record = pipeline.ingest(frame)
+            print("Reading stored:", record)
+    except KeyboardInterrupt:
+        print("Stopped by user.")
+    finally:
+        pipeline.close()
+        source.close()
+        print(f"{frame_parser.frames} frames stored, {frame_parser.errors} unparsable, {frame_parser.skipped} lines skipped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+import json
+import os
+import re
+import threading
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel, Field, field_validator
+
+from timeseries_store import DATA_DIR, STORE_DIR
+
+DEFAULT_METER = "default"
+DEFAULT_APPLIANCES = ["fridge", "ac", "geyser", "microwave"]
+
+REGISTRY_PATH = os.path.join(DATA_DIR, "meters.json")
+
+# Every meter but the default one keeps its series in its own shard
+# directory, store/meters/<id>/<series> (sources in data/meters/<id>/)
+SHARD_PREFIX = "meters"
+
+METER_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+class Meter(BaseModel):
+    """One household meter and the appliances monitored behind it"""
+    id: str
+    name: Optional[str] = None
+    appliances: List[str] = Field(default_factory=lambda: list(DEFAULT_APPLIANCES))
+
+    @field_validator("id")
+    @classmethod
+    def _valid_id(cls, value: str) -> str:
+        if not METER_ID.match(value):
+            raise ValueError("meter ids may only contain letters, digits, '-' and '_'")
+        return value
+
+    def series_name(self, series: str) -> str:
+        """Store name of one of this meter's series; the default meter keeps the legacy flat names"""
+        if self.id == DEFAULT_METER:
+            return series
+        return f"{SHARD_PREFIX}/{self.id}/{series}"
+
+    @property
+    def main_series(self) -> str:
+        return self.series_name("main_power_data")
+
+    def appliance_series(self, appliance: str) -> str:
+        return self.series_name(f"{appliance}_data")
+
+
+def _list_dirs(path: str) -> List[str]:
+    try:
+        return sorted(entry.name for entry in os.scandir(path) if entry.is_dir())
+    except FileNotFoundError:
+        return []
+
+
+def _list_series(path: str) -> List[str]:
+    """Series names found in a shard, as store directories or source files"""
+    try:
+        names = os.listdir(path)
+    except FileNotFoundError:
+        return []
+    return [name.rsplit(".", 1)[0] if name.endswith((".npz", ".json")) else name for name in names]
+
+
+class MeterRegistry:
+    """Known meters: those listed in data/meters.json plus any shard found on disk"""
+
+    def __init__(self, path: str = REGISTRY_PATH, store_root: str = STORE_DIR, data_dir: str = DATA_DIR):
+        self.path = path
+        self.shard_roots = [os.path.join(store_root, SHARD_PREFIX), os.path.join(data_dir, SHARD_PREFIX)]
+        self._meters: Dict[str, Meter] = {}
+        self._version = None
+        self._lock = threading.Lock()
+
+    def _stamp(self) -> tuple:
+        stamps = []
+        for path in [self.path] + self.shard_roots:
+            try:
+                stamps.append(os.stat(path).st_mtime_ns)
+            except FileNotFoundError:
+                stamps.append(None)
+        return tuple(stamps)
+
+    def _load(self) -> Dict[str, Meter]:
+        meters = {DEFAULT_METER: Meter(id=DEFAULT_METER, name="Default meter")}
+        try:
+            with open(self.path, "r") as f:
+                for entry in json.load(f).get("meters", []):
+                    meter = Meter(**entry)
+                    meters[meter.id] = meter
+        except FileNotFoundError:
+            pass
+
+        # Shards written without a registry entry (e.g. by data_generator) are
+        # picked up with whatever appliance series they contain
+        for root in self.shard_roots:
+            for meter_id in _list_dirs(root):
+                if meter_id in meters or not METER_ID.match(meter_id):
+                    continue
+                series = _list_series(os.path.join(root, meter_id))
+                appliances = sorted({name[:-len("_data")] for name in series
+                                     if name.endswith("_data") and name != "main_power_data"})
+                meters[meter_id] = Meter(id=meter_id, appliances=appliances)
+        return meters
+
+    def meters(self) -> Dict[str, Meter]:
+        """All meters by id, reloaded when the registry file or shard directories change"""
+        stamp = self._stamp()
+        with self._lock:
+            if stamp != self._version:
+                self._meters = self._load()
+                self._version = stamp
+            return self._meters
+
+    def get(self, meter_id: str) -> Optional[Meter]:
+        return self.meters().get(meter_id)
+
+    def register(self, meter: Meter):
+        """Add or replace a meter in data/meters.json"""
+        with self._lock:
+            try:
+                with open(self.path, "r") as f:
+                    entries = json.load(f).get("meters", [])
+            except FileNotFoundError:
+                entries = []
+            entries = [entry for entry in entries if entry.get("id") != meter.id] + [meter.model_dump()]
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path + ".tmp", "w") as f:
+                json.dump({"meters": entries}, f, indent=2)
+            os.replace(self.path + ".tmp", self.path)
+            self._version = None
+
+
+registry = MeterRegistry()
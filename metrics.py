@@ -0,0 +1,242 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# "auto" records from the first scrape of /metrics on, so an unscraped server
+# pays for a flag check only; "on" records from startup; "off" never does
+MODE = os.environ.get("WATTWISE_METRICS", "auto")
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ROWS_BUCKETS = (0, 10, 100, 1000, 10_000, 100_000, 1_000_000, 10_000_000)
+BYTES_BUCKETS = (0, 1024, 16_384, 131_072, 1_048_576, 8_388_608, 67_108_864, 536_870_912)
+
+Sample = Tuple[str, Dict[str, str], float]  # (name suffix, labels, value)
+
+
+def _labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+               for value in labels.values())
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + "}"
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    """Monotonic totals per label set"""
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, *labelvalues):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            items = list(self._values.items())
+        return [("", dict(zip(self.labelnames, key)), value) for key, value in items]
+
+
+class Histogram:
+    """Bucketed observations per label set; cumulative counts are only formed when scraped"""
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values: Dict[tuple, list] = {}  # labels -> [per-bucket counts (last is +Inf), sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labelvalues):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labelvalues)
+            if entry is None:
+                entry = self._values[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            items = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        samples = []
+        for key, counts, total in items:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                samples.append(("_bucket", dict(labels, le=_number(bound)), cumulative))
+            samples.append(("_sum", labels, total))
+            samples.append(("_count", labels, cumulative))
+        return samples
+
+
+class Collector:
+    """Values read from a callback at scrape time, so keeping them costs nothing in between"""
+
+    def __init__(self, name: str, help: str, read: Callable[[], Iterable[Tuple[Dict[str, str], float]]],
+                 kind: str = "gauge"):
+        self.name = name
+        self.help = help
+        self.read = read
+        self.kind = kind
+
+    def samples(self) -> List[Sample]:
+        return [("", labels, value) for labels, value in self.read()]
+
+
+class RequestStats:
+    """What one request read and where its time went, collected through a context variable"""
+
+    def __init__(self):
+        self.rows = 0
+        self.bytes = 0
+        self.phases: Dict[str, float] = {}
+
+
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("wattwise_request", default=None)
+
+
+class Metrics:
+    """Registry of the server's metrics, rendered in the Prometheus text format"""
+
+    def __init__(self, mode: str = MODE):
+        self.mode = mode
+        self.enabled = mode == "on"
+        self._metrics = {}
+        self.requests = self.counter("wattwise_requests_total", "Requests served", ("route", "method", "status"))
+        self.latency = self.histogram("wattwise_request_duration_seconds", "Time to serve a request",
+                                      ("route", "method"))
+        self.request_rows = self.histogram("wattwise_request_rows_read", "Rows read from storage per request",
+                                           ("route",), ROWS_BUCKETS)
+        self.request_bytes = self.histogram("wattwise_request_read_bytes", "Bytes read from storage per request",
+                                            ("route",), BYTES_BUCKETS)
+        self.request_phases = self.histogram("wattwise_request_phase_seconds",
+                                             "Time per request spent loading, parsing, computing and serializing",
+                                             ("route", "phase"))
+        self.response_bytes = self.counter("wattwise_response_bytes_total", "Response body bytes sent", ("route",))
+        self.rows_read = self.counter("wattwise_rows_read_total", "Rows read from storage", ("source",))
+        self.bytes_read = self.counter("wattwise_read_bytes_total", "Bytes read from storage", ("source",))
+        self.phase_time = self.histogram("wattwise_phase_seconds", "Duration of load/parse/compute/serialize steps",
+                                         ("phase",))
+        self.compute_time = self.histogram("wattwise_compute_seconds", "Duration of dispatched computations",
+                                           ("function",))
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._metrics.setdefault(name, Counter(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._metrics.setdefault(name, Histogram(name, help, labelnames, buckets))
+
+    def collect(self, name: str, help: str, read: Callable[[], Iterable[Tuple[Dict[str, str], float]]],
+                kind: str = "gauge") -> Collector:
+        """Register values (e.g. existing stats counters) that are read when /metrics is scraped"""
+        self._metrics[name] = Collector(name, help, read, kind)
+        return self._metrics[name]
+
+    def record_read(self, source: str, rows: int, nbytes: int):
+        """Count rows and bytes read from storage, globally and for the current request"""
+        if not self.enabled:
+            return
+        self.rows_read.inc(rows, source)
+        self.bytes_read.inc(nbytes, source)
+        stats = current_request.get()
+        if stats is not None:
+            stats.rows += rows
+            stats.bytes += nbytes
+
+    @contextmanager
+    def timed(self, phase: str):
+        """Time a load/parse/compute/serialize step"""
+        if not self.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.phase_time.observe(elapsed, phase)
+            stats = current_request.get()
+            if stats is not None:
+                stats.phases[phase] = stats.phases.get(phase, 0.0) + elapsed
+
+    def render(self) -> str:
+        if self.mode == "auto":
+            self.enabled = True
+        lines = []
+        for metric in self._metrics.values():
+            try:
+                samples = metric.samples()
+            except Exception as error:  # A broken collector must not take the endpoint down
+                lines.append(f"# {metric.name}: {error}")
+                continue
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for suffix, labels, value in samples:
+                lines.append(f"{metric.name}{suffix}{_labels(labels)} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing every HTTP request under its route template"""
+
+    def __init__(self, app, registry: Metrics = metrics):
+        self.app = app
+        self.metrics = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.metrics.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = current_request.set(stats)
+        started = time.perf_counter()
+        response = {"status": 500, "bytes": 0, "streaming": False}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["streaming"] = any(name == b"content-type" and value.startswith(b"text/event-stream")
+                                            for name, value in message.get("headers", []))
+            elif message["type"] == "http.response.body":
+                response["bytes"] += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_request.reset(token)
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            method = scope["method"]
+            self.metrics.requests.inc(1, route, method, str(response["status"]))
+            self.metrics.response_bytes.inc(response["bytes"], route)
+            # Push streams stay open for as long as the client listens; their duration is not latency
+            if not response["streaming"]:
+                self.metrics.latency.observe(time.perf_counter() - started, route, method)
+            self.metrics.request_rows.observe(stats.rows, route)
+            self.metrics.request_bytes.observe(stats.bytes, route)
+            for phase, seconds in stats.phases.items():
+                self.metrics.request_phases.observe(seconds, route, phase)
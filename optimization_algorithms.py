@@ -1,62 +1,112 @@
-import json
 from datetime import datetime, timedelta
-from typing import List, Dict, Any
+from typing import List, Dict, Optional
 import statistics
+import threading
+from collections import deque
+import numpy as np
+from timeseries_store import TimeSeries, from_epoch
+from tariffs import DEFAULT_PLAN, TariffPlan, hourly_rates, rates_at
+from tracing import get_logger, traced
+
+log = get_logger("optimizer")
+
+def dedupe_peaks(timestamps: np.ndarray, min_gap_seconds: int = 300, last_kept: Optional[int] = None) -> np.ndarray:
+    """Indices of time-sorted peaks to keep, dropping any within min_gap_seconds of the last kept one
+
+    last_kept carries on from peaks kept before these, e.g. in an earlier chunk of a scan.
+    """
+    keep = []
+    for i, ts in enumerate(timestamps.tolist()):
+        if last_kept is None or ts - last_kept >= min_gap_seconds:
+            keep.append(i)
+            last_kept = ts
+    return np.array(keep, dtype=np.int64)
+
+def peak_candidates(power_data: TimeSeries, window_size: int, multiplier: float,
+                    threshold_watts: float) -> Dict[str, np.ndarray]:
+    """Every row above its trailing window's mean x multiplier, or above threshold_watts
+
+    Only rows with a full window of window_size rows before them are tested.
+    """
+    if len(power_data) <= window_size:
+        return {"timestamp": np.empty(0, dtype=np.int64), "power": np.empty(0), "average_power": np.empty(0)}
+
+    # Running window sums from one cumulative sum
+    powers = power_data.power.astype(np.float64)
+    cumulative = np.concatenate(([0.0], np.cumsum(powers)))
+    window_avg = (cumulative[window_size:-1] - cumulative[:-window_size - 1]) / window_size
+    current = powers[window_size:]
+
+    rows = np.flatnonzero((current > window_avg * multiplier) | (current > threshold_watts))
+    return {
+        "timestamp": power_data.timestamp[window_size:][rows].astype(np.int64),
+        "power": current[rows],
+        "average_power": window_avg[rows],
+    }
+
+def peak_ratios(peaks: Dict[str, np.ndarray]) -> np.ndarray:
+    """Each peak's power over its window average, rounded as reported"""
+    average = peaks["average_power"]
+    return np.round(np.divide(peaks["power"], average, out=np.zeros_like(average), where=average > 0), 2)
 
 class PowerOptimizer:
     """Class containing optimization algorithms for power consumption"""
     
-    def __init__(self, threshold_watts: int = 1200):
+    def __init__(self, threshold_watts: int = 850):
      self.peak_threshold_multiplier = 1.05
      self.window_size = 12
-     self.threshold_watts = 850
+     self.threshold_watts = threshold_watts
 
     
-    def greedy_slot_recommendation(self, power_data: List[Dict], rate_structure: Dict = None) -> List[Dict]:
+    @traced(log)
+    def greedy_slot_recommendation(self, power_data: TimeSeries, plan: TariffPlan = None) -> List[Dict]:
         """
         Greedy algorithm for optimal time slot recommendations
         Finds the cheapest time slots for high-power activities
         """
-        if not power_data:
+        if not len(power_data):
             return []
         
-        # Default rate structure (variable pricing)
-        if not rate_structure:
-            rate_structure = {
-                "peak": {"hours": range(9, 18), "rate": 8.0},      # 9 AM - 6 PM
-                "standard": {"hours": range(18, 22), "rate": 6.0}, # 6 PM - 10 PM
-                "off_peak": {"hours": list(range(0, 9)) + list(range(22, 24)), "rate": 4.0}  # 10 PM - 9 AM
-            }
+        # Default tariff plan (variable pricing: peak 9-18, standard 18-22, off-peak otherwise)
+        rates = hourly_rates(plan or DEFAULT_PLAN, datetime.now())
         
-        # Analyze hourly average consumption and costs
-        hourly_data = {}
-        for entry in power_data[-8640:]:  # Last 30 days
-            dt = datetime.fromisoformat(entry["timestamp"])
-            hour = dt.hour
-            
-            if hour not in hourly_data:
-                hourly_data[hour] = {"powers": [], "rate": 0}
-            
-            hourly_data[hour]["powers"].append(entry["power"])
-            
-            # Determine rate for this hour
-            if hour in rate_structure["peak"]["hours"]:
-                hourly_data[hour]["rate"] = rate_structure["peak"]["rate"]
-            elif hour in rate_structure["standard"]["hours"]:
-                hourly_data[hour]["rate"] = rate_structure["standard"]["rate"]
-            else:
-                hourly_data[hour]["rate"] = rate_structure["off_peak"]["rate"]
+        # Analyze hourly average consumption
+        recent = power_data[-8640:]  # Last day of 10 s readings
+        hours = recent.hours()
+        power_sums = np.bincount(hours, weights=recent.power, minlength=24)
+        counts = np.bincount(hours, minlength=24)
+        _, first_seen = np.unique(hours, return_index=True)
+        seen = hours[np.sort(first_seen)]
+        return self.recommend_slots(seen, power_sums[seen] / counts[seen], rates)
+    
+    @traced(log)
+    def forecast_slot_recommendation(self, forecast: Dict[str, np.ndarray], plan: TariffPlan = None) -> List[Dict]:
+        """Greedy slot recommendations over a load forecast of the next 24 hours"""
+        if not len(forecast["timestamp"]):
+            return []
+        hours = (forecast["timestamp"] // 3600) % 24
+        # Each forecast hour is priced on its own day, e.g. tomorrow's weekend rates
+        rates = np.zeros(24)
+        rates[hours] = rates_at(plan or DEFAULT_PLAN, forecast["timestamp"])
+        return self.recommend_slots(hours, forecast["power"], rates)
+    
+    def recommend_slots(self, hours: np.ndarray, avg_power: np.ndarray, rates: np.ndarray) -> List[Dict]:
+        """Rank hours of the day by expected power x rate and pick slots to use and avoid
+
+        rates holds the 24 hourly rates, indexed by hour of day.
+        """
+        cheapest_rate = float(rates.min())
+        highest_rate = float(rates.max())
         
-        # Calculate average power and cost per hour
+        # Calculate cost per hour
         hourly_analysis = []
-        for hour, data in hourly_data.items():
-            avg_power = statistics.mean(data["powers"])
-            cost_per_kwh = data["rate"]
-            cost_efficiency = avg_power * cost_per_kwh  # Lower is better
+        for hour, power in zip(hours.tolist(), avg_power.tolist()):
+            cost_per_kwh = float(rates[hour])
+            cost_efficiency = power * cost_per_kwh  # Lower is better
             
             hourly_analysis.append({
                 "hour": hour,
-                "avg_power": avg_power,
+                "avg_power": power,
                 "rate": cost_per_kwh,
                 "cost_efficiency": cost_efficiency
             })
@@ -67,24 +117,24 @@ class PowerOptimizer:
         recommendations = []
         
         # Recommend best off-peak hours
-        off_peak_hours = [h for h in hourly_analysis if h["rate"] == rate_structure["off_peak"]["rate"]][:3]
+        off_peak_hours = [h for h in hourly_analysis if h["rate"] == cheapest_rate][:3]
         if off_peak_hours:
             best_off_peak = min(off_peak_hours, key=lambda x: x["cost_efficiency"])
             recommendations.append({
                 "time_slot": f"{best_off_peak['hour']:02d}:00 - {(best_off_peak['hour']+1)%24:02d}:00",
                 "recommendation": "Optimal time for high-power appliances (washing machine, dishwasher)",
-                "savings": round((rate_structure["peak"]["rate"] - best_off_peak["rate"]) * 2.0, 2),  # Assuming 2 kWh appliance
+                "savings": round((highest_rate - best_off_peak["rate"]) * 2.0, 2),  # Assuming 2 kWh appliance
                 "reason": "Lowest electricity rate with minimal grid load"
             })
         
         # Recommend avoiding peak hours
-        peak_hours = [h for h in hourly_analysis if h["rate"] == rate_structure["peak"]["rate"]]
+        peak_hours = [h for h in hourly_analysis if h["rate"] == highest_rate]
         if peak_hours:
             worst_peak = max(peak_hours, key=lambda x: x["cost_efficiency"])
             recommendations.append({
                 "time_slot": f"{worst_peak['hour']:02d}:00 - {(worst_peak['hour']+1)%24:02d}:00",
                 "recommendation": "Avoid using high-power appliances during this time",
-                "savings": round((worst_peak["rate"] - rate_structure["off_peak"]["rate"]) * 2.0, 2),
+                "savings": round((worst_peak["rate"] - cheapest_rate) * 2.0, 2),
                 "reason": "Highest electricity rate and peak consumption period"
             })
         
@@ -99,74 +149,72 @@ class PowerOptimizer:
         
         return recommendations
     
-    def sliding_window_peak_detection(self, power_data: List[Dict]) -> List[Dict]:
+    @traced(log)
+    def find_peaks(self, power_data: TimeSeries, window_size: int = None, multiplier: float = None,
+                   threshold_watts: float = None, min_gap_seconds: int = 300) -> Dict[str, np.ndarray]:
+     """
+     Vectorised sliding-window peak scan in O(n)
+     A row is a peak when it exceeds the mean of the window_size rows before it
+     by the multiplier, or exceeds threshold_watts outright. Peaks closer than
+     min_gap_seconds to the previous kept peak are dropped.
+     """
+     window_size = window_size or self.window_size
+     multiplier = self.peak_threshold_multiplier if multiplier is None else multiplier
+     threshold_watts = self.threshold_watts if threshold_watts is None else threshold_watts
+
+     candidates = peak_candidates(power_data, window_size, multiplier, threshold_watts)
+     keep = dedupe_peaks(candidates["timestamp"], min_gap_seconds)
+     log.debug("peak scan", extra={"rows": len(power_data), "candidates": len(candidates["timestamp"]),
+                                   "peaks": len(keep)})
+     return {field: values[keep] for field, values in candidates.items()}
+
+    @traced(log)
+    def sliding_window_peak_detection(self, power_data: TimeSeries, window_size: int = None,
+                                      multiplier: float = None, threshold_watts: float = None,
+                                      recent_rows: Optional[int] = 1440, limit: int = 5) -> List[Dict]:
      """
      Sliding window algorithm for detecting power consumption peaks
      Identifies abnormal power spikes that could indicate inefficient usage
      """
-     if len(power_data) < self.window_size:
-         print("[DEBUG] Not enough data for peak detection.")
-         return []
-
-     peaks = []
-     recent_data = power_data[-1440:]  # Last 24 hours
-
-     for i in range(len(recent_data) - self.window_size):
-         window = recent_data[i:i + self.window_size]
-         window_powers = [entry["power"] for entry in window if "power" in entry]
-
-         if not window_powers or len(window_powers) < self.window_size:
-             continue
-
-         avg_power = statistics.mean(window_powers)
-         current_entry = recent_data[i + self.window_size]
-         current_power = current_entry.get("power", 0)
-
-         print(f"[DEBUG] i={i}, avg={avg_power:.2f}, current={current_power:.2f}")
-
-         if (
-             current_power > avg_power * self.peak_threshold_multiplier
-            or current_power > self.threshold_watts
-         ):
-             timestamp = current_entry.get("timestamp")
-             if not timestamp:
-                 continue
-
-             try:
-                 peak_time = datetime.fromisoformat(timestamp)
-             except ValueError:
-                 continue
-
-             suggestion = self._get_peak_suggestion(current_power, peak_time.hour)
-
-             peaks.append({
-                 "timestamp": timestamp,
-                 "power": current_power,
-                 "average_power": round(avg_power, 1),
-                 "peak_ratio": round(current_power / avg_power, 2),
-                 "suggestion": suggestion
-             })
-             print(f"[PEAK] {timestamp} | {current_power:.2f}W")
-
-     # Remove duplicates within 5 minutes
-     filtered_peaks = []
-     for peak in peaks:
-         peak_time = datetime.fromisoformat(peak["timestamp"])
-         is_duplicate = False
-         for existing_peak in filtered_peaks:
-             existing_time = datetime.fromisoformat(existing_peak["timestamp"])
-             if abs((peak_time - existing_time).total_seconds()) < 300:
-                 is_duplicate = True
-                 break
-         if not is_duplicate:
-             filtered_peaks.append(peak)
+     if recent_rows is not None:
+         power_data = power_data[-recent_rows:]  # Last 1440 readings by default
+
+     peaks = self.find_peaks(power_data, window_size, multiplier, threshold_watts)
+     return self.peak_events(peaks, limit)
+
+    def peak_events(self, peaks: Dict[str, np.ndarray], limit: Optional[int] = 5, ranked: bool = True) -> List[Dict]:
+     """Turn peak arrays into API events, most significant first (or in the given order if not ranked)"""
+     average = peaks["average_power"]
+     ratio = peak_ratios(peaks)
 
      # Sort by significance
-     filtered_peaks.sort(key=lambda x: x["peak_ratio"], reverse=True)
-     print(f"[DEBUG] Total peaks detected: {len(filtered_peaks)}")
-     return filtered_peaks[:5]
+     order = np.argsort(-ratio, kind="stable") if ranked else np.arange(len(ratio))
+     if limit is not None:
+         order = order[:limit]
+
+     events = []
+     for i in order.tolist():
+         peak_time = from_epoch(peaks["timestamp"][i])
+         current_power = float(peaks["power"][i])
+         events.append({
+             "timestamp": peak_time.isoformat(),
+             "power": current_power,
+             "average_power": round(float(average[i]), 1),
+             "peak_ratio": float(ratio[i]),
+             "suggestion": self._get_peak_suggestion(current_power, peak_time.hour)
+         })
+     return events
+
+    def create_streaming_detector(self, max_events: int = 100) -> "StreamingPeakDetector":
+     """Online detector sharing this optimizer's window, multiplier and threshold"""
+     return StreamingPeakDetector(
+         window_size=self.window_size,
+         multiplier=self.peak_threshold_multiplier,
+         threshold_watts=self.threshold_watts,
+         max_events=max_events,
+         suggest=self._get_peak_suggestion,
+     )
 
-    
     def _get_peak_suggestion(self, power: float, hour: int) -> str:
         """Generate contextual suggestions based on power level and time"""
         if power > 2500:
@@ -181,17 +229,18 @@ class PowerOptimizer:
         else:
             return "Minor peak detected. Monitor appliance usage patterns for optimization opportunities."
     
-    def generate_live_recommendations(self, main_data: List[Dict], appliance_data: Dict[str, List[Dict]]) -> List[Dict]:
+    @traced(log)
+    def generate_live_recommendations(self, main_data: TimeSeries, appliance_data: Dict[str, TimeSeries]) -> List[Dict]:
         """Generate live optimization recommendations based on current usage patterns"""
-        if not main_data:
+        if not len(main_data):
             return []
         
         recommendations = []
         
         # Get recent data (last hour)
-        recent_main = main_data[-360:] if len(main_data) >= 360 else main_data  # Last hour
-        current_power = recent_main[-1]["power"] if recent_main else 0
-        avg_recent_power = statistics.mean([d["power"] for d in recent_main]) if recent_main else 0
+        recent_main = main_data[-360:]  # Last hour
+        current_power = float(recent_main.power[-1])
+        avg_recent_power = float(recent_main.power.mean(dtype=np.float64))
         
         current_time = datetime.now()
         hour = current_time.hour
@@ -201,8 +250,8 @@ class PowerOptimizer:
         total_appliance_power = 0
         
         for appliance_name, data in appliance_data.items():
-            if data:
-                recent_appliance_power = data[-1]["power"]
+            if len(data):
+                recent_appliance_power = float(data.power[-1])
                 if recent_appliance_power > 10:  # Consider appliance active if > 10W
                     active_appliances.append({
                         "name": appliance_name,
@@ -271,6 +320,111 @@ class PowerOptimizer:
         
         return recommendations[:3]  # Return top 3 recommendations
 
+class StreamingPeakDetector:
+    """
+    Online version of the sliding-window peak logic
+    Keeps a running sum and sum of squares over the last window_size samples,
+    so each sample costs O(1) time and memory stays constant. Once a peak
+    fires, no new event is raised until power drops back below the relative
+    trigger (mean x multiplier) by the hysteresis margin, and recent events
+    are kept in a bounded ring. The absolute threshold takes no part in the
+    release: ordinary daytime load can sit above it for hours, and
+    min_gap_seconds already merges repeated triggers.
+    """
+
+    def __init__(self, window_size: int = 12, multiplier: float = 1.05, threshold_watts: float = 850,
+                 hysteresis: float = 0.05, min_gap_seconds: int = 300, max_events: int = 100,
+                 suggest=None):
+        self.window_size = window_size
+        self.multiplier = multiplier
+        self.threshold_watts = threshold_watts
+        self.hysteresis = hysteresis
+        self.min_gap_seconds = min_gap_seconds
+        self.suggest = suggest
+        self.events = deque(maxlen=max_events)
+        self.last_timestamp = None
+        self.samples = 0
+        self._window = deque(maxlen=window_size)
+        self._sum = 0.0
+        self._sum_sq = 0.0
+        self._in_peak = False
+        self._last_event_ts = None
+        self._lock = threading.Lock()
+
+    def update(self, timestamp: int, power: float) -> Optional[Dict]:
+        """Consume one sample; returns the peak event it raised, if any"""
+        with self._lock:
+            return self._update(timestamp, power)
+
+    def _update(self, timestamp: int, power: float) -> Optional[Dict]:
+        event = None
+        if len(self._window) == self.window_size:
+            mean = self._sum / self.window_size
+            variance = max(self._sum_sq / self.window_size - mean * mean, 0.0)
+            triggered = power > mean * self.multiplier or power > self.threshold_watts
+
+            if self._in_peak and power < mean * self.multiplier * (1 - self.hysteresis):
+                self._in_peak = False
+            if not self._in_peak and triggered and (self._last_event_ts is None
+                                                    or timestamp - self._last_event_ts >= self.min_gap_seconds):
+                event = self._event(timestamp, power, mean, variance)
+                self.events.append(event)
+                self._last_event_ts = timestamp
+                self._in_peak = True
+
+        if len(self._window) == self.window_size:
+            oldest = self._window[0]
+            self._sum -= oldest
+            self._sum_sq -= oldest * oldest
+        self._window.append(power)
+        self._sum += power
+        self._sum_sq += power * power
+        self.last_timestamp = timestamp
+        self.samples += 1
+        return event
+
+    def _event(self, timestamp: int, power: float, mean: float, variance: float) -> Dict:
+        peak_time = from_epoch(timestamp)
+        std = variance ** 0.5
+        return {
+            "timestamp": peak_time.isoformat(),
+            "epoch": int(timestamp),
+            "power": round(power, 2),
+            "average_power": round(mean, 1),
+            "peak_ratio": round(power / mean, 2) if mean > 0 else 0.0,
+            "z_score": round((power - mean) / std, 2) if std > 0 else None,
+            "suggestion": self.suggest(power, peak_time.hour) if self.suggest else "",
+        }
+
+    @traced(log)
+    def feed(self, series: TimeSeries) -> List[Dict]:
+        """Consume a batch of samples in order; returns the events raised"""
+        with self._lock:
+            return self._feed(series)
+
+    def _feed(self, series: TimeSeries) -> List[Dict]:
+        events = []
+        for timestamp, power in zip(series.timestamp.tolist(), series.power.tolist()):
+            event = self._update(timestamp, power)
+            if event:
+                events.append(event)
+        return events
+
+    def catch_up(self, series: TimeSeries, max_rows: int = 1440) -> List[Dict]:
+        """Feed rows of a stored series newer than the last sample seen (at most max_rows)"""
+        # The last timestamp is read and advanced under one lock so concurrent catch-ups feed each row once
+        with self._lock:
+            if self.last_timestamp is None:
+                return self._feed(series[-max_rows:])
+            return self._feed(series.between(self.last_timestamp + 1)[-max_rows:])
+
+    def recent(self, limit: int = 5, since: int = None) -> List[Dict]:
+        """Events from the ring, most significant first"""
+        with self._lock:
+            events = [event for event in self.events if since is None or event["epoch"] >= since]
+        events.sort(key=lambda event: event["peak_ratio"], reverse=True)
+        return [{key: value for key, value in event.items() if key != "epoch"} for event in events[:limit]]
+
 # Example usage and testing functions
 def test_algorithms():
     """Test the optimization algorithms with sample data"""
@@ -290,6 +444,8 @@ def test_algorithms():
             "current": power / 230
         })
     
+    sample_data = TimeSeries.from_records(sample_data)
+    
     # Test greedy algorithm
     print("Testing Greedy Slot Recommendations:")
     slot_recs = optimizer.greedy_slot_recommendation(sample_data)
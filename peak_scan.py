@@ -0,0 +1,94 @@
+import os
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from dataset_cache import get_series
+from optimization_algorithms import dedupe_peaks, peak_candidates, peak_ratios
+
+# A historical scan is cut into chunks of at least this many rows (a bit
+# over 11 days of 10 s readings), so short ranges are not split into tasks
+# that cost more to send to a worker than to scan
+MIN_CHUNK_ROWS = int(os.environ.get("WATTWISE_SCAN_CHUNK_ROWS", "100000"))
+
+Peaks = Dict[str, np.ndarray]  # timestamp, power, average_power
+
+
+def plan_chunks(lo: int, hi: int, parts: int, min_rows: int = MIN_CHUNK_ROWS) -> List[Tuple[int, int]]:
+    """Rows [lo, hi) cut into at most `parts` similar-sized (lo, hi) chunks of at least min_rows"""
+    if hi <= lo:
+        return []
+    count = max(1, min(parts, (hi - lo) // max(min_rows, 1)))
+    bounds = np.linspace(lo, hi, count + 1).round().astype(np.int64).tolist()
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def scan_chunk(series_name: str, lo: int, hi: int, window_size: int, multiplier: float, threshold_watts: float,
+               min_gap_seconds: int) -> Dict[str, Peaks]:
+    """Peaks among rows [lo, hi) of a stored series; runs in a worker process
+
+    The chunk also reads the window_size rows before lo, so its first rows
+    are judged on a full window just as in one pass over the whole range.
+    De-duplication depends on the last peak kept, which for the chunk's
+    first candidates is in the previous chunk. So only candidates from the
+    first gap of at least min_gap_seconds on (which is kept whatever came
+    before) are de-duplicated here ("tail"); the ones before it ("head")
+    are returned as they are for merge_chunks.
+    """
+    series = get_series(series_name)
+    candidates = peak_candidates(series[max(lo - window_size, 0):hi], window_size, multiplier, threshold_watts)
+    timestamps = candidates["timestamp"]
+    gaps = np.flatnonzero(np.diff(timestamps) >= min_gap_seconds)
+    split = int(gaps[0]) + 1 if len(gaps) else len(timestamps)
+    keep = split + dedupe_peaks(timestamps[split:], min_gap_seconds)
+    return {
+        "head": {field: values[:split] for field, values in candidates.items()},
+        "tail": {field: values[keep] for field, values in candidates.items()},
+    }
+
+
+def merge_chunks(chunks: List[Dict[str, Peaks]], min_gap_seconds: int) -> Peaks:
+    """Join chunk results (in time order) into exactly what one pass over the range finds"""
+    parts = []
+    last_kept = None
+    for chunk in chunks:
+        head, tail = chunk["head"], chunk["tail"]
+        keep = dedupe_peaks(head["timestamp"], min_gap_seconds, last_kept)
+        parts.append({field: values[keep] for field, values in head.items()})
+        parts.append(tail)
+        if len(tail["timestamp"]):
+            last_kept = int(tail["timestamp"][-1])
+        elif len(keep):
+            last_kept = int(head["timestamp"][keep[-1]])
+    if not parts:
+        return {"timestamp": np.empty(0, dtype=np.int64), "power": np.empty(0), "average_power": np.empty(0)}
+    return {field: np.concatenate([part[field] for part in parts]) for field in parts[0]}
+
+
+def peak_page(peaks: Peaks, offset: int, limit: int, order: str = "time") -> Peaks:
+    """One page of peaks, in time order or most significant first"""
+    if order == "ratio":
+        rows = np.argsort(-peak_ratios(peaks), kind="stable")[offset:offset + limit]
+    else:
+        rows = np.arange(offset, min(offset + limit, len(peaks["timestamp"])))
+    return {field: values[rows] for field, values in peaks.items()}
+
+
+def day_summaries(peaks: Peaks) -> List[Dict[str, Any]]:
+    """Per calendar day: number of peaks, the highest one, the largest ratio and the busiest hour"""
+    if not len(peaks["timestamp"]):
+        return []
+    timestamps = peaks["timestamp"]
+    days, day_rows, counts = np.unique(timestamps // 86400, return_inverse=True, return_counts=True)
+    max_power = np.full(len(days), -np.inf)
+    np.maximum.at(max_power, day_rows, peaks["power"])
+    max_ratio = np.zeros(len(days))
+    np.maximum.at(max_ratio, day_rows, peak_ratios(peaks))
+    by_hour = np.bincount(day_rows * 24 + (timestamps // 3600) % 24, minlength=len(days) * 24).reshape(-1, 24)
+    return [
+        {"date": date, "peaks": count, "max_power": round(power, 2), "max_peak_ratio": ratio, "busiest_hour": hour}
+        for date, count, power, ratio, hour in zip(
+            days.astype("datetime64[D]").astype(str).tolist(), counts.tolist(), max_power.tolist(),
+            max_ratio.tolist(), by_hour.argmax(axis=1).tolist(),
+        )
+    ]
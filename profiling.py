@@ -0,0 +1,275 @@
+import asyncio
+import cProfile
+import hmac
+import io
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+from urllib.parse import parse_qs
+
+from tracing import get_logger
+
+# Profiling is off unless a key is configured; a request opts in with
+# "X-Profile: <key>" or "?profile=<key>", and picks "sample" (collapsed
+# stacks for flamegraph.pl / speedscope) or "cprofile" (a .prof file for
+# snakeviz / flameprof) with X-Profile-Mode or ?profile_mode=
+PROFILE_KEY = os.environ.get("WATTWISE_PROFILE_KEY")
+# When set, profiles are written here and the normal response is returned
+# with an X-Profile-File header; otherwise the profile is the response
+PROFILE_DIR = os.environ.get("WATTWISE_PROFILE_DIR")
+SAMPLE_INTERVAL = float(os.environ.get("WATTWISE_PROFILE_INTERVAL_MS", "1")) / 1000
+
+MODES = ("sample", "cprofile")
+
+# Samples whose innermost frame is in one of these are a thread waiting, not working
+IDLE_FILES = ("selectors.py", "threading.py", "queue.py", "base_events.py")
+
+log = get_logger("profiling")
+
+# From Python 3.12 cProfile is built on sys.monitoring, which allows one
+# profiler in the whole process at a time: a second enable() raises
+# ValueError. So only one cProfile session runs at a time, and there it
+# already sees every thread
+_cprofile_lock = threading.Lock()
+CPROFILE_ALL_THREADS = sys.version_info >= (3, 12)
+
+
+def frame_name(code) -> str:
+    # co_qualname is new in Python 3.11
+    return f"{os.path.basename(code.co_filename)}:{getattr(code, 'co_qualname', code.co_name)}"
+
+
+class ProfileSession:
+    """Profile of one request across the threads that work on it
+
+    The event loop thread is registered when the request starts and worker
+    threads register themselves through run(). The sampler walks those
+    threads' stacks every SAMPLE_INTERVAL; cProfile runs one profiler per
+    thread and merges them at the end (from Python 3.12 the event loop's
+    profiler already sees every thread).
+
+    The event loop thread is shared by every request, so in both modes its
+    part of the profile also holds the work of any other request running at
+    the same time (worker threads are only profiled inside run()). Profile on
+    a quiet server to see one request on its own.
+    """
+
+    def __init__(self, mode: str = "sample", interval: float = SAMPLE_INTERVAL):
+        self.mode = mode
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.started_at = time.perf_counter()
+        self.duration = 0.0
+        self._threads = set()
+        self._profiles = []
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._sampler = None
+        self._loop_profile = None
+
+    def start(self):
+        if self.mode == "sample":
+            self._threads.add(threading.get_ident())
+            self._sampler = threading.Thread(target=self._sample, name="wattwise-profiler", daemon=True)
+            self._sampler.start()
+        else:
+            self._loop_profile = cProfile.Profile()
+            self._loop_profile.enable()
+
+    def stop(self):
+        self.duration = time.perf_counter() - self.started_at
+        if self._sampler is not None:
+            self._stopped.set()
+            self._sampler.join()
+        if self._loop_profile is not None:
+            self._loop_profile.disable()
+            self._profiles.append(self._loop_profile)
+
+    def run(self, func: Callable[..., Any], *args) -> Any:
+        """Call func in the current (worker) thread with that thread profiled too"""
+        if self.mode != "sample" and CPROFILE_ALL_THREADS:
+            return func(*args)
+        if self.mode == "sample":
+            thread = threading.get_ident()
+            with self._lock:
+                self._threads.add(thread)
+            try:
+                return func(*args)
+            finally:
+                with self._lock:
+                    self._threads.discard(thread)
+
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            return func(*args)
+        finally:
+            profile.disable()
+            with self._lock:
+                self._profiles.append(profile)
+
+    def _sample(self):
+        own = threading.get_ident()
+        while not self._stopped.wait(self.interval):
+            with self._lock:
+                threads = set(self._threads)
+            for thread, frame in sys._current_frames().items():
+                if thread not in threads or thread == own:
+                    continue
+                if os.path.basename(frame.f_code.co_filename) in IDLE_FILES:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame_name(frame.f_code))
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        """Folded stacks, one "frame;frame;frame count" line each"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def pstats_bytes(self) -> bytes:
+        """The merged cProfile statistics in the marshal format pstats and snakeviz read"""
+        stats = pstats.Stats(self._profiles[0], stream=io.StringIO())
+        for profile in self._profiles[1:]:
+            stats.add(profile)
+        return marshal.dumps(stats.stats)
+
+    def output(self) -> tuple:
+        """(body, media type, file extension) of the finished profile"""
+        if self.mode == "sample":
+            return self.collapsed().encode("utf-8"), "text/plain; charset=utf-8", "folded"
+        return self.pstats_bytes(), "application/octet-stream", "prof"
+
+
+current_profile: ContextVar[Optional[ProfileSession]] = ContextVar("wattwise_profile", default=None)
+
+
+def active_profile() -> Optional[ProfileSession]:
+    return current_profile.get()
+
+
+def _requested(scope) -> Optional[Dict[str, str]]:
+    """{"key", "mode"} if the request asks to be profiled"""
+    headers = dict(scope.get("headers", []))
+    query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    key = headers.get(b"x-profile", b"").decode("latin-1") or query.get("profile", [""])[0]
+    if not key:
+        return None
+    mode = headers.get(b"x-profile-mode", b"").decode("latin-1") or query.get("profile_mode", ["sample"])[0]
+    return {"key": key, "mode": mode}
+
+
+class ProfilingMiddleware:
+    """ASGI middleware profiling single requests that carry the configured key
+
+    The response is held back until the profile is complete, so streaming
+    responses (event streams, exports) are not profiled: once one sends a
+    partial body the profile is dropped and the stream passes straight through.
+    """
+
+    def __init__(self, app, key: Optional[str] = PROFILE_KEY, directory: Optional[str] = PROFILE_DIR):
+        self.app = app
+        self.key = key
+        self.directory = directory
+
+    async def __call__(self, scope, receive, send):
+        request = _requested(scope) if scope["type"] == "http" and self.key else None
+        if request is None:
+            await self.app(scope, receive, send)
+            return
+        if not hmac.compare_digest(request["key"].encode(), self.key.encode()) or request["mode"] not in MODES:
+            await self._reply(send, 403, b'{"detail":"Invalid profile key or mode"}', "application/json")
+            return
+
+        if request["mode"] == "cprofile" and not _cprofile_lock.acquire(blocking=False):
+            log.info("profile skipped, another cProfile session is running", extra={"path": scope["path"]})
+            await self.app(scope, receive, self._skipped(send, b"another profile is running"))
+            return
+        try:
+            await self._profile(request["mode"], scope, receive, send)
+        finally:
+            if request["mode"] == "cprofile":
+                _cprofile_lock.release()
+
+    async def _profile(self, mode: str, scope, receive, send):
+        session = ProfileSession(mode)
+        token = current_profile.set(session)
+        messages = []  # The response is held back until the profile is complete
+        streaming = False
+
+        async def capture(message):
+            nonlocal streaming
+            if streaming:
+                await send(message)
+                return
+            messages.append(message)
+            if message["type"] == "http.response.body" and message.get("more_body"):
+                # A streaming response could be held back forever; give up on the profile
+                streaming = True
+                session.stop()
+                log.info("profile skipped for a streaming response", extra={"path": scope["path"]})
+                skipped = self._skipped(send, b"streaming response")
+                for held in messages:
+                    await skipped(held)
+
+        session.start()
+        try:
+            await self.app(scope, receive, capture)
+        finally:
+            if not streaming:
+                session.stop()
+            current_profile.reset(token)
+        if streaming:
+            return
+
+        body, media_type, extension = session.output()
+        log.info("profiled request", extra={"path": scope["path"], "mode": session.mode,
+                                            "samples": session.samples, "duration_ms": round(session.duration * 1000, 3)})
+        if not self.directory:
+            await self._reply(send, 200, body, media_type, {
+                "content-disposition": f'attachment; filename="profile.{extension}"',
+                "x-profile-duration-ms": f"{session.duration * 1000:.3f}",
+            })
+            return
+
+        path = os.path.join(self.directory, f"{datetime.now():%Y%m%d-%H%M%S-%f}{scope['path'].replace('/', '_')}."
+                                            f"{extension}")
+        await asyncio.to_thread(self._write, path, body)
+        for message in messages:
+            if message["type"] == "http.response.start":
+                message = dict(message, headers=list(message.get("headers", [])) + [(b"x-profile-file", path.encode())])
+            await send(message)
+
+    def _write(self, path: str, body: bytes):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(body)
+
+    @staticmethod
+    def _skipped(send, reason: bytes):
+        """send, with an X-Profile-Skipped header added to the response start"""
+        async def skipped(message):
+            if message["type"] == "http.response.start":
+                message = dict(message, headers=list(message.get("headers", [])) + [(b"x-profile-skipped", reason)])
+            await send(message)
+
+        return skipped
+
+    async def _reply(self, send, status: int, body: bytes, media_type: str, headers: Dict[str, str] = None):
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", media_type.encode()), (b"content-length", str(len(body)).encode())]
+                       + [(name.encode(), value.encode()) for name, value in (headers or {}).items()],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,181 @@
+import asyncio
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+import serialization
+
+# Sentinel for "no value computed yet"
+_UNSET = object()
+
+# Fields identifying the items of list topics (peaks, slots, recommendations)
+ITEM_KEYS = ("timestamp", "time_slot", "title")
+
+
+def item_key(items: List[Any]) -> Optional[str]:
+    """The field every item of a list has and no two items share, if any"""
+    for field in ITEM_KEYS:
+        if all(isinstance(item, dict) and field in item for item in items):
+            keys = [item[field] for item in items]
+            if len(set(keys)) == len(keys):
+                return field
+    return None
+
+
+def diff(old: Any, new: Any) -> Optional[Any]:
+    """Delta from old to new, or None if only a full value will do
+
+    For dicts, the changed keys (None for removed keys). For lists of
+    items with an ITEM_KEYS field, {"key": field, "items": new or changed
+    items, "order": every item's key in the new order}; an item whose key
+    is missing from "order" was removed.
+    """
+    if isinstance(old, dict) and isinstance(new, dict):
+        changed = {key: value for key, value in new.items() if old.get(key, _UNSET) != value}
+        changed.update({key: None for key in old if key not in new})
+        return changed
+    if isinstance(old, list) and isinstance(new, list):
+        field = item_key(new)
+        if field is None or item_key(old) != field:
+            return None
+        previous = {item[field]: item for item in old}
+        return {
+            "key": field,
+            "items": [item for item in new if previous.get(item[field], _UNSET) != item],
+            "order": [item[field] for item in new],
+        }
+    return None
+
+
+class Subscription:
+    """One client's view of the broadcaster: a bounded queue of encoded events"""
+
+    def __init__(self, topics: Set[str], max_queue: int = 100):
+        self.topics = topics
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.overflows = 0
+
+
+class Topic:
+    """A value computed once per change and shared by every subscriber"""
+
+    def __init__(self, name: str, compute: Callable[[], Any], interval: float):
+        self.name = name
+        self.compute = compute
+        self.interval = interval
+        self.value = _UNSET
+        self.wake = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+        self.computations = 0
+
+
+class Broadcaster:
+    """Fan-out of topic updates to server-sent-event clients
+
+    Each topic is recomputed by a single task while at least one client
+    is subscribed, every `interval` seconds or as soon as notify() is
+    called. Subscribers first get a full snapshot, then only the changed
+    keys or list items, so N open dashboards cost one computation rather
+    than N.
+    """
+
+    def __init__(self):
+        self.topics: Dict[str, Topic] = {}
+        self.subscriptions: List[Subscription] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def topic(self, name: str, compute: Callable[[], Any], interval: float):
+        self.topics[name] = Topic(name, compute, interval)
+
+    def notify(self, name: str):
+        """Recompute a topic now; safe to call from worker threads"""
+        topic = self.topics.get(name)
+        if topic is None or self._loop is None or topic.task is None:
+            return
+        self._loop.call_soon_threadsafe(topic.wake.set)
+
+    def subscribe(self, names: Iterable[str]) -> Subscription:
+        self._loop = asyncio.get_running_loop()
+        names = {name for name in names if name in self.topics}
+        subscription = Subscription(names)
+        self.subscriptions.append(subscription)
+        for name in names:
+            topic = self.topics[name]
+            if topic.value is not _UNSET:
+                self._offer(subscription, self._encode(name, topic.value, full=True))
+            if topic.task is None or topic.task.done():
+                topic.wake = asyncio.Event()
+                topic.task = asyncio.create_task(self._run(topic), name=f"push-{name}")
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        if subscription in self.subscriptions:
+            self.subscriptions.remove(subscription)
+        for name in subscription.topics:
+            topic = self.topics[name]
+            if topic.task and not any(name in other.topics for other in self.subscriptions):
+                topic.task.cancel()
+                topic.task = None
+
+    async def _run(self, topic: Topic):
+        while True:
+            try:
+                value = await asyncio.to_thread(topic.compute)
+            except Exception:
+                value = topic.value  # Keep serving the last good value
+            topic.computations += 1
+            if value is not _UNSET and value != topic.value:
+                delta = diff(topic.value, value) if topic.value is not _UNSET else None
+                topic.value = value
+                full = self._encode(topic.name, value, full=True)
+                event = full if delta is None else self._encode(topic.name, delta, full=False)
+                for subscription in self.subscriptions:
+                    if topic.name in subscription.topics:
+                        self._offer(subscription, event)
+
+            try:
+                await asyncio.wait_for(topic.wake.wait(), topic.interval)
+            except asyncio.TimeoutError:
+                pass
+            topic.wake.clear()
+
+    def _offer(self, subscription: Subscription, event: str):
+        try:
+            subscription.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # A slow client missed deltas: replace its backlog with full snapshots
+            subscription.overflows += 1
+            while not subscription.queue.empty():
+                subscription.queue.get_nowait()
+            for name in subscription.topics:
+                value = self.topics[name].value
+                if value is not _UNSET:
+                    subscription.queue.put_nowait(self._encode(name, value, full=True))
+
+    @staticmethod
+    def _encode(name: str, data: Any, full: bool) -> str:
+        payload = serialization.dumps({"topic": name, "full": full, "data": data}).decode("utf-8")
+        return f"event: {name}\ndata: {payload}\n\n"
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "clients": len(self.subscriptions),
+            "topics": {
+                name: {
+                    "active": topic.task is not None,
+                    "computations": topic.computations,
+                    "subscribers": sum(name in sub.topics for sub in self.subscriptions),
+                }
+                for name, topic in self.topics.items()
+            },
+        }
+
+    async def stream(self, subscription: Subscription, heartbeat: float = 15.0):
+        """Server-sent-event body for one client"""
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    yield await asyncio.wait_for(subscription.queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+        finally:
+            self.unsubscribe(subscription)
@@ -0,0 +1,173 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+from timeseries_store import COLUMNS, TimeSeries, series_version, store, sync_source
+
+# Rows kept in memory per stream (a day of 10 s samples) and streams kept at once
+RECENT_ROWS = int(os.environ.get("WATTWISE_RECENT_ROWS", "8640"))
+RECENT_STREAMS = int(os.environ.get("WATTWISE_RECENT_STREAMS", "256"))
+
+
+def concat(first: TimeSeries, second: TimeSeries) -> TimeSeries:
+    return TimeSeries(*(np.concatenate([getattr(first, column), getattr(second, column)]) for column in COLUMNS))
+
+
+class RingBuffer:
+    """The newest rows of one stream in fixed-size column arrays"""
+
+    def __init__(self, capacity: int = RECENT_ROWS):
+        self.capacity = capacity
+        self._columns = {column: np.zeros(capacity, dtype=dtype) for column, dtype in COLUMNS.items()}
+        self._next = 0  # Slot the next row is written to
+        self.count = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def clear(self):
+        self._next = 0
+        self.count = 0
+
+    def append(self, series: TimeSeries):
+        rows = min(len(series), self.capacity)
+        if not rows:
+            return
+        slots = (self._next + np.arange(rows)) % self.capacity
+        for column in COLUMNS:
+            self._columns[column][slots] = getattr(series, column)[-rows:]
+        self._next = (self._next + rows) % self.capacity
+        self.count = min(self.count + rows, self.capacity)
+
+    def _slot(self, position: int) -> int:
+        """Slot of the position-th oldest row held"""
+        return (self._next - self.count + position) % self.capacity
+
+    def timestamp(self, position: int) -> int:
+        return int(self._columns["timestamp"][self._slot(position)])
+
+    def last(self, rows: int) -> TimeSeries:
+        """The newest `rows` rows (fewer if fewer are held), oldest first"""
+        rows = max(0, min(rows, self.count))
+        slots = (self._next - rows + np.arange(rows)) % self.capacity
+        return TimeSeries(*(self._columns[column][slots] for column in COLUMNS))
+
+    def rows_since(self, start: int) -> int:
+        """Number of newest rows with timestamp >= start, by binary search over the ring"""
+        lo, hi = 0, self.count
+        while lo < hi:
+            middle = (lo + hi) // 2
+            if self.timestamp(middle) < start:
+                lo = middle + 1
+            else:
+                hi = middle
+        return self.count - lo
+
+
+class RecentWindow:
+    """Ring buffer over the tail of one stored series
+
+    Live rows are pushed in as they arrive; when the series changes on disk
+    the ring is refilled from the end of the column files only, keeping any
+    pushed rows that have not reached the store yet.
+    """
+
+    def __init__(self, name: str, capacity: int = RECENT_ROWS):
+        self.name = name
+        self.ring = RingBuffer(capacity)
+        self.complete = False  # Whether the ring holds the whole stored history
+        self._version = None
+        self._lock = threading.Lock()
+
+    def _sync(self):
+        version = series_version(self.name)
+        if version == self._version:
+            return
+        sync_source(self.name)
+        version = series_version(self.name)
+        tail = store.tail(self.name, self.ring.capacity)
+        pending = self._newer_than(tail)
+        self.ring.clear()
+        self.ring.append(tail)
+        self.ring.append(pending)
+        self.complete = len(tail) < self.ring.capacity
+        self._version = version
+
+    def _newer_than(self, series: TimeSeries) -> TimeSeries:
+        """Rows in the ring that come after the end of series"""
+        if not len(series):
+            return self.ring.last(self.ring.count)
+        return self.ring.last(self.ring.rows_since(int(series.timestamp[-1]) + 1))
+
+    def push(self, series: TimeSeries):
+        with self._lock:
+            self.ring.append(series)
+
+    def last(self, rows: int) -> TimeSeries:
+        """The newest `rows` rows in O(rows)"""
+        with self._lock:
+            self._sync()
+            if rows <= self.ring.count or self.complete:
+                return self.ring.last(rows)
+            tail = store.tail(self.name, rows)
+            return concat(tail, self._newer_than(tail))[-rows:]
+
+    def since(self, start: int) -> TimeSeries:
+        """Rows with timestamp >= start, read from the store's tail only if the ring does not reach back that far"""
+        with self._lock:
+            self._sync()
+            if self.complete or (self.ring.count and self.ring.timestamp(0) <= start):
+                return self.ring.last(self.ring.rows_since(start))
+            rows = self.ring.capacity
+            while True:
+                rows *= 2
+                tail = store.tail(self.name, rows)
+                if len(tail) < rows or int(tail.timestamp[0]) <= start:
+                    break
+            series = concat(tail, self._newer_than(tail))
+            return series[int(np.searchsorted(series.timestamp, start, side="left")):]
+
+
+class RecentWindows:
+    """Recent windows per stream, least recently used evicted first"""
+
+    def __init__(self, capacity: int = RECENT_ROWS, max_streams: int = RECENT_STREAMS):
+        self.capacity = capacity
+        self.max_streams = max_streams
+        self._windows = OrderedDict()  # series name -> RecentWindow
+        self._lock = threading.Lock()
+
+    def window(self, name: str) -> RecentWindow:
+        with self._lock:
+            window = self._windows.get(name)
+            if window is None:
+                window = self._windows[name] = RecentWindow(name, self.capacity)
+                while len(self._windows) > self.max_streams:
+                    self._windows.popitem(last=False)
+            self._windows.move_to_end(name)
+            return window
+
+    def push(self, name: str, series: TimeSeries):
+        """Feed live rows into a stream's window (ignored until the window has been read once)"""
+        with self._lock:
+            window = self._windows.get(name)
+        if window is not None:
+            window.push(series)
+
+
+recent_windows = RecentWindows()
+
+
+def get_recent(name: str, rows: Optional[int] = None, seconds: Optional[float] = None) -> TimeSeries:
+    """The last `rows` samples, or those no more than `seconds` older than the newest one (at most `rows`)"""
+    window = recent_windows.window(name)
+    if seconds is None:
+        return window.last(rows or 1)
+    newest = window.last(1)
+    if not len(newest):
+        return newest
+    series = window.since(int(newest.timestamp[-1] - seconds))
+    return series[-rows:] if rows else series
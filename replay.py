@@ -0,0 +1,89 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from dataset_cache import get_runs
+from meters import Meter
+
+DEFAULT_SPEED = float(os.environ.get("WATTWISE_REPLAY_SPEED", "1"))
+
+
+class ReplayClock:
+    """Maps wall-clock time onto a position in the recorded appliance data
+
+    The position is `offset_seconds + elapsed * speed` seconds into each
+    recording, wrapping around at its end, so a reading depends only on
+    when it is asked for and never on how many requests came before.
+    """
+
+    def __init__(self, speed: float = DEFAULT_SPEED, offset_seconds: float = 0, started_at: float = None):
+        self.speed = speed
+        self.offset_seconds = offset_seconds
+        self.started_at = time.time() if started_at is None else started_at
+
+    def position(self, now: float = None) -> float:
+        """Seconds into the recording at wall-clock time `now`"""
+        now = time.time() if now is None else now
+        return self.offset_seconds + (now - self.started_at) * self.speed
+
+    def reading(self, series_name: str, now: float = None) -> Dict[str, Any]:
+        """The recorded sample of one stored series at wall-clock time `now`"""
+        # Appliance recordings are read straight from their on/off runs
+        runs = get_runs(series_name)
+        if not len(runs):
+            return {"timestamp": None, "voltage": 0, "current": 0, "power": 0}
+        first = runs.first_timestamp
+        span = runs.last_timestamp - first + runs.step
+        return runs.record_at(first + int(self.position(now)) % span)
+
+    def snapshot(self, meter: Meter, now: float = None) -> Dict[str, Any]:
+        """Every appliance of a meter at the same instant"""
+        now = time.time() if now is None else now
+        return {appliance: self.reading(meter.appliance_series(appliance), now) for appliance in meter.appliances}
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "speed": self.speed,
+            "offset_seconds": self.offset_seconds,
+            "started_at": datetime.fromtimestamp(self.started_at).isoformat(timespec="seconds"),
+            "position_seconds": round(self.position(), 1),
+        }
+
+
+class ReplaySessions:
+    """Per-client replay clocks, evicted least recently used first"""
+
+    def __init__(self, max_sessions: int = 1000):
+        self.max_sessions = max_sessions
+        self.default = ReplayClock()
+        self._clocks = OrderedDict()  # session id -> ReplayClock
+        self._lock = threading.Lock()
+
+    def create(self, speed: float = DEFAULT_SPEED, offset_seconds: float = 0) -> str:
+        session_id = uuid.uuid4().hex
+        with self._lock:
+            self._clocks[session_id] = ReplayClock(speed, offset_seconds)
+            while len(self._clocks) > self.max_sessions:
+                self._clocks.popitem(last=False)
+        return session_id
+
+    def get(self, session_id: Optional[str]) -> Optional[ReplayClock]:
+        """The session's clock, or None if it is unknown or has been evicted"""
+        if not session_id:
+            return None
+        with self._lock:
+            clock = self._clocks.get(session_id)
+            if clock is not None:
+                self._clocks.move_to_end(session_id)
+            return clock
+
+    def clock(self, session_id: Optional[str]) -> ReplayClock:
+        """The session's clock, falling back to the shared real-time clock"""
+        return self.get(session_id) or self.default
+
+    def __len__(self) -> int:
+        return len(self._clocks)
@@ -0,0 +1,125 @@
+import gzip
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Any, Dict, Hashable, Optional
+
+from fastapi.requests import Request
+from fastapi.responses import Response
+
+from serialization import dumps
+
+try:
+    import brotli  # Optional; gzip is always available
+except ImportError:
+    brotli = None
+
+# Bodies smaller than this are sent uncompressed
+MIN_COMPRESS_BYTES = 1024
+
+
+class CachedResponse:
+    """A rendered JSON body with its validators and lazily compressed variants"""
+
+    def __init__(self, payload: Any, headers: Dict[str, str] = None):
+        self.body = dumps(payload)
+        self.etag = '"%s"' % hashlib.blake2b(self.body, digest_size=12).hexdigest()
+        self.modified_at = int(time.time())
+        self.headers = headers or {}
+        self._encoded: Dict[str, bytes] = {}
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.body) + sum(len(body) for body in self._encoded.values())
+
+    def encoded(self, encoding: str) -> bytes:
+        if encoding not in self._encoded:
+            if encoding == "br":
+                self._encoded[encoding] = brotli.compress(self.body, quality=5)
+            else:
+                self._encoded[encoding] = gzip.compress(self.body, compresslevel=6)
+        return self._encoded[encoding]
+
+    def not_modified(self, request: Request) -> bool:
+        """Whether the client's validators still match this body"""
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+            return "*" in tags or self.etag in tags
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since:
+            try:
+                return self.modified_at <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def respond(self, request: Request) -> Response:
+        headers = dict(self.headers)
+        headers.update({
+            "ETag": self.etag,
+            "Last-Modified": formatdate(self.modified_at, usegmt=True),
+            "Cache-Control": "no-cache",  # Store, but revalidate on every poll
+            "Vary": "Accept-Encoding",
+        })
+        if self.not_modified(request):
+            return Response(status_code=304, headers=headers)
+
+        body = self.body
+        accepted = request.headers.get("accept-encoding", "")
+        if len(body) >= MIN_COMPRESS_BYTES:
+            encoding = "br" if brotli is not None and "br" in accepted else "gzip" if "gzip" in accepted else None
+            if encoding:
+                body = self.encoded(encoding)
+                headers["Content-Encoding"] = encoding
+        return Response(body, media_type="application/json", headers=headers)
+
+
+class ResponseCache:
+    """LRU of rendered responses keyed by endpoint and parameters, valid for one dataset version
+
+    A request at a newer version recomputes; if the body comes out the
+    same, the existing entry (and its Last-Modified) is kept.
+    """
+
+    def __init__(self, max_entries: int = int(os.environ.get("WATTWISE_RESPONSE_CACHE_ENTRIES", "256"))):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (version, CachedResponse)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, version: Hashable) -> Optional[CachedResponse]:
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is None or cached[0] != version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return cached[1]
+
+    def put(self, key: Hashable, version: Hashable, payload: Any, headers: Dict[str, str] = None) -> CachedResponse:
+        entry = CachedResponse(payload, headers)
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None and cached[1].etag == entry.etag and cached[1].headers == entry.headers:
+                entry = cached[1]
+            self._entries[key] = (version, entry)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "bytes": sum(entry.nbytes for _, entry in list(self._entries.values())),
+            "hits": self.hits,
+            "misses": self.misses,
+            "compression": ["br", "gzip"] if brotli is not None else ["gzip"],
+        }
@@ -0,0 +1,262 @@
+import math
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from dataset_cache import dataset_cache, get_series
+from timeseries_store import SAMPLE_SECONDS, TimeSeries, from_epoch, rows_after, series_version
+
+# Rollup tiers, finest first. Every width is a multiple of the one before it,
+# so coarser tiers are built by merging finer buckets rather than raw rows.
+TIERS = {"1m": 60, "15m": 900, "1h": 3600, "1d": 86400}
+
+FIELDS = {
+    "bucket": np.int64,
+    "count": np.int64,
+    "power_min": np.float64,
+    "power_max": np.float64,
+    "power_sum": np.float64,
+    "voltage_sum": np.float64,
+    "current_sum": np.float64,
+}
+
+# With LTTB, feed it at most this many candidate points per output point
+LTTB_OVERSAMPLE = 20
+
+
+def _empty() -> Dict[str, np.ndarray]:
+    return {field: np.empty(0, dtype=dtype) for field, dtype in FIELDS.items()}
+
+
+def aggregate(series: TimeSeries, width: int) -> Dict[str, np.ndarray]:
+    """Aggregate raw rows into buckets of `width` seconds"""
+    if not len(series):
+        return _empty()
+    if series.index.order is not None:
+        series = series[series.index.order]
+
+    buckets = series.timestamp // width * width
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    power = series.power.astype(np.float64)
+    return {
+        "bucket": buckets[starts],
+        "count": np.diff(np.r_[starts, len(buckets)]),
+        "power_min": np.minimum.reduceat(power, starts),
+        "power_max": np.maximum.reduceat(power, starts),
+        "power_sum": np.add.reduceat(power, starts),
+        "voltage_sum": np.add.reduceat(series.voltage.astype(np.float64), starts),
+        "current_sum": np.add.reduceat(series.current.astype(np.float64), starts),
+    }
+
+
+def combine(agg: Dict[str, np.ndarray], width: int) -> Dict[str, np.ndarray]:
+    """Merge sorted buckets into coarser buckets of `width` seconds"""
+    if not len(agg["bucket"]):
+        return _empty()
+    buckets = agg["bucket"] // width * width
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    merged = {"bucket": buckets[starts]}
+    for field in FIELDS:
+        if field == "bucket":
+            continue
+        reduce = {"power_min": np.minimum, "power_max": np.maximum}.get(field, np.add)
+        merged[field] = reduce.reduceat(agg[field], starts)
+    return merged
+
+
+def to_points(agg: Dict[str, np.ndarray]) -> List[Dict[str, Any]]:
+    """Chart points (bucket means plus spike-preserving min/max) for a set of buckets"""
+    count = np.maximum(agg["count"], 1)
+    power_mean = agg["power_sum"] / count
+    voltage_mean = agg["voltage_sum"] / count
+    current_mean = agg["current_sum"] / count
+    energy_wh = agg["power_sum"] * SAMPLE_SECONDS / 3600
+    return [
+        {
+            "timestamp": from_epoch(agg["bucket"][i]).isoformat(),
+            "voltage": round(float(voltage_mean[i]), 2),
+            "current": round(float(current_mean[i]), 2),
+            "power": round(float(power_mean[i]), 2),
+            "power_min": round(float(agg["power_min"][i]), 2),
+            "power_max": round(float(agg["power_max"][i]), 2),
+            "energy_wh": round(float(energy_wh[i]), 2),
+        }
+        for i in range(len(agg["bucket"]))
+    ]
+
+
+class Rollup:
+    """Growable per-bucket aggregates for one bucket width"""
+
+    def __init__(self, width: int):
+        self.width = width
+        self.size = 0
+        self._columns = {field: np.empty(64, dtype=dtype) for field, dtype in FIELDS.items()}
+
+    def __len__(self) -> int:
+        return self.size
+
+    @property
+    def nbytes(self) -> int:
+        return sum(column.nbytes for column in self._columns.values())
+
+    def view(self) -> Dict[str, np.ndarray]:
+        return {field: column[:self.size] for field, column in self._columns.items()}
+
+    def extend(self, agg: Dict[str, np.ndarray]):
+        """Add buckets at the end, folding the first one into the open last bucket if they match"""
+        if not len(agg["bucket"]):
+            return
+        if self.size and agg["bucket"][0] <= self._columns["bucket"][self.size - 1]:
+            last = self.size - 1
+            columns = self._columns
+            columns["count"][last] += agg["count"][0]
+            columns["power_min"][last] = min(columns["power_min"][last], agg["power_min"][0])
+            columns["power_max"][last] = max(columns["power_max"][last], agg["power_max"][0])
+            for field in ("power_sum", "voltage_sum", "current_sum"):
+                columns[field][last] += agg[field][0]
+            agg = {field: values[1:] for field, values in agg.items()}
+
+        added = len(agg["bucket"])
+        if not added:
+            return
+        capacity = len(self._columns["bucket"])
+        if self.size + added > capacity:
+            capacity = max(capacity * 2, self.size + added)
+            for field, column in self._columns.items():
+                grown = np.empty(capacity, dtype=column.dtype)
+                grown[:self.size] = column[:self.size]
+                self._columns[field] = grown
+        for field, column in self._columns.items():
+            column[self.size:self.size + added] = agg[field]
+        self.size += added
+
+    def between(self, start: int = None, end: int = None) -> Dict[str, np.ndarray]:
+        """Buckets overlapping [start, end)"""
+        buckets = self._columns["bucket"][:self.size]
+        lo = 0 if start is None else int(np.searchsorted(buckets, start // self.width * self.width))
+        hi = self.size if end is None else int(np.searchsorted(buckets, end))
+        return {field: column[lo:max(lo, hi)] for field, column in self._columns.items()}
+
+
+class RollupSet:
+    """All rollup tiers for one series, kept in step with it as rows are appended"""
+
+    def __init__(self):
+        self.tiers = {name: Rollup(width) for name, width in TIERS.items()}
+        self.rows = 0
+        self.first_timestamp = None
+        self.last_timestamp = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build(cls, series: TimeSeries) -> "RollupSet":
+        rollups = cls()
+        rollups.append(series)
+        return rollups
+
+    @property
+    def nbytes(self) -> int:
+        return sum(tier.nbytes for tier in self.tiers.values())
+
+    def append(self, series: TimeSeries):
+        """Fold newly arrived rows into every tier"""
+        with self._lock:
+            self._append(series)
+
+    def _append(self, series: TimeSeries):
+        if not len(series):
+            return
+        agg = aggregate(series, TIERS["1m"])
+        for tier in self.tiers.values():
+            tier.extend(agg if tier.width == TIERS["1m"] else combine(agg, tier.width))
+        if self.first_timestamp is None:
+            self.first_timestamp = int(series.timestamp[0])
+        self.rows += len(series)
+        self.last_timestamp = int(series.timestamp[-1])
+
+    def sync(self, series: TimeSeries) -> "RollupSet":
+        """Catch up with a series that may have grown; rebuild if it was rewritten instead"""
+        # Read and advance the cursor under one lock so concurrent refreshes fold each row once
+        with self._lock:
+            newer = rows_after(series, self.rows, self.first_timestamp, self.last_timestamp)
+            if newer is not None:
+                self._append(newer)
+                return self
+        return RollupSet.build(series)
+
+
+def get_rollups(name: str) -> RollupSet:
+    """Shared rollups for a stored series, updated incrementally when it grows"""
+    key = ("rollups", name)
+
+    def refresh():
+        series = get_series(name)
+        previous = dataset_cache.peek(key)
+        if previous is None:
+            return RollupSet.build(series)
+        return previous.sync(series)
+
+    return dataset_cache.get(key, series_version(name), refresh)
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Largest-triangle-three-buckets: indices of `threshold` points that keep the visual shape"""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = x.astype(np.float64)
+    y = y.astype(np.float64)
+    every = (n - 2) / (threshold - 2)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(area.argmax())
+        selected[i + 1] = a
+    selected[-1] = n - 1
+    return selected
+
+
+def chart_points(series: TimeSeries, rollups: RollupSet, start: int, end: Optional[int],
+                 points: int, lttb: bool = False) -> Tuple[str, List[Dict[str, Any]]]:
+    """Pick the resolution for a chart window within a point budget; returns (resolution, points)"""
+    raw = series.between(start, end)
+    candidates = [("raw", len(raw))]
+    windows = {}
+    for name, tier in rollups.tiers.items():
+        windows[name] = tier.between(start, end)
+        candidates.append((name, len(windows[name]["bucket"])))
+
+    budget = points * LTTB_OVERSAMPLE if lttb else points
+    resolution = next((name for name, count in candidates if count <= budget), None)
+
+    if resolution == "raw":
+        if lttb and len(raw) > points:
+            raw = raw[lttb_indices(raw.timestamp, raw.power, points)]
+        return resolution, raw.to_records()
+
+    if resolution is None:
+        # Even the coarsest tier is over budget: merge its buckets further
+        resolution = list(TIERS)[-1]
+        agg = windows[resolution]
+        if not lttb:
+            width = TIERS[resolution] * math.ceil(len(agg["bucket"]) / points)
+            return f"{width}s", to_points(combine(agg, width))
+    else:
+        agg = windows[resolution]
+
+    if lttb and len(agg["bucket"]) > points:
+        mean_power = agg["power_sum"] / np.maximum(agg["count"], 1)
+        keep = lttb_indices(agg["bucket"], mean_power, points)
+        agg = {field: values[keep] for field, values in agg.items()}
+    return resolution, to_points(agg)
@@ -0,0 +1,56 @@
+import json
+import math
+from typing import Any
+
+import numpy as np
+from fastapi.responses import JSONResponse
+
+from metrics import metrics
+
+try:
+    import orjson  # Optional; serializes NumPy arrays natively and much faster
+except ImportError:
+    orjson = None
+
+
+def _default(value: Any) -> Any:
+    """Fallback encoding of NumPy values for the standard json module"""
+    if isinstance(value, np.ndarray):
+        if np.issubdtype(value.dtype, np.datetime64):
+            return value.astype(str).tolist()
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _finite(value: Any) -> Any:
+    """The payload with NaN and infinite floats replaced by None, as orjson writes them"""
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {key: _finite(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_finite(item) for item in value]
+    if isinstance(value, np.ndarray) and np.issubdtype(value.dtype, np.floating):
+        return np.where(np.isfinite(value), value, None).tolist()
+    if isinstance(value, np.floating):
+        return _finite(value.item())
+    return value
+
+
+def dumps(payload: Any) -> bytes:
+    """Serialize a payload (which may contain NumPy arrays and scalars) to compact JSON bytes"""
+    with metrics.timed("serialize"):
+        if orjson is not None:
+            return orjson.dumps(payload, default=_default,
+                                option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+        return json.dumps(_finite(payload), ensure_ascii=False, allow_nan=False, separators=(",", ":"),
+                          default=_default).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson when it is installed"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
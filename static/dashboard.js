@@ -1,16 +1,66 @@
 // Global variables
 let applianceDataInterval = null;
 let recommendationsInterval = null;
+let eventSource = null;
 
 // API base URL
 const API_BASE = 'http://localhost:8000';
 
 // Initialize dashboard
 document.addEventListener('DOMContentLoaded', function() {
-    startApplianceUpdates();
-    startRecommendationUpdates();
+    if (!startPushUpdates()) {
+        startApplianceUpdates();
+        startRecommendationUpdates();
+    }
 });
 
+// Apply a pushed message to the topic's current value: full snapshots replace
+// it, dict deltas carry only the changed fields and list deltas the changed
+// items plus every item's key in the new order
+function applyUpdate(current, message) {
+    if (message.full || current === undefined) return message.data;
+    if (Array.isArray(current)) {
+        const { key, items, order } = message.data;
+        const byKey = new Map(current.map(item => [item[key], item]));
+        items.forEach(item => byKey.set(item[key], item));
+        return order.map(value => byKey.get(value));
+    }
+    return { ...current, ...message.data };
+}
+
+// Subscribe to server-pushed updates; falls back to polling if the stream is unavailable
+function startPushUpdates() {
+    if (!window.EventSource) return false;
+
+    const state = {};
+    let received = false;
+    const renderers = {
+        appliances: data => Object.entries(data).forEach(([appliance, reading]) => renderAppliance(appliance, reading)),
+        recommendations: renderLiveRecommendations
+    };
+
+    eventSource = new EventSource(`${API_BASE}/stream?topics=${Object.keys(renderers).join(',')}`);
+    Object.entries(renderers).forEach(([topic, render]) => {
+        eventSource.addEventListener(topic, event => {
+            received = true;
+            const message = JSON.parse(event.data);
+            state[topic] = applyUpdate(state[topic], message);
+            // Appliance deltas only re-render the appliances that changed
+            render(message.full || Array.isArray(state[topic]) ? state[topic] : message.data);
+        });
+    });
+
+    eventSource.onerror = function() {
+        if (!received) {
+            eventSource.close();
+            eventSource = null;
+            startApplianceUpdates();
+            startRecommendationUpdates();
+        }
+    };
+    return true;
+}
+
 // Start appliance data updates
 function startApplianceUpdates() {
     updateApplianceData();
@@ -21,17 +71,16 @@ function startApplianceUpdates() {
 async function updateApplianceData() {
     const appliances = ['fridge', 'ac', 'geyser', 'microwave'];
     
-    for (const appliance of appliances) {
-        try {
-            const response = await fetch(`${API_BASE}/appliance-data/${appliance}`);
-            const data = await response.json();
-            
-            document.getElementById(`${appliance}Voltage`).textContent = data.voltage?.toFixed(1) || '--';
-            document.getElementById(`${appliance}Current`).textContent = data.current?.toFixed(2) || '--';
-            document.getElementById(`${appliance}Power`).textContent = data.power?.toFixed(0) || '--';
-            
-        } catch (error) {
-            console.error(`Error fetching ${appliance} data:`, error);
+    try {
+        // One request returns every appliance at the same instant
+        const response = await fetch(`${API_BASE}/appliance-data`);
+        const data = await response.json();
+        
+        appliances.forEach(appliance => renderAppliance(appliance, data.appliances[appliance] || {}));
+        
+    } catch (error) {
+        console.error('Error fetching appliance data:', error);
+        for (const appliance of appliances) {
             document.getElementById(`${appliance}Voltage`).textContent = '--';
             document.getElementById(`${appliance}Current`).textContent = '--';
             document.getElementById(`${appliance}Power`).textContent = '--';
@@ -39,6 +88,13 @@ async function updateApplianceData() {
     }
 }
 
+// Render one appliance's readings
+function renderAppliance(appliance, data) {
+    document.getElementById(`${appliance}Voltage`).textContent = data.voltage?.toFixed(1) || '--';
+    document.getElementById(`${appliance}Current`).textContent = data.current?.toFixed(2) || '--';
+    document.getElementById(`${appliance}Power`).textContent = data.power?.toFixed(0) || '--';
+}
+
 // Start recommendation updates
 function startRecommendationUpdates() {
     updateLiveRecommendations();
@@ -51,19 +107,7 @@ async function updateLiveRecommendations() {
         const response = await fetch(`${API_BASE}/live-recommendations`);
         const data = await response.json();
         
-        const container = document.getElementById('liveRecommendations');
-        
-        if (data.recommendations && data.recommendations.length > 0) {
-            container.innerHTML = data.recommendations.map(rec => 
-                `<div class="recommendation-item">
-                    <h4>${rec.title}</h4>
-                    <p>${rec.description}</p>
-                    ${rec.savings ? `<small style="color: #10b981; font-weight: 600;">Potential savings: ₹${rec.savings.toFixed(2)}</small>` : ''}
-                </div>`
-            ).join('');
-        } else {
-            container.innerHTML = '<div class="loading">Analyzing data for recommendations...</div>';
-        }
+        renderLiveRecommendations(data.recommendations);
         
     } catch (error) {
         console.error('Error fetching live recommendations:', error);
@@ -72,6 +116,23 @@ async function updateLiveRecommendations() {
     }
 }
 
+// Render live recommendations
+function renderLiveRecommendations(recommendations) {
+    const container = document.getElementById('liveRecommendations');
+    
+    if (recommendations && recommendations.length > 0) {
+        container.innerHTML = recommendations.map(rec => 
+            `<div class="recommendation-item">
+                <h4>${rec.title}</h4>
+                <p>${rec.description}</p>
+                ${rec.savings ? `<small style="color: #10b981; font-weight: 600;">Potential savings: ₹${rec.savings.toFixed(2)}</small>` : ''}
+            </div>`
+        ).join('');
+    } else {
+        container.innerHTML = '<div class="loading">Analyzing data for recommendations...</div>';
+    }
+}
+
 // Calculate single rate bill
 async function calculateSingleBill() {
     const rate = parseFloat(document.getElementById('singleRate').value);
@@ -151,4 +212,5 @@ async function calculateVariableBill() {
 window.addEventListener('beforeunload', function() {
     if (applianceDataInterval) clearInterval(applianceDataInterval);
     if (recommendationsInterval) clearInterval(recommendationsInterval);
+    if (eventSource) eventSource.close();
 });
\ No newline at end of file
@@ -3,6 +3,7 @@ let currentPeriod = 'today';
 let powerChart = null;
 let liveDataInterval = null;
 let optimizationInterval = null;
+let eventSource = null;
 
 // API base URL
 const API_BASE = 'http://localhost:8000';
@@ -11,11 +12,60 @@ const API_BASE = 'http://localhost:8000';
 document.addEventListener('DOMContentLoaded', function() {
     initializeChart();
     setupEventListeners();
-    startLiveUpdates();
-    loadOptimizationData();
+    if (!startPushUpdates()) {
+        startLiveUpdates();
+        loadOptimizationData();
+    }
     updateMonthlyUnits();
 });
 
+// Apply a pushed message to the topic's current value: full snapshots replace
+// it, dict deltas carry only the changed fields and list deltas the changed
+// items plus every item's key in the new order
+function applyUpdate(current, message) {
+    if (message.full || current === undefined) return message.data;
+    if (Array.isArray(current)) {
+        const { key, items, order } = message.data;
+        const byKey = new Map(current.map(item => [item[key], item]));
+        items.forEach(item => byKey.set(item[key], item));
+        return order.map(value => byKey.get(value));
+    }
+    return { ...current, ...message.data };
+}
+
+// Subscribe to server-pushed updates; falls back to polling if the stream is unavailable
+function startPushUpdates() {
+    if (!window.EventSource) return false;
+
+    const state = {};
+    let received = false;
+    const renderers = {
+        live: renderLiveMetrics,
+        peaks: renderPeakDetection,
+        slots: renderSlotRecommendations
+    };
+
+    eventSource = new EventSource(`${API_BASE}/stream?topics=${Object.keys(renderers).join(',')}`);
+    Object.entries(renderers).forEach(([topic, render]) => {
+        eventSource.addEventListener(topic, event => {
+            received = true;
+            const message = JSON.parse(event.data);
+            state[topic] = applyUpdate(state[topic], message);
+            render(state[topic]);
+        });
+    });
+
+    eventSource.onerror = function() {
+        if (!received) {
+            eventSource.close();
+            eventSource = null;
+            startLiveUpdates();
+            loadOptimizationData();
+        }
+    };
+    return true;
+}
+
 // Setup event listeners
 function setupEventListeners() {
     const chartButtons = document.querySelectorAll('.chart-btn');
@@ -241,9 +291,7 @@ async function updateLiveMetrics() {
         const response = await fetch(`${API_BASE}/live-data`);
         const data = await response.json();
         
-        document.getElementById('liveVoltage').textContent = data.voltage?.toFixed(1) || '--';
-        document.getElementById('liveCurrent').textContent = data.current?.toFixed(2) || '--';
-        document.getElementById('livePower').textContent = data.power?.toFixed(0) || '--';
+        renderLiveMetrics(data);
         
     } catch (error) {
         console.error('Error fetching live data:', error);
@@ -253,6 +301,13 @@ async function updateLiveMetrics() {
     }
 }
 
+// Render live metrics
+function renderLiveMetrics(data) {
+    document.getElementById('liveVoltage').textContent = data.voltage?.toFixed(1) || '--';
+    document.getElementById('liveCurrent').textContent = data.current?.toFixed(2) || '--';
+    document.getElementById('livePower').textContent = data.power?.toFixed(0) || '--';
+}
+
 // Update monthly units
 async function updateMonthlyUnits() {
     try {
@@ -279,35 +334,12 @@ async function updateOptimizationRecommendations() {
         // Slot recommendations
         const slotResponse = await fetch(`${API_BASE}/slot-recommendations`);
         const slotData = await slotResponse.json();
-        
-        const slotElement = document.getElementById('slotRecommendation');
-        if (slotData.recommendations && slotData.recommendations.length > 0) {
-            slotElement.innerHTML = slotData.recommendations.map(rec => 
-                `<div class="recommendation-item">
-                    <strong>${rec.time_slot}</strong>: ${rec.recommendation}
-                    <br><small>Potential savings: ₹${rec.savings?.toFixed(2) || '0'}</small>
-                </div>`
-            ).join('');
-        } else {
-            slotElement.innerHTML = '<div class="loading">No recommendations available</div>';
-        }
+        renderSlotRecommendations(slotData.recommendations);
         
         // Peak detection
         const peakResponse = await fetch(`${API_BASE}/peak-detection`);
         const peakData = await peakResponse.json();
-        
-        const peakElement = document.getElementById('peakDetection');
-        if (peakData.peaks && peakData.peaks.length > 0) {
-            peakElement.innerHTML = peakData.peaks.map(peak => 
-                `<div class="recommendation-item">
-                    <strong>Peak detected at ${new Date(peak.timestamp).toLocaleTimeString()}</strong>
-                    <br>Power: ${peak.power}W
-                    <br><small>${peak.suggestion}</small>
-                </div>`
-            ).join('');
-        } else {
-            peakElement.innerHTML = '<div class="loading">No peaks detected</div>';
-        }
+        renderPeakDetection(peakData.peaks);
         
     } catch (error) {
         console.error('Error fetching optimization data:', error);
@@ -316,8 +348,40 @@ async function updateOptimizationRecommendations() {
     }
 }
 
+// Render slot recommendations
+function renderSlotRecommendations(recommendations) {
+    const slotElement = document.getElementById('slotRecommendation');
+    if (recommendations && recommendations.length > 0) {
+        slotElement.innerHTML = recommendations.map(rec => 
+            `<div class="recommendation-item">
+                <strong>${rec.time_slot}</strong>: ${rec.recommendation}
+                <br><small>Potential savings: ₹${rec.savings?.toFixed(2) || '0'}</small>
+            </div>`
+        ).join('');
+    } else {
+        slotElement.innerHTML = '<div class="loading">No recommendations available</div>';
+    }
+}
+
+// Render peak detection results
+function renderPeakDetection(peaks) {
+    const peakElement = document.getElementById('peakDetection');
+    if (peaks && peaks.length > 0) {
+        peakElement.innerHTML = peaks.map(peak => 
+            `<div class="recommendation-item">
+                <strong>Peak detected at ${new Date(peak.timestamp).toLocaleTimeString()}</strong>
+                <br>Power: ${peak.power}W
+                <br><small>${peak.suggestion}</small>
+            </div>`
+        ).join('');
+    } else {
+        peakElement.innerHTML = '<div class="loading">No peaks detected</div>';
+    }
+}
+
 // Cleanup intervals when page unloads
 window.addEventListener('beforeunload', function() {
     if (liveDataInterval) clearInterval(liveDataInterval);
     if (optimizationInterval) clearInterval(optimizationInterval);
+    if (eventSource) eventSource.close();
 });
\ No newline at end of file
@@ -0,0 +1,152 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from pydantic import BaseModel, Field
+
+
+class TariffBand(BaseModel):
+    """A time-of-use band: [start_hour, end_hour) at a rate, optionally limited to some days/months"""
+    name: str
+    start_hour: int = Field(ge=0, le=23)
+    end_hour: int = Field(ge=1, le=24)  # Exclusive; an end before the start wraps past midnight
+    rate: float
+    days: str = Field("all", pattern="^(all|weekday|weekend)$")
+    months: Optional[List[int]] = None  # Seasonal bands: 1-12, None for all year
+
+
+class TariffSlab(BaseModel):
+    """One step of a tiered (slab) energy charge"""
+    up_to_kwh: Optional[float] = None  # None for the last, unbounded slab
+    rate: float
+
+
+class TariffPlan(BaseModel):
+    """Declarative electricity plan
+
+    Each kWh is charged at the rate of the first band covering its hour,
+    or base_rate if none does. Slabs add a tiered charge on the total kWh
+    of the period, and fixed_charge is added once per bill.
+    """
+    name: str = "plan"
+    base_band: str = "off_peak"
+    base_rate: float = 0.0
+    bands: List[TariffBand] = []
+    slabs: List[TariffSlab] = []
+    fixed_charge: float = 0.0
+
+
+def time_of_use_plan(peak_rate: float, standard_rate: float, off_peak_rate: float,
+                     name: str = "time_of_use") -> TariffPlan:
+    """The three-band plan the app has always used: peak 9-18, standard 18-22, off-peak otherwise"""
+    return TariffPlan(
+        name=name,
+        base_band="off_peak",
+        base_rate=off_peak_rate,
+        bands=[
+            TariffBand(name="peak", start_hour=9, end_hour=18, rate=peak_rate),
+            TariffBand(name="standard", start_hour=18, end_hour=22, rate=standard_rate),
+        ],
+    )
+
+
+DEFAULT_PLAN = time_of_use_plan(8.0, 6.0, 4.0, name="default")
+
+
+def day_calendar(days: np.ndarray) -> Dict[str, np.ndarray]:
+    """Weekday (Monday=0) and month (1-12) for an array of epoch day numbers"""
+    days = np.asarray(days, dtype=np.int64)
+    months = days.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64) % 12 + 1
+    return {"weekday": (days + 3) % 7, "month": months}
+
+
+def band_grid(plan: TariffPlan, days: np.ndarray) -> np.ndarray:
+    """Band index (into plan.bands, -1 for the base band) for every day x hour cell"""
+    calendar = day_calendar(days)
+    hours = np.arange(24)
+    grid = np.full((len(days), 24), -1, dtype=np.int64)
+    for index in range(len(plan.bands) - 1, -1, -1):  # Earlier bands win
+        band = plan.bands[index]
+        if band.start_hour < band.end_hour:
+            hour_mask = (hours >= band.start_hour) & (hours < band.end_hour)
+        else:
+            hour_mask = (hours >= band.start_hour) | (hours < band.end_hour)
+        day_mask = np.ones(len(days), dtype=bool)
+        if band.days == "weekday":
+            day_mask &= calendar["weekday"] < 5
+        elif band.days == "weekend":
+            day_mask &= calendar["weekday"] >= 5
+        if band.months:
+            day_mask &= np.isin(calendar["month"], band.months)
+        grid[np.outer(day_mask, hour_mask)] = index
+    return grid
+
+
+def hourly_rates(plan: TariffPlan, day: datetime) -> np.ndarray:
+    """The plan's 24 hourly rates on a given day"""
+    epoch_day = np.array([(day - datetime(1970, 1, 1)).days])
+    grid = band_grid(plan, epoch_day)[0]
+    rates = np.array([band.rate for band in plan.bands] + [plan.base_rate])
+    return rates[grid]  # -1 picks the trailing base rate
+
+
+def rates_at(plan: TariffPlan, timestamps: np.ndarray) -> np.ndarray:
+    """The plan's rate at each epoch timestamp"""
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    days, day_rows = np.unique(timestamps // 86400, return_inverse=True)
+    grid = band_grid(plan, days)[day_rows, (timestamps // 3600) % 24]
+    rates = np.array([band.rate for band in plan.bands] + [plan.base_rate])
+    return rates[grid]
+
+
+def slab_charge(slabs: List[TariffSlab], total_kwh: float) -> float:
+    """Tiered charge for total_kwh across consecutive slabs"""
+    charge = 0.0
+    lower = 0.0
+    for slab in slabs:
+        upper = slab.up_to_kwh if slab.up_to_kwh is not None else float("inf")
+        charge += max(min(total_kwh, upper) - lower, 0.0) * slab.rate
+        lower = upper
+        if total_kwh <= lower:
+            break
+    return charge
+
+
+def evaluate_plans(plans: List[TariffPlan], days: np.ndarray, daily_wh: np.ndarray) -> List[Dict[str, Any]]:
+    """Bill every plan against the same day x hour Wh grid
+
+    The energy grid is shared; per plan only a small band-index grid is
+    built, and units/costs per band come from one bincount each.
+    """
+    kwh = np.asarray(daily_wh, dtype=np.float64) / 1000
+    total_kwh = float(kwh.sum())
+    flat_kwh = kwh.reshape(-1)
+
+    results = []
+    for plan in plans:
+        grid = band_grid(plan, days).reshape(-1) + 1  # 0 is the base band
+        rates = np.array([plan.base_rate] + [band.rate for band in plan.bands])
+        nbands = len(rates)
+        units = np.bincount(grid, weights=flat_kwh, minlength=nbands)
+        costs = units * rates
+
+        bands: Dict[str, Dict[str, float]] = {}
+        names = [plan.base_band] + [band.name for band in plan.bands]
+        for name, band_units, band_cost in zip(names, units, costs):
+            entry = bands.setdefault(name, {"units": 0.0, "cost": 0.0})
+            entry["units"] += float(band_units)
+            entry["cost"] += float(band_cost)
+
+        energy_cost = float(costs.sum())
+        slab_cost = slab_charge(plan.slabs, total_kwh)
+        results.append({
+            "plan": plan.name,
+            "units": round(total_kwh, 2),
+            "bands": {name: {key: round(value, 2) for key, value in entry.items()}
+                      for name, entry in bands.items()},
+            "energy_cost": round(energy_cost, 2),
+            "slab_cost": round(slab_cost, 2),
+            "fixed_charge": round(plan.fixed_charge, 2),
+            "total_cost": round(energy_cost + slab_cost + plan.fixed_charge, 2),
+        })
+    return results
@@ -0,0 +1,41 @@
+import threading
+
+import numpy as np
+
+from accumulators import EnergyAccumulator
+from conftest import START
+from timeseries_store import from_epoch
+
+
+def test_incremental_syncs_match_a_rebuild(make_series):
+    series = make_series(30000)
+    accumulator = EnergyAccumulator.build(series[:1000])
+    for rows in (1001, 7000, 30000):
+        accumulator = accumulator.sync(series[:rows])
+
+    rebuilt = EnergyAccumulator.build(series)
+    assert accumulator.rows == rebuilt.rows == len(series)
+    days, wh = accumulator.daily_wh(from_epoch(START))
+    rebuilt_days, rebuilt_wh = rebuilt.daily_wh(from_epoch(START))
+    assert np.array_equal(days, rebuilt_days)
+    assert np.allclose(wh, rebuilt_wh)
+
+
+def test_concurrent_syncs_book_each_row_once(make_series):
+    series = make_series(20000)
+    accumulator = EnergyAccumulator.build(series[:19400])
+    barrier = threading.Barrier(8)
+
+    def refresh():
+        barrier.wait()
+        accumulator.sync(series)
+
+    threads = [threading.Thread(target=refresh) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    rebuilt = EnergyAccumulator.build(series)
+    assert accumulator.rows == len(series)
+    assert np.allclose(accumulator.hourly_wh(from_epoch(START)), rebuilt.hourly_wh(from_epoch(START)))
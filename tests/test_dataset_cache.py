@@ -0,0 +1,40 @@
+import numpy as np
+
+from dataset_cache import DatasetCache
+
+
+def test_values_are_reloaded_when_the_version_or_counter_changes():
+    cache = DatasetCache()
+    loads = []
+
+    def loader():
+        loads.append(1)
+        return len(loads)
+
+    assert cache.get("series", 1, loader) == 1
+    assert cache.get("series", 1, loader) == 1
+    assert cache.get("series", 2, loader) == 2
+    cache.bump("series")
+    assert cache.get("series", 2, loader) == 3
+    assert cache.peek("series") == 3
+    assert cache.stats()["hits"] == 1
+
+
+def test_lookup_and_put_share_entries_with_get():
+    cache = DatasetCache()
+    assert cache.lookup("scan", 1) is None
+    cache.put("scan", 1, "peaks")
+    assert cache.lookup("scan", 1) == "peaks"
+    assert cache.get("scan", 1, lambda: "reloaded") == "peaks"
+    assert cache.lookup("scan", 2) is None
+
+
+def test_least_recently_used_entries_are_evicted_by_size():
+    cache = DatasetCache(max_bytes=3 * 800)
+    for key in "abc":
+        cache.get(key, 1, lambda: np.zeros(100))
+    cache.get("a", 1, lambda: None)  # Touch a, so b is the oldest
+    cache.get("d", 1, lambda: np.zeros(100))
+    assert cache.peek("b") is None
+    assert all(cache.peek(key) is not None for key in "acd")
+    assert cache.stats()["evictions"] == 1
@@ -0,0 +1,38 @@
+import threading
+
+import numpy as np
+
+from forecasting import Forecaster
+
+
+def assert_same_fit(forecaster: Forecaster, rebuilt: Forecaster):
+    assert forecaster.rows == rebuilt.rows
+    assert forecaster.hour == rebuilt.hour
+    assert np.allclose(forecaster.profile(), rebuilt.profile())
+    assert np.isclose(forecaster.level, rebuilt.level)
+    assert np.allclose(forecaster.predict(rebuilt.hour + 1, 48), rebuilt.predict(rebuilt.hour + 1, 48))
+
+
+def test_incremental_syncs_match_a_rebuild(make_series):
+    series = make_series(40000)
+    forecaster = Forecaster.build(series[:500])
+    for rows in (501, 505, 9000, 40000):  # Appends inside an open hour too
+        forecaster = forecaster.sync(series[:rows])
+    assert_same_fit(forecaster, Forecaster.build(series))
+
+
+def test_concurrent_syncs_fold_each_hour_once(make_series):
+    series = make_series(40000)
+    forecaster = Forecaster.build(series[:38000])
+    barrier = threading.Barrier(8)
+
+    def refresh():
+        barrier.wait()
+        forecaster.sync(series)
+
+    threads = [threading.Thread(target=refresh) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert_same_fit(forecaster, Forecaster.build(series))
@@ -0,0 +1,72 @@
+import asyncio
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from accumulators import EnergyAccumulator
+from ingest import GridResampler, IngestPipeline, SegmentLog
+from ingest_service import ReplaySource
+from timeseries_store import SAMPLE_SECONDS, TimeSeries, load_series, parse_timestamps
+
+
+def live_pipeline(tmp_path, name):
+    pipeline = IngestPipeline(SegmentLog(str(tmp_path / "ingest")), store_name=name)
+    rows = []
+    pipeline.add_consumer(rows.append)
+    return pipeline, rows
+
+
+def test_live_readings_are_booked_once_per_grid_slot(tmp_path):
+    pipeline, rows = live_pipeline(tmp_path, "live_grid_test")
+    start = datetime(2025, 5, 1)
+    # An hour of 1 kW readings at the meter's ~5.5 s cadence
+    for i in range(655):
+        pipeline.ingest({"voltage": 230, "current": 4.35, "power": 1000}, start + timedelta(seconds=i * 5.5))
+    pipeline.close()
+
+    timestamps = parse_timestamps(row["timestamp"] for row in rows)
+    assert np.all(np.diff(timestamps) == SAMPLE_SECONDS)
+    stored = load_series("live_grid_test")
+    assert np.array_equal(stored.timestamp, timestamps)
+
+    total_wh = EnergyAccumulator.build(TimeSeries.from_records(rows)).hourly_wh(start).sum()
+    assert abs(total_wh - 1000) <= 1000 * SAMPLE_SECONDS / 3600
+
+
+def test_slots_are_averaged_and_short_gaps_held():
+    resampler = GridResampler(step=10, max_hold_seconds=30)
+    reading = {"voltage": 230.0, "current": 1.0}
+    assert resampler.add(100, dict(reading, power=100.0)) == []
+    assert resampler.add(105, dict(reading, power=300.0)) == []
+    rows = resampler.add(130, dict(reading, power=500.0))  # Slots 110 and 120 were missed
+    assert [row["power"] for row in rows] == [200.0, 200.0, 200.0]
+    assert resampler.add(125, dict(reading, power=900.0)) == []  # Slot already written
+
+    rows = resampler.add(200, dict(reading, power=700.0))  # Too long a silence to hold
+    assert [(row["timestamp"][-8:], row["power"]) for row in rows] == [("00:02:10", 500.0)]
+    assert [row["power"] for row in resampler.flush()] == [700.0]
+
+
+def test_rotation_keeps_only_the_newest_segments(tmp_path):
+    log = SegmentLog(str(tmp_path), max_bytes=1, keep_segments=3)
+    for i in range(10):
+        log.append({"power": i})
+    log.close()
+
+    assert [os.path.basename(path) for path in log.segments()] == [
+        "segment-00000007.ndjson", "segment-00000008.ndjson", "segment-00000009.ndjson"]
+    assert [record["power"] for record in log.iter_records()] == [7, 8, 9]
+
+
+def test_replay_reads_every_line_across_blocks(tmp_path):
+    path = tmp_path / "capture.txt"
+    lines = [f'{{"power": {i}}}\n'.encode() for i in range(500)]
+    path.write_bytes(b"".join(lines))
+    source = ReplaySource(str(path))
+    source.READ_BYTES = 100
+
+    async def read():
+        return [raw async for raw in source.lines()]
+
+    assert asyncio.run(read()) == lines
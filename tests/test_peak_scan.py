@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from optimization_algorithms import PowerOptimizer
+from peak_scan import day_summaries, merge_chunks, peak_page, plan_chunks, scan_chunk
+from timeseries_store import store
+
+WINDOW = 12
+
+
+@pytest.fixture
+def stored(make_series):
+    series = make_series(40000, seed=3)
+    store.write("peak_scan_test", series)
+    return series
+
+
+@pytest.mark.parametrize("multiplier, threshold", [(1.05, 850.0), (1.5, 1e9), (1.0, 0.0)])
+@pytest.mark.parametrize("lo, hi", [(0, 40000), (5, 17), (9000, 31234)])
+@pytest.mark.parametrize("parts, min_rows", [(4, 10000), (64, 50), (1000, 1)])
+def test_chunked_scan_matches_one_pass(stored, multiplier, threshold, lo, hi, parts, min_rows):
+    expected = PowerOptimizer().find_peaks(stored[max(lo - WINDOW, 0):hi], WINDOW, multiplier, threshold)
+    chunks = [scan_chunk("peak_scan_test", first, last, WINDOW, multiplier, threshold, 300)
+              for first, last in plan_chunks(lo, hi, parts, min_rows)]
+    peaks = merge_chunks(chunks, 300)
+    for field, values in expected.items():
+        assert np.array_equal(peaks[field], values), field
+
+
+def test_plan_chunks_covers_the_range_once():
+    chunks = plan_chunks(10, 1000, 7, min_rows=100)
+    assert len(chunks) == 7
+    assert chunks[0][0] == 10 and chunks[-1][1] == 1000
+    assert all(end == start for (_, end), (start, _) in zip(chunks, chunks[1:]))
+    assert plan_chunks(0, 50, 8, min_rows=100) == [(0, 50)]
+    assert plan_chunks(5, 5, 8) == []
+
+
+def test_pages_and_day_summaries(stored):
+    peaks = PowerOptimizer().find_peaks(stored, WINDOW, 1.05, 850.0)
+    total = len(peaks["timestamp"])
+    pages = [peak_page(peaks, offset, 100)["timestamp"] for offset in range(0, total, 100)]
+    assert np.array_equal(np.concatenate(pages), peaks["timestamp"])
+
+    by_ratio = peak_page(peaks, 0, total, "ratio")
+    ratios = np.round(by_ratio["power"] / by_ratio["average_power"], 2)
+    assert np.all(np.diff(ratios) <= 0)
+
+    days = day_summaries(peaks)
+    assert sum(day["peaks"] for day in days) == total
+    assert max(day["max_power"] for day in days) == round(float(peaks["power"].max()), 2)
@@ -0,0 +1,65 @@
+import os
+from types import SimpleNamespace
+
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+import profiling
+from profiling import ProfilingMiddleware, frame_name
+
+
+async def numbers(request):
+    return JSONResponse({"total": sum(range(100000))})
+
+
+async def stream(request):
+    async def chunks():
+        for i in range(3):
+            yield f"chunk {i}\n"
+
+    return StreamingResponse(chunks(), media_type="text/plain")
+
+
+def client(directory=None) -> TestClient:
+    app = Starlette(routes=[Route("/numbers", numbers), Route("/stream", stream)])
+    return TestClient(ProfilingMiddleware(app, key="secret", directory=directory))
+
+
+def test_profiled_request_returns_the_profile():
+    response = client().get("/numbers", headers={"X-Profile": "secret", "X-Profile-Mode": "cprofile"})
+    assert response.status_code == 200
+    assert response.headers["content-disposition"] == 'attachment; filename="profile.prof"'
+
+
+def test_profile_is_written_to_the_profile_directory(tmp_path):
+    response = client(str(tmp_path / "profiles")).get(
+        "/numbers", headers={"X-Profile": "secret", "X-Profile-Mode": "cprofile"})
+    assert response.json() == {"total": 4999950000}
+    assert os.path.getsize(response.headers["x-profile-file"]) > 0
+
+
+def test_cprofile_request_is_served_unprofiled_while_another_one_runs():
+    with profiling._cprofile_lock:
+        response = client().get("/numbers", headers={"X-Profile": "secret", "X-Profile-Mode": "cprofile"})
+    assert response.json() == {"total": 4999950000}
+    assert response.headers["x-profile-skipped"] == "another profile is running"
+    assert client().get("/numbers", headers={"X-Profile": "secret", "X-Profile-Mode": "cprofile"}).headers[
+        "content-disposition"] == 'attachment; filename="profile.prof"'
+
+
+def test_wrong_key_is_refused_and_unprofiled_requests_pass_through():
+    assert client().get("/numbers", headers={"X-Profile": "wrong"}).status_code == 403
+    assert client().get("/numbers").json() == {"total": 4999950000}
+
+
+def test_streaming_responses_pass_through_unprofiled():
+    response = client().get("/stream", headers={"X-Profile": "secret"})
+    assert response.text == "chunk 0\nchunk 1\nchunk 2\n"
+    assert response.headers["x-profile-skipped"] == "streaming response"
+
+
+def test_frame_name_without_co_qualname():
+    code = SimpleNamespace(co_filename="/srv/app.py", co_name="handler")
+    assert frame_name(code) == "app.py:handler"
@@ -0,0 +1,27 @@
+import json
+
+import numpy as np
+
+from push import Broadcaster, diff
+
+
+def test_dict_delta_holds_changed_and_removed_keys():
+    assert diff({"power": 1, "voltage": 230, "old": 1}, {"power": 2, "voltage": 230}) == {"power": 2, "old": None}
+
+
+def test_list_delta_holds_changed_items_and_the_new_order():
+    old = [{"timestamp": 1, "power": 900}, {"timestamp": 2, "power": 950}]
+    new = [{"timestamp": 3, "power": 1200}, {"timestamp": 1, "power": 900}]
+    assert diff(old, new) == {"key": "timestamp", "items": [{"timestamp": 3, "power": 1200}], "order": [3, 1]}
+
+
+def test_lists_without_a_unique_item_key_are_sent_in_full():
+    assert diff([{"power": 1}], [{"power": 2}]) is None
+    assert diff([{"title": "a"}], [{"title": "a"}, {"title": "a"}]) is None
+
+
+def test_events_encode_numpy_values():
+    event = Broadcaster._encode("live", {"power": np.float64(1.5), "rows": np.arange(2)}, full=True)
+    assert event.startswith("event: live\ndata: ")
+    assert json.loads(event.split("data: ", 1)[1]) == {"topic": "live", "full": True,
+                                                       "data": {"power": 1.5, "rows": [0, 1]}}
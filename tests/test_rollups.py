@@ -0,0 +1,50 @@
+import threading
+
+import numpy as np
+
+from rollups import RollupSet, TIERS, aggregate
+
+
+def assert_same_tiers(rollups: RollupSet, rebuilt: RollupSet):
+    for name in TIERS:
+        tier, expected = rollups.tiers[name].view(), rebuilt.tiers[name].view()
+        for field in expected:
+            assert np.allclose(tier[field], expected[field]), (name, field)
+
+
+def test_incremental_syncs_match_a_rebuild(make_series):
+    series = make_series(30000)
+    rollups = RollupSet.build(series[:1000])
+    for rows in (1001, 1003, 7000, 30000):  # Appends landing inside an open bucket too
+        rollups = rollups.sync(series[:rows])
+
+    assert rollups.rows == len(series)
+    assert_same_tiers(rollups, RollupSet.build(series))
+
+
+def test_tiers_match_aggregating_raw_rows(make_series):
+    series = make_series(20000)
+    rollups = RollupSet.build(series)
+    for name, width in TIERS.items():
+        expected = aggregate(series, width)
+        for field in expected:
+            assert np.allclose(rollups.tiers[name].view()[field], expected[field]), (name, field)
+
+
+def test_concurrent_syncs_fold_each_row_once(make_series):
+    series = make_series(20000)
+    rollups = RollupSet.build(series[:19400])
+    barrier = threading.Barrier(8)
+
+    def refresh():
+        barrier.wait()
+        rollups.sync(series)
+
+    threads = [threading.Thread(target=refresh) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert rollups.rows == len(series)
+    assert_same_tiers(rollups, RollupSet.build(series))
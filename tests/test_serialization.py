@@ -0,0 +1,27 @@
+import json
+
+import numpy as np
+import pytest
+
+import serialization
+
+
+@pytest.fixture(params=["orjson", "json"])
+def dumps(request, monkeypatch):
+    if request.param == "orjson":
+        pytest.importorskip("orjson")
+    else:
+        monkeypatch.setattr(serialization, "orjson", None)
+    return serialization.dumps
+
+
+def test_non_finite_floats_are_written_as_null(dumps):
+    payload = {"power": float("nan"), "peak": np.float32("inf"), "rows": np.array([1.5, np.nan, -np.inf]),
+               "nested": [{"ratio": float("-inf")}, (2.0, float("nan"))]}
+    assert json.loads(dumps(payload)) == {"power": None, "peak": None, "rows": [1.5, None, None],
+                                          "nested": [{"ratio": None}, [2.0, None]]}
+
+
+def test_numpy_values_are_serialized(dumps):
+    payload = {"count": np.int64(3), "times": np.array(["2025-05-01T00:00"], dtype="datetime64[s]")}
+    assert json.loads(dumps(payload)) == {"count": 3, "times": ["2025-05-01T00:00:00"]}
@@ -0,0 +1,109 @@
+import sys
+import threading
+
+import numpy as np
+
+from conftest import START
+from optimization_algorithms import PowerOptimizer, StreamingPeakDetector
+from timeseries_store import SAMPLE_SECONDS, TimeSeries
+
+
+def daily_load(days: int = 2, seed: int = 0) -> TimeSeries:
+    """A household curve: ~300 W at night, 900-1200 W all day, with short appliance spikes"""
+    rng = np.random.default_rng(seed)
+    rows = days * 86400 // SAMPLE_SECONDS
+    timestamp = START + SAMPLE_SECONDS * np.arange(rows, dtype=np.int64)
+    hour = (timestamp % 86400) / 3600
+    power = np.where((hour >= 7) & (hour < 23), 900 + 300 * np.sin((hour - 7) / 16 * np.pi), 300)
+    power = power + rng.normal(0, 15, rows)
+    for start in rng.choice(rows - 6, size=40, replace=False):
+        power[start:start + 6] += 1500  # A kettle or a microwave
+    return TimeSeries(timestamp, np.full(rows, 230, dtype=np.float32), (power / 230).astype(np.float32),
+                      power.astype(np.float32))
+
+
+def test_streaming_detector_matches_one_feed(make_series):
+    optimizer = PowerOptimizer()
+    series = make_series(5000)
+    whole = optimizer.create_streaming_detector()
+    expected = whole.feed(series)
+
+    detector = optimizer.create_streaming_detector()
+    events = []
+    for rows in (100, 101, 2500, 5000):
+        events += detector.catch_up(series[:rows], max_rows=len(series))
+    assert events == expected
+
+
+def test_concurrent_catch_ups_feed_each_row_once(make_series):
+    optimizer = PowerOptimizer()
+    series = make_series(5000)
+    detector = optimizer.create_streaming_detector()
+    detector.feed(series[:3000])
+    barrier = threading.Barrier(8)
+    # Switch threads often so racing catch-ups interleave
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+
+    def catch_up():
+        barrier.wait()
+        detector.catch_up(series, max_rows=len(series))
+
+    threads = [threading.Thread(target=catch_up) for _ in range(8)]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(interval)
+
+    reference = optimizer.create_streaming_detector()
+    reference.feed(series)
+    assert detector.samples == len(series)
+    assert list(detector.events) == list(reference.events)
+
+
+def test_streaming_matches_the_batch_scan_without_hysteresis(make_series):
+    series = make_series(20000)
+    optimizer = PowerOptimizer()
+    detector = StreamingPeakDetector(optimizer.window_size, optimizer.peak_threshold_multiplier,
+                                     optimizer.threshold_watts, hysteresis=0, max_events=len(series))
+    detector.feed(series)
+    batch = optimizer.find_peaks(series)
+    assert [event["epoch"] for event in detector.events] == batch["timestamp"].tolist()
+
+
+def test_events_are_kept_across_catch_ups(make_series):
+    series = make_series(10000)
+    detector = PowerOptimizer().create_streaming_detector(max_events=1000)
+    first = detector.catch_up(series[:5000], max_rows=len(series))
+    later = detector.catch_up(series, max_rows=len(series))
+    assert first and later
+    assert list(detector.events) == first + later
+    assert len(detector.recent(limit=None)) == len(first) + len(later)
+
+
+def test_hysteresis_releases_a_peak_once_the_load_drops():
+    detector = StreamingPeakDetector(window_size=4, multiplier=1.5, threshold_watts=10000, hysteresis=0.1,
+                                     min_gap_seconds=0)
+    timestamps = iter(range(0, 10000, SAMPLE_SECONDS))
+    for power in [100] * 4:
+        detector.update(next(timestamps), power)
+    assert detector.update(next(timestamps), 400) is not None
+    # Still high against a window the peak has raised: one event, not one per sample
+    assert detector.update(next(timestamps), 400) is None
+    for power in [100] * 4:
+        detector.update(next(timestamps), power)  # Back below the release level
+    assert detector.update(next(timestamps), 400) is not None
+
+
+def test_default_detector_separates_peaks_over_a_daily_load_curve():
+    load = daily_load()
+    detector = PowerOptimizer().create_streaming_detector()
+    detector.feed(load)
+    events = detector.recent(limit=5)
+
+    assert len(detector.events) >= 20  # Separate events, not one never-ending peak
+    assert all(event["peak_ratio"] > 1 for event in events)  # Above the running average
+    assert events[0]["peak_ratio"] > 1.5  # The appliance spikes rank first
@@ -0,0 +1,79 @@
+import os
+
+import numpy as np
+
+import timeseries_store
+from timeseries_store import ColumnStore, RunLengthSeries, TimeSeries, rows_after
+
+
+def test_write_append_and_open(tmp_path, make_series):
+    store = ColumnStore(str(tmp_path))
+    series = make_series(1000)
+    store.write("main", series[:600])
+    store.append("main", series[600:])
+
+    stored = store.open("main")
+    assert np.array_equal(stored.timestamp, series.timestamp)
+    assert np.array_equal(stored.power, series.power)
+    assert np.array_equal(store.tail("main", 10).timestamp, series.timestamp[-10:])
+    assert len(store.open("missing")) == 0
+
+
+def test_between_uses_half_open_ranges(make_series):
+    series = make_series(100)
+    start, end = int(series.timestamp[10]), int(series.timestamp[20])
+    assert np.array_equal(series.between(start, end).timestamp, series.timestamp[10:20])
+    assert len(series.between(end, start)) == 0
+
+
+def test_unsorted_series_are_indexed_in_time_order(make_series):
+    series = make_series(100)
+    shuffled = series[np.random.default_rng(0).permutation(100)]
+    start, end = int(series.timestamp[10]), int(series.timestamp[20])
+    assert np.array_equal(np.sort(shuffled.between(start, end).timestamp), series.timestamp[10:20])
+
+
+def test_run_length_encoding_round_trips(make_series):
+    series = make_series(5000)
+    off = np.random.default_rng(2).random(5000) < 0.7
+    series = TimeSeries(series.timestamp, np.where(off, 0, series.voltage).astype(np.float32),
+                        np.where(off, 0, series.current).astype(np.float32),
+                        np.where(off, 0, series.power).astype(np.float32))
+    decoded = RunLengthSeries.encode(series).to_series()
+    for column in ("timestamp", "voltage", "current", "power"):
+        assert np.array_equal(getattr(decoded, column), getattr(series, column))
+
+
+def test_rows_after_tells_growth_from_rewrites(make_series):
+    series = make_series(1000)
+    seen = series[:600]
+    first, last = int(seen.timestamp[0]), int(seen.timestamp[-1])
+    assert np.array_equal(rows_after(series, 600, first, last).timestamp, series.timestamp[600:])
+    # Rows pushed ahead of a flush are already counted
+    assert np.array_equal(rows_after(series, 650, first, int(series.timestamp[649])).timestamp,
+                          series.timestamp[650:])
+    assert rows_after(series[100:], 600, first, last) is None  # Different first row
+    assert rows_after(series, 500, first, last) is None  # Rows appeared before the cursor
+
+
+def test_appends_to_a_runs_series_leave_the_runs_file_alone_until_compaction(tmp_path, make_series, monkeypatch):
+    monkeypatch.setattr(timeseries_store, "RUNS_TAIL_ROWS", 500)
+    store = ColumnStore(str(tmp_path))
+    series = make_series(3000)
+    off = (np.arange(3000) // 50) % 4 != 0  # On for 50 samples out of every 200
+    series = TimeSeries(series.timestamp, *(np.where(off, 0, getattr(series, column)).astype(np.float32)
+                                            for column in ("voltage", "current", "power")))
+    store.write_runs("fridge", RunLengthSeries.encode(series[:2000]))
+    runs_file = os.path.join(store.path("fridge"), "runs.npz")
+    written = os.stat(runs_file).st_mtime_ns
+
+    for first in range(2000, 2400, 40):
+        store.append("fridge", series[first:first + 40])
+    assert os.stat(runs_file).st_mtime_ns == written
+    assert np.array_equal(store.open("fridge").power, series[:2400].power)
+    assert np.array_equal(store.tail("fridge", 30).timestamp, series.timestamp[2370:2400])
+
+    store.append("fridge", series[2400:])  # Tail reaches RUNS_TAIL_ROWS: folded into the runs
+    assert not os.path.exists(os.path.join(store.path("fridge"), "timestamp.bin"))
+    assert np.array_equal(store.open("fridge").timestamp, series.timestamp)
+    assert np.array_equal(store.open_runs("fridge").to_series().power, series.power)
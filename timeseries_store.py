@@ -0,0 +1,637 @@
+import json
+import os
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Iterable, Optional
+
+import numpy as np
+
+from metrics import metrics
+from tracing import get_logger, span
+
+log = get_logger("store")
+
+DATA_DIR = os.environ.get("WATTWISE_DATA_DIR", "data")
+STORE_DIR = os.path.join(DATA_DIR, "store")
+
+# Column name -> on-disk dtype. Timestamps are naive wall-clock times stored
+# as seconds since 1970-01-01, so hour/day arithmetic stays integer maths.
+COLUMNS = {
+    "timestamp": np.int64,
+    "voltage": np.float32,
+    "current": np.float32,
+    "power": np.float32,
+}
+VALUE_COLUMNS = ("voltage", "current", "power")
+ROW_BYTES = sum(np.dtype(dtype).itemsize for dtype in COLUMNS.values())
+EPOCH = datetime(1970, 1, 1)
+SAMPLE_SECONDS = 10  # Meter sampling interval
+
+# Source files that seed the store, most compact first: .npz holds the
+# columns as binary arrays; .json is either {"column": [values...]} or
+# the legacy list of {"timestamp", "voltage", "current", "power"} dicts.
+SOURCE_EXTENSIONS = (".npz", ".json")
+
+# Run-length layout for mostly-off series: one record per run of equally
+# spaced on (or off) samples, plus the readings of on samples only. Off
+# samples are all zeros and are not stored at all.
+RUN_FIELDS = {
+    "start": np.int64,
+    "rows": np.int32,
+    "on": np.bool_,
+    "power_sum": np.float64,
+    "power_max": np.float32,
+}
+RUNS_FILE = "runs.npz"
+# Series are stored as runs when that takes at most this share of the dense columns
+RUNS_MAX_RATIO = 0.5
+# Appends to a runs series land in dense column files next to runs.npz and
+# are folded into the runs once this many have piled up (a day at 10 s),
+# so an append does not rewrite the whole history
+RUNS_TAIL_ROWS = 8640
+
+
+def to_epoch(dt: datetime) -> int:
+    """Convert a naive datetime to epoch seconds"""
+    return (dt.replace(microsecond=0) - EPOCH) // timedelta(seconds=1)
+
+
+def from_epoch(ts: int) -> datetime:
+    """Convert epoch seconds back to a naive datetime"""
+    return EPOCH + timedelta(seconds=int(ts))
+
+
+def parse_timestamps(values: Iterable[str]) -> np.ndarray:
+    """Parse ISO timestamps into an int64 epoch-seconds array"""
+    return np.array(list(values), dtype="datetime64[s]").astype(np.int64)
+
+
+class TimeIndex:
+    """Sorted view of a timestamp column answering range queries by binary search"""
+
+    def __init__(self, timestamps: np.ndarray):
+        # Stored series are written in time order; only pay for a sort if one isn't
+        if len(timestamps) > 1 and bool((np.diff(timestamps) < 0).any()):
+            self.order = np.argsort(timestamps, kind="stable")
+            self.sorted = timestamps[self.order]
+        else:
+            self.order = None
+            self.sorted = timestamps
+
+    def rows_between(self, start: int = None, end: int = None):
+        """Rows with start <= timestamp < end, as a slice (or index array if unsorted)"""
+        lo = 0 if start is None else int(np.searchsorted(self.sorted, start, side="left"))
+        hi = len(self.sorted) if end is None else int(np.searchsorted(self.sorted, end, side="left"))
+        hi = max(lo, hi)
+        if self.order is None:
+            return slice(lo, hi)
+        return self.order[lo:hi]
+
+
+class TimeSeries:
+    """Column arrays for one power stream, ordered by timestamp"""
+
+    def __init__(self, timestamp: np.ndarray, voltage: np.ndarray, current: np.ndarray, power: np.ndarray):
+        self.timestamp = timestamp
+        self.voltage = voltage
+        self.current = current
+        self.power = power
+        self._index = None
+
+    @classmethod
+    def empty(cls) -> "TimeSeries":
+        return cls(*(np.empty(0, dtype=dtype) for dtype in COLUMNS.values()))
+
+    @classmethod
+    def from_records(cls, records: List[Dict]) -> "TimeSeries":
+        """Build a series from a list of {"timestamp", "voltage", "current", "power"} dicts"""
+        if not records:
+            return cls.empty()
+        return cls(
+            parse_timestamps(entry["timestamp"] for entry in records),
+            *(np.array([entry.get(column, 0) for entry in records], dtype=COLUMNS[column])
+              for column in VALUE_COLUMNS),
+        )
+
+    def __len__(self) -> int:
+        return len(self.timestamp)
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, np.integer)):
+            return self.record(key)
+        return TimeSeries(self.timestamp[key], self.voltage[key], self.current[key], self.power[key])
+
+    @property
+    def index(self) -> TimeIndex:
+        """Time index, built on first use and kept for the life of this (cached) series"""
+        if self._index is None:
+            self._index = TimeIndex(self.timestamp)
+        return self._index
+
+    def between(self, start: int = None, end: int = None) -> "TimeSeries":
+        """Rows with start <= timestamp < end (epoch seconds, either bound optional)"""
+        return self[self.index.rows_between(start, end)]
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        return {column: getattr(self, column) for column in COLUMNS}
+
+    @property
+    def nbytes(self) -> int:
+        return sum(array.nbytes for array in self.columns().values())
+
+    def hours(self) -> np.ndarray:
+        """Hour of day (0-23) for every row"""
+        return (self.timestamp // 3600) % 24
+
+    def record(self, index: int) -> Dict[str, Any]:
+        """Return one row in the JSON shape the API has always used"""
+        return {
+            "timestamp": from_epoch(self.timestamp[index]).isoformat(),
+            "voltage": round(float(self.voltage[index]), 2),
+            "current": round(float(self.current[index]), 2),
+            "power": round(float(self.power[index]), 2),
+        }
+
+    def to_columns(self) -> Dict[str, np.ndarray]:
+        """Columns rounded as in record(), with datetime64 timestamps, for direct serialization"""
+        # Plain contiguous arrays (not memmap views) so serializers can take them as-is
+        columns = {"timestamp": np.ascontiguousarray(self.timestamp, dtype=np.int64).astype("datetime64[s]")}
+        for column in VALUE_COLUMNS:
+            columns[column] = np.round(np.ascontiguousarray(getattr(self, column), dtype=np.float64), 2)
+        return columns
+
+    def to_records(self) -> List[Dict[str, Any]]:
+        # Round and convert whole columns at once rather than per row
+        columns = self.to_columns()
+        return [
+            {"timestamp": ts, "voltage": voltage, "current": current, "power": power}
+            for ts, voltage, current, power in zip(
+                columns["timestamp"].astype(str).tolist(),
+                *(columns[column].tolist() for column in VALUE_COLUMNS),
+            )
+        ]
+
+
+def rows_after(series: TimeSeries, rows: int, first_timestamp, last_timestamp) -> Optional[TimeSeries]:
+    """Rows of series newer than an incremental consumer has seen, or None if it must rebuild
+
+    A consumer that has seen `rows` rows spanning first..last_timestamp can
+    extend itself when the stored series only grew. Samples pushed to it
+    ahead of a store flush are fine; older rows appearing (a backfill) or
+    a different first row mean the series was rewritten.
+    """
+    if last_timestamp is None:
+        return None
+    if rows and (not len(series) or int(series.timestamp[0]) != first_timestamp):
+        return None
+    newer = series.between(last_timestamp + 1)
+    if len(series) - len(newer) > rows:
+        return None
+    return newer
+
+
+class RunLengthSeries:
+    """A series stored as on/off runs with per-run power statistics
+
+    Every run covers `rows` samples `step` seconds apart starting at `start`;
+    readings are kept for the samples of on runs only, in time order, so
+    scans over them cost in proportion to the time the appliance was on.
+    """
+
+    def __init__(self, runs: Dict[str, np.ndarray], values: Dict[str, np.ndarray], step: int):
+        self.runs = runs
+        self.values = values
+        self.step = step
+        rows = runs["rows"].astype(np.int64)
+        self.offsets = np.r_[0, np.cumsum(np.where(runs["on"], rows, 0))[:-1]]  # First value of each run
+        self.row_ends = np.cumsum(rows)  # Rows up to and including each run
+        self.ends = runs["start"] + (rows - 1) * step  # Last timestamp of each run
+
+    @classmethod
+    def encode(cls, series: TimeSeries, step: int = None) -> "RunLengthSeries":
+        """Encode a series; runs break where a sample switches on or off or the spacing is not `step`"""
+        if series.index.order is not None:
+            series = series[series.index.order]
+        timestamps = np.asarray(series.timestamp, dtype=np.int64)
+        if step is None:
+            step = int(np.median(np.diff(timestamps))) if len(timestamps) > 1 else SAMPLE_SECONDS
+        on = (series.power != 0) | (series.voltage != 0) | (series.current != 0)
+        if not len(timestamps):
+            starts = np.empty(0, dtype=np.int64)
+        else:
+            starts = np.flatnonzero(np.r_[True, (on[1:] != on[:-1]) | (np.diff(timestamps) != step)])
+
+        power = np.asarray(series.power, dtype=np.float64)
+        runs = {
+            "start": timestamps[starts],
+            "rows": np.diff(np.r_[starts, len(timestamps)]),
+            "on": on[starts],
+            "power_sum": np.add.reduceat(power, starts) if len(starts) else np.empty(0),
+            "power_max": np.maximum.reduceat(power, starts) if len(starts) else np.empty(0),
+        }
+        runs = {field: np.asarray(array, dtype=RUN_FIELDS[field]) for field, array in runs.items()}
+        values = {column: np.asarray(getattr(series, column)[on], dtype=COLUMNS[column]) for column in VALUE_COLUMNS}
+        return cls(runs, values, step)
+
+    @classmethod
+    def concat(cls, parts: List["RunLengthSeries"]) -> "RunLengthSeries":
+        """Join consecutive encoded parts (e.g. generated chunks) that share a step"""
+        runs = {field: np.concatenate([part.runs[field] for part in parts]) for field in RUN_FIELDS}
+        values = {column: np.concatenate([part.values[column] for part in parts]) for column in VALUE_COLUMNS}
+        return cls(runs, values, parts[0].step if parts else SAMPLE_SECONDS)
+
+    def __len__(self) -> int:
+        return int(self.row_ends[-1]) if len(self.row_ends) else 0
+
+    @property
+    def nbytes(self) -> int:
+        return sum(array.nbytes for array in self.runs.values()) + sum(array.nbytes for array in self.values.values())
+
+    @property
+    def first_timestamp(self) -> Optional[int]:
+        return int(self.runs["start"][0]) if len(self.ends) else None
+
+    @property
+    def last_timestamp(self) -> Optional[int]:
+        return int(self.ends[-1]) if len(self.ends) else None
+
+    def _run_rows(self, start: int = None, end: int = None):
+        """(runs slice, first row, end row) of each run's samples with start <= timestamp < end"""
+        lo = 0 if start is None else int(np.searchsorted(self.ends, start, side="left"))
+        hi = len(self.ends) if end is None else int(np.searchsorted(self.runs["start"], end, side="left"))
+        hi = max(lo, hi)
+        run_start = self.runs["start"][lo:hi]
+        rows = self.runs["rows"][lo:hi].astype(np.int64)
+        first = np.zeros(len(rows), dtype=np.int64)
+        stop = rows
+        if start is not None:
+            first = np.clip(-((run_start - start) // self.step), 0, rows)  # ceil((start - run_start) / step)
+        if end is not None:
+            stop = np.clip(-((run_start - end) // self.step), 0, rows)
+        return slice(lo, hi), first, np.maximum(first, stop)
+
+    def _on_values(self, start: int = None, end: int = None):
+        """(timestamps, value slice) of the on samples with start <= timestamp < end"""
+        runs, first, stop = self._run_rows(start, end)
+        on = self.runs["on"][runs]
+        count = (stop - first)[on]
+        if not count.sum():
+            return np.empty(0, dtype=np.int64), slice(0, 0)
+        run_start = self.runs["start"][runs][on] + first[on] * self.step
+        # On samples in the window are one contiguous stretch of the value arrays
+        begin = int(self.offsets[runs][on][0] + first[on][0])
+        within = np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count)
+        return np.repeat(run_start, count) + within * self.step, slice(begin, begin + int(count.sum()))
+
+    def to_series(self, start: int = None, end: int = None) -> TimeSeries:
+        """Reconstruct the dense rows with start <= timestamp < end"""
+        runs, first, stop = self._run_rows(start, end)
+        count = stop - first
+        total = int(count.sum())
+        within = np.arange(total) - np.repeat(np.cumsum(count) - count, count)
+        timestamps = np.repeat(self.runs["start"][runs] + first * self.step, count) + within * self.step
+        on = np.repeat(self.runs["on"][runs], count)
+        _, values = self._on_values(start, end)
+
+        columns = {}
+        for column in VALUE_COLUMNS:
+            columns[column] = np.zeros(total, dtype=COLUMNS[column])
+            columns[column][on] = self.values[column][values]
+        return TimeSeries(timestamps, *(columns[column] for column in VALUE_COLUMNS))
+
+    def tail(self, rows: int) -> TimeSeries:
+        """Reconstruct only the last `rows` rows"""
+        first = len(self) - rows
+        if first <= 0:
+            return self.to_series()
+        run = int(np.searchsorted(self.row_ends, first, side="right"))
+        row = first - (int(self.row_ends[run]) - int(self.runs["rows"][run]))
+        return self.to_series(int(self.runs["start"][run]) + row * self.step)
+
+    def record_at(self, ts: int) -> Optional[Dict[str, Any]]:
+        """The sample at or before ts in the API's record shape (None before the first sample)"""
+        run = int(np.searchsorted(self.runs["start"], ts, side="right")) - 1
+        if run < 0:
+            return None
+        row = min((int(ts) - int(self.runs["start"][run])) // self.step, int(self.runs["rows"][run]) - 1)
+        reading = {"timestamp": from_epoch(int(self.runs["start"][run]) + row * self.step).isoformat()}
+        for column in VALUE_COLUMNS:
+            value = float(self.values[column][self.offsets[run] + row]) if self.runs["on"][run] else 0.0
+            reading[column] = round(value, 2)
+        return reading
+
+    def usage(self, start: int = None, end: int = None) -> Dict[str, Any]:
+        """Energy, on-time and on/off cycles between start and end, read from the on samples only"""
+        timestamps, values = self._on_values(start, end)
+        power = self.values["power"][values].astype(np.float64)
+        hours = (timestamps // 3600) % 24
+        on_seconds = np.bincount(hours, minlength=24) * self.step
+        energy_wh = np.bincount(hours, weights=power, minlength=24) * self.step / 3600
+        runs, first, stop = self._run_rows(start, end)
+        return {
+            "energy_wh": float(energy_wh.sum()),
+            "on_seconds": int(on_seconds.sum()),
+            "peak_power": float(power.max()) if len(power) else 0.0,
+            "cycles": int((self.runs["on"][runs] & (stop > first)).sum()),
+            "hourly_on_seconds": on_seconds,
+            "hourly_wh": energy_wh,
+        }
+
+    def cycles(self, start: int = None, end: int = None, limit: int = None) -> List[Dict[str, Any]]:
+        """On runs overlapping [start, end), newest last, from the per-run statistics"""
+        runs, first, stop = self._run_rows(start, end)
+        index = np.flatnonzero(self.runs["on"][runs] & (stop > first)) + runs.start
+        if limit is not None:
+            index = index[-limit:] if limit else index[:0]
+        return [
+            {
+                "start": from_epoch(self.runs["start"][run]).isoformat(),
+                "end": from_epoch(self.ends[run] + self.step).isoformat(),
+                "duration_seconds": int(self.runs["rows"][run]) * self.step,
+                "energy_wh": round(float(self.runs["power_sum"][run]) * self.step / 3600, 2),
+                "average_power": round(float(self.runs["power_sum"][run]) / int(self.runs["rows"][run]), 2),
+                "peak_power": round(float(self.runs["power_max"][run]), 2),
+            }
+            for run in index
+        ]
+
+
+class ColumnStore:
+    """Directory of memory-mapped column files, one sub-directory per series"""
+
+    def __init__(self, root: str = STORE_DIR):
+        self.root = root
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    def _column_path(self, name: str, column: str) -> str:
+        return os.path.join(self.path(name), f"{column}.bin")
+
+    def _runs_path(self, name: str) -> str:
+        return os.path.join(self.path(name), RUNS_FILE)
+
+    def exists(self, name: str) -> bool:
+        return os.path.exists(self._column_path(name, "timestamp")) or self.has_runs(name)
+
+    def has_runs(self, name: str) -> bool:
+        return os.path.exists(self._runs_path(name))
+
+    def open(self, name: str) -> TimeSeries:
+        """Memory-map a stored series read-only; missing series come back empty"""
+        if not self.exists(name):
+            return TimeSeries.empty()
+        if self.has_runs(name):
+            return self.open_runs(name).to_series()  # Reconstructed on demand
+        return self._open_columns(name)
+
+    def _open_columns(self, name: str) -> TimeSeries:
+        arrays = {}
+        for column, dtype in COLUMNS.items():
+            path = self._column_path(name, column)
+            size = os.path.getsize(path) // np.dtype(dtype).itemsize if os.path.exists(path) else 0
+            if size == 0:
+                arrays[column] = np.empty(0, dtype=dtype)
+            else:
+                arrays[column] = np.memmap(path, dtype=dtype, mode="r", shape=(size,))
+
+        # A concurrent append may have landed in some columns but not others yet
+        rows = min(len(array) for array in arrays.values())
+        return TimeSeries(*(arrays[column][:rows] for column in COLUMNS))
+
+    def tail(self, name: str, rows: int) -> TimeSeries:
+        """The last `rows` rows of a stored series, reading only the end of each column file"""
+        if self.has_runs(name):
+            runs = self.open_runs(name)
+            metrics.record_read("runs", len(runs), runs.nbytes)
+            return runs.tail(rows)
+        if not self.exists(name):
+            return TimeSeries.empty()
+
+        with span(log, "store tail", series=name, rows=rows):
+            return self._tail_columns(name, rows)
+
+    def _tail_columns(self, name: str, rows: int) -> TimeSeries:
+        sizes = {}
+        for column, dtype in COLUMNS.items():
+            path = self._column_path(name, column)
+            sizes[column] = os.path.getsize(path) // np.dtype(dtype).itemsize if os.path.exists(path) else 0
+        # Align on the rows every column has, as open() does
+        total = min(sizes.values())
+        first = max(total - rows, 0)
+        series = TimeSeries(*(
+            np.fromfile(self._column_path(name, column), dtype=dtype, count=total - first,
+                        offset=first * np.dtype(dtype).itemsize) if total > first else np.empty(0, dtype=dtype)
+            for column, dtype in COLUMNS.items()
+        ))
+        metrics.record_read("tail", len(series), series.nbytes)
+        return series
+
+    def write(self, name: str, series: TimeSeries, meta: Dict[str, Any] = None):
+        """Replace a stored series"""
+        os.makedirs(self.path(name), exist_ok=True)
+        for column, array in series.columns().items():
+            path = self._column_path(name, column)
+            np.ascontiguousarray(array, dtype=COLUMNS[column]).tofile(path + ".tmp")
+            os.replace(path + ".tmp", path)
+        if self.has_runs(name):
+            os.remove(self._runs_path(name))
+        self.write_meta(name, dict(meta or {}, rows=len(series)))
+
+    def write_runs(self, name: str, runs: RunLengthSeries, meta: Dict[str, Any] = None):
+        """Replace a stored series with its run-length encoding"""
+        os.makedirs(self.path(name), exist_ok=True)
+        path = self._runs_path(name)
+        with open(path + ".tmp", "wb") as f:
+            np.savez(f, step=runs.step, **{f"run_{field}": array for field, array in runs.runs.items()},
+                     **runs.values)
+        os.replace(path + ".tmp", path)
+        for column in COLUMNS:
+            try:
+                os.remove(self._column_path(name, column))
+            except FileNotFoundError:
+                pass
+        self.write_meta(name, dict(meta or {}, rows=len(runs), encoding="runs"))
+
+    def write_compact(self, name: str, series: TimeSeries, meta: Dict[str, Any] = None):
+        """Write a series as runs if that is at most RUNS_MAX_RATIO of its dense size, else as columns"""
+        runs = RunLengthSeries.encode(series)
+        if len(series) and runs.nbytes <= RUNS_MAX_RATIO * len(series) * ROW_BYTES:
+            self.write_runs(name, runs, meta)
+        else:
+            self.write(name, series, meta)
+
+    def open_runs(self, name: str) -> Optional[RunLengthSeries]:
+        """Read a run-length encoded series (None if it is stored as columns)"""
+        if not self.has_runs(name):
+            return None
+        with np.load(self._runs_path(name)) as arrays:
+            runs = {field: arrays[f"run_{field}"] for field in RUN_FIELDS}
+            values = {column: arrays[column] for column in VALUE_COLUMNS}
+            runs = RunLengthSeries(runs, values, int(arrays["step"]))
+        appended = self._open_columns(name)  # Rows appended since the runs were last written
+        if not len(appended):
+            return runs
+        return RunLengthSeries.concat([runs, RunLengthSeries.encode(appended, runs.step)])
+
+    def write_meta(self, name: str, meta: Dict[str, Any]):
+        os.makedirs(self.path(name), exist_ok=True)
+        with open(os.path.join(self.path(name), "meta.json"), "w") as f:
+            json.dump(meta, f)
+
+    def append(self, name: str, series: TimeSeries):
+        """Append rows to the end of a stored series (for runs series, to the column files beside them)"""
+        if not len(series):
+            return
+        os.makedirs(self.path(name), exist_ok=True)
+        for column, array in series.columns().items():
+            with open(self._column_path(name, column), "ab") as f:
+                f.write(np.ascontiguousarray(array, dtype=COLUMNS[column]).tobytes())
+        if self.has_runs(name) and len(self._open_columns(name)) >= RUNS_TAIL_ROWS:
+            self.write_runs(name, self.open_runs(name), self.read_meta(name))  # Also drops the column files
+
+    def version(self, name: str) -> tuple:
+        """(mtime_ns, size) of every column (or runs) file; changes whenever the series is written"""
+        stamps = []
+        for path in [self._column_path(name, column) for column in COLUMNS] + [self._runs_path(name)]:
+            try:
+                stat = os.stat(path)
+                stamps.append((stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                stamps.append(None)
+        return tuple(stamps)
+
+    def read_meta(self, name: str) -> Dict[str, Any]:
+        try:
+            with open(os.path.join(self.path(name), "meta.json"), "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def convert_source(self, name: str, source_path: str = None) -> TimeSeries:
+        """One-shot conversion of a source file (see SOURCE_EXTENSIONS) into columns"""
+        source_path = source_path or find_source(name)
+        with span(log, "convert source", series=name, source=source_path) as fields:
+            series = read_source(source_path)
+            self.write_compact(name, series, {"source": source_path, "source_mtime": os.path.getmtime(source_path)})
+            fields.update(rows=len(series), encoding="runs" if self.has_runs(name) else "columns")
+        log.info("converted %s", source_path, extra=fields)
+        return self.open(name)
+
+
+store = ColumnStore()
+
+
+def source_candidates(name: str) -> List[str]:
+    return [os.path.join(DATA_DIR, f"{name}{extension}") for extension in SOURCE_EXTENSIONS]
+
+
+def find_source(name: str) -> Optional[str]:
+    """data/<name>.npz or data/<name>.json, whichever exists first"""
+    return next((path for path in source_candidates(name) if os.path.exists(path)), None)
+
+
+def read_source(path: str) -> TimeSeries:
+    """Read a series from a .npz or (columnar or legacy) .json source file"""
+    with metrics.timed("parse"):
+        series = _parse_source(path)
+    metrics.record_read("source", len(series), os.path.getsize(path))
+    return series
+
+
+def _parse_source(path: str) -> TimeSeries:
+    if path.endswith(".npz"):
+        with np.load(path) as arrays:
+            return TimeSeries(*(arrays[column].astype(dtype) for column, dtype in COLUMNS.items()))
+
+    with open(path, "r") as f:
+        data = json.load(f)
+    if not isinstance(data, dict):
+        return TimeSeries.from_records(data)
+    timestamps = data["timestamp"]
+    if timestamps and isinstance(timestamps[0], str):
+        timestamps = parse_timestamps(timestamps)
+    return TimeSeries(
+        np.asarray(timestamps, dtype=np.int64),
+        *(np.asarray(data[column], dtype=COLUMNS[column]) for column in VALUE_COLUMNS),
+    )
+
+
+def write_source(path: str, series: TimeSeries):
+    """Write a compact source file: compressed .npz, or columnar .json with epoch timestamps"""
+    if path.endswith(".npz"):
+        np.savez_compressed(path, **{column: np.asarray(array, dtype=COLUMNS[column])
+                                     for column, array in series.columns().items()})
+        return
+    with open(path, "w") as f:
+        json.dump({
+            "timestamp": series.timestamp.tolist(),
+            **{column: np.round(getattr(series, column).astype(np.float64), 2).tolist() for column in VALUE_COLUMNS},
+        }, f, separators=(",", ":"))
+
+
+def sync_source(name: str):
+    """Convert a series' source file into the store on first use or when it changed"""
+    source_path = find_source(name)
+    if source_path:
+        meta = store.read_meta(name)
+        # Only reconvert stores that were seeded from one of this series' source files
+        seeded = meta.get("source") in source_candidates(name)
+        stale = meta.get("source") != source_path or meta.get("source_mtime") != os.path.getmtime(source_path)
+        if not store.exists(name) or (seeded and stale):
+            try:
+                store.convert_source(name, source_path)
+            except (json.JSONDecodeError, KeyError, ValueError, OSError):
+                # Keep serving whatever the store already holds
+                log.warning("could not convert %s", source_path, exc_info=True, extra={"series": name})
+
+
+def load_series(name: str) -> TimeSeries:
+    """Open a stored series, converting its source file first if needed"""
+    with metrics.timed("load"), span(log, "load series", series=name) as fields:
+        sync_source(name)
+        series = store.open(name)
+        fields["rows"] = len(series)
+    metrics.record_read("store", len(series), series.nbytes)
+    return series
+
+
+def load_runs(name: str) -> RunLengthSeries:
+    """Run-length view of a stored series: read as stored, or encoded from its columns"""
+    with metrics.timed("load"), span(log, "load runs", series=name):
+        sync_source(name)
+        runs = store.open_runs(name)
+        if runs is None:
+            series = store.open(name)
+            metrics.record_read("store", len(series), series.nbytes)
+            runs = RunLengthSeries.encode(series)
+        else:
+            metrics.record_read("runs", len(runs), runs.nbytes)
+    return runs
+
+
+def series_version(name: str) -> tuple:
+    """Version of a series covering both its column files and its source file"""
+    source_path = find_source(name)
+    try:
+        stat = os.stat(source_path)
+        source = (source_path, stat.st_mtime_ns, stat.st_size)
+    except (FileNotFoundError, TypeError):
+        source = None
+    return store.version(name), source
+
+
+def main():
+    names = ["main_power_data", "fridge_data", "ac_data", "geyser_data", "microwave_data"]
+    for name in names:
+        source_path = find_source(name)
+        if source_path is None:
+            print(f"Skipping {name} (no data/{name}.npz or .json)")
+            continue
+        print(f"Converting {source_path}...")
+        series = store.convert_source(name, source_path)
+        encoding = "runs" if store.has_runs(name) else "columns"
+        print(f"- {store.path(name)}: {len(series)} rows ({encoding})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import functools
+import json
+import logging
+import os
+import sys
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict
+
+# WATTWISE_LOG_LEVEL sets what the wattwise.* loggers emit (spans log at
+# DEBUG); spans slower than WATTWISE_SLOW_SPAN_MS are logged at WARNING
+# whatever the level. WATTWISE_LOG_FORMAT=text gives plain lines instead of JSON.
+LOG_LEVEL = os.environ.get("WATTWISE_LOG_LEVEL", "WARNING").upper()
+LOG_FORMAT = os.environ.get("WATTWISE_LOG_FORMAT", "json")
+SLOW_SPAN_MS = float(os.environ.get("WATTWISE_SLOW_SPAN_MS", "1000"))
+
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message and any extra fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        entry.update((key, value) for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES)
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Plain log lines with extra fields appended as key=value"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = " ".join(f"{key}={value}" for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES)
+        line = super().format(record)
+        return f"{line} {fields}" if fields else line
+
+
+def configure_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT):
+    """Attach a stderr handler to the wattwise logger tree (once); uvicorn's own loggers are left alone"""
+    root = logging.getLogger("wattwise")
+    root.setLevel(level)
+    if not root.handlers:
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+        root.addHandler(handler)
+        root.propagate = False
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(f"wattwise.{name}")
+
+
+@contextmanager
+def span(logger: logging.Logger, name: str, **fields):
+    """Time a block and log it with its fields; callers may add fields to the yielded dict"""
+    started = time.perf_counter()
+    try:
+        yield fields
+    finally:
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        level = logging.WARNING if elapsed_ms >= SLOW_SPAN_MS else logging.DEBUG
+        if logger.isEnabledFor(level):
+            logger.log(level, name, extra=dict(fields, span=name, duration_ms=round(elapsed_ms, 3)))
+
+
+def _rows(value: Any) -> Dict[str, int]:
+    # Series arguments are summarised by their length
+    return {"rows": len(value)} if hasattr(value, "timestamp") and hasattr(value, "__len__") else {}
+
+
+def traced(logger: logging.Logger, name: str = None) -> Callable:
+    """Decorator form of span(); the first series argument's row count is logged with it"""
+    def decorate(func: Callable) -> Callable:
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            fields = next((_rows(arg) for arg in args if _rows(arg)), {})
+            with span(logger, span_name, **fields):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+configure_logging()
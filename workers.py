@@ -0,0 +1,102 @@
+import asyncio
+import contextvars
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class WorkerTimeout(Exception):
+    """A dispatched computation did not finish within its timeout"""
+
+
+class WorkerPool:
+    """Runs blocking loads and analytics off the event loop, coalescing identical calls
+
+    kind="thread" shares the server's in-memory caches and live state;
+    kind="process" sidesteps the GIL for CPU-bound work, but each worker
+    process loads its own datasets from the store, so functions sent to it
+    must be module-level and their arguments picklable.
+
+    Calls with the same key that overlap share one computation
+    (single-flight). A caller that times out stops waiting, but the
+    computation keeps running for anyone else already waiting on it.
+    """
+
+    def __init__(self, kind: str = "thread", max_workers: Optional[int] = None, timeout: float = 30.0):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown worker pool kind '{kind}'")
+        self.kind = kind
+        self.max_workers = max_workers or min(8, os.cpu_count() or 1)
+        self.timeout = timeout
+        self._executor: Optional[Executor] = None
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.started = 0
+        self.coalesced = 0
+        self.timeouts = 0
+        self.failures = 0
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                # Forking a threaded server is unsafe; start clean interpreters instead
+                self._executor = ProcessPoolExecutor(self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+            else:
+                self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="wattwise-worker")
+        return self._executor
+
+    async def run(self, func: Callable[..., Any], *args, key: Hashable = None, timeout: float = None) -> Any:
+        """Run func(*args) in the pool; key defaults to the function and its arguments"""
+        key = (func.__module__, func.__qualname__, args) if key is None else key
+        future = self._inflight.get(key)
+        if future is None:
+            call = (func, *args)
+            if self.kind == "thread":
+                # Let the computation report reads to the request that started it
+                call = (contextvars.copy_context().run, func, *args)
+            future = asyncio.get_running_loop().run_in_executor(self._get_executor(), *call)
+            self._inflight[key] = future
+            future.add_done_callback(lambda done: self._finished(key, done))
+            self.started += 1
+        else:
+            self.coalesced += 1
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise WorkerTimeout(f"{func.__qualname__} did not finish within {timeout or self.timeout:g}s")
+
+    def _finished(self, key: Hashable, future: asyncio.Future):
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+        # Mark the outcome as retrieved even if every caller already timed out
+        if not future.cancelled() and future.exception() is not None:
+            self.failures += 1
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "kind": self.kind,
+            "max_workers": self.max_workers,
+            "timeout": self.timeout,
+            "in_flight": len(self._inflight),
+            "started": self.started,
+            "coalesced": self.coalesced,
+            "timeouts": self.timeouts,
+            "failures": self.failures,
+        }
+
+
+def pool_from_env() -> WorkerPool:
+    """WATTWISE_WORKERS=thread|process, WATTWISE_WORKER_COUNT and WATTWISE_REQUEST_TIMEOUT (seconds)"""
+    count = os.environ.get("WATTWISE_WORKER_COUNT")
+    return WorkerPool(
+        kind=os.environ.get("WATTWISE_WORKERS", "thread"),
+        max_workers=int(count) if count else None,
+        timeout=float(os.environ.get("WATTWISE_REQUEST_TIMEOUT", "30")),
+    )